@@ -1,19 +1,35 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from config.settings import config
+from app.engine import configure_engines
+from app.routing import RoutingSession, configure_replica_binds, init_replica_routing
+from app.lazy import init_lazy
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
-def create_app(config_name='default'):
+BLUEPRINTS = [
+    ('app.views.main:main_bp', None),
+    ('app.views.auth:auth_bp', '/auth'),
+    ('app.views.admin:admin_bp', '/admin'),
+    ('app.views.tenant:tenant_bp', '/tenant'),
+]
+
+def create_app(config_name='default', lazy=False):
+    """Build the app. With ``lazy`` the views and forms are imported on the first request
+    instead, which keeps CLI commands and workers that never serve a page quick to start."""
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    if app.config['TRUSTED_PROXY_COUNT']:
+        proxies = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
     
+    replica_binds = configure_replica_binds(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    configure_engines(app, db)
+    init_replica_routing(app, replica_binds)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'info'
@@ -24,14 +40,41 @@ def create_app(config_name='default'):
     def load_user(user_id):
         return User.query.get(int(user_id))
     
-    from app.views.auth import auth_bp
-    from app.views.admin import admin_bp
-    from app.views.tenant import tenant_bp
-    from app.views.main import main_bp
+    init_lazy(app, BLUEPRINTS, lazy)
     
-    app.register_blueprint(main_bp)
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(admin_bp, url_prefix='/admin')
-    app.register_blueprint(tenant_bp, url_prefix='/tenant')
+    from app.services.notifications import init_notifications
+    from app.services.maintenance_workflow import init_maintenance_workflow
+    from app.services.leases import init_leases
+    from app.services.login_protection import init_login_protection
+    from app.concurrency import init_concurrency
+    from app.tenancy import init_tenancy
+    from app.sessions import init_sessions
+    from app.assets import init_assets
+    from app.compression import init_compression
+    from app.services.audit import init_audit
+    from app.services.archival import init_archival
+    from app.services.analytics import init_analytics
+    from app.services.choices import init_choices
+    from app.services.attachments import init_attachments
+    from app.services.maintenance_photos import init_maintenance_photos
+    from app.services.documents import init_documents
+    from app.services.signatures import init_signatures
+    init_notifications(app)
+    init_maintenance_workflow(app)
+    init_leases(app)
+    init_login_protection(app)
+    init_concurrency(app)
+    init_tenancy(app)
+    init_sessions(app)
+    init_assets(app)
+    init_compression(app)
+    init_audit(app)
+    init_archival(app)
+    init_analytics(app)
+    init_choices(app)
+    init_attachments(app)
+    init_maintenance_photos(app)
+    init_documents(app)
+    init_signatures(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Static asset pipeline.
+
+``flask assets build`` copies every file under ``app/static`` (except user
+uploads) into ``ASSETS_BUILD_FOLDER`` with a content hash in its name
+(``css/custom.css`` -> ``css/custom.1a2b3c4d5e.css``), writes gzip and, when
+the ``brotli`` package is installed, brotli variants of text assets next to
+it, and records the mapping in ``manifest.json``. Run it as part of every
+deploy.
+
+Templates link assets with ``asset_url('css/custom.css')``. When the
+manifest has the file, the hashed URL under ``/assets/`` is returned; those
+responses are marked ``immutable`` for a year because a changed file gets a
+new name. Without a build (or in debug mode) it falls back to the plain
+``/static/`` URL. Previously built files are left in place so pages still
+cached by clients keep working across a deploy.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+HASH_LENGTH = 10
+# Endpoints that serve files; request hooks skip them so they never touch the session
+STATIC_ENDPOINTS = frozenset({'static', 'assets'})
+
+
+def _build_folder(app):
+    return app.config['ASSETS_BUILD_FOLDER'] or os.path.join(app.root_path, 'static_dist')
+
+
+def _hashed_name(path, data):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _write_compressed(target, data):
+    """Write ``.gz`` / ``.br`` siblings of ``target`` when they are smaller than ``data``; returns bytes saved."""
+    saved = 0
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(target + suffix, 'wb') as f:
+                f.write(compressed)
+            saved = max(saved, len(data) - len(compressed))
+    return saved
+
+
+def build(app):
+    """Fingerprint and precompress the static folder; returns ``(manifest, bytes_saved)``."""
+    source = app.static_folder
+    output = _build_folder(app)
+    excluded = set(app.config['ASSETS_EXCLUDE'])
+    manifest = {}
+    saved = 0
+
+    for dirpath, dirnames, filenames in os.walk(source):
+        relative_dir = os.path.relpath(dirpath, source)
+        if relative_dir == '.':
+            dirnames[:] = [name for name in dirnames if name not in excluded]
+        for filename in filenames:
+            logical = os.path.normpath(os.path.join(relative_dir, filename)).replace(os.sep, '/')
+            with open(os.path.join(dirpath, filename), 'rb') as f:
+                data = f.read()
+            hashed = _hashed_name(logical, data)
+            manifest[logical] = hashed
+
+            target = os.path.join(output, *hashed.split('/'))
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+                saved += _write_compressed(target, data)
+
+    manifest_path = os.path.join(output, MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    app.extensions['asset_manifest'] = manifest
+    return manifest, saved
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(_build_folder(app), MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL for a static file: the fingerprinted build when there is one, else the plain static URL."""
+    hashed = current_app.extensions['asset_manifest'].get(filename)
+    if hashed is None or current_app.debug:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=hashed)
+
+
+def serve_asset(filename):
+    folder = _build_folder(current_app)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    max_age = current_app.config['ASSETS_MAX_AGE']
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        candidate = safe_join(folder, filename + suffix)
+        if request.accept_encodings[encoding] and candidate and os.path.isfile(candidate):
+            response = send_from_directory(folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(folder, filename, mimetype=mimetype, max_age=max_age)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+assets_cli = AppGroup('assets', help='Static asset pipeline.')
+
+
+@assets_cli.command('build')
+@click.option('--clean', is_flag=True, help='Remove earlier builds first.')
+def build_command(clean):
+    """Fingerprint and precompress app/static into the asset build folder."""
+    app = current_app._get_current_object()
+    if clean:
+        shutil.rmtree(_build_folder(app), ignore_errors=True)
+    manifest, saved = build(app)
+    click.echo(f'Built {len(manifest)} assets into {_build_folder(app)} ({saved} bytes saved by compression)')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written')
+
+
+def init_assets(app):
+    app.extensions['asset_manifest'] = load_manifest(app)
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.add_template_global(asset_url)
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,213 @@
+"""
+Response size reduction.
+
+``CompressionMiddleware`` wraps the WSGI app and compresses text responses
+with brotli (when the ``brotli`` package is installed) or gzip, whichever
+the client prefers. Bodies below ``COMPRESSION_MIN_SIZE`` go out as they
+are. Responses without a Content-Length (streamed templates) are buffered
+only up to that threshold and then compressed chunk by chunk, each chunk
+flushed so the client still gets the page progressively. Responses that
+are already encoded, such as the precompressed ``/assets/`` files, pass
+through untouched.
+
+``WhitespaceMinifier`` is a Jinja extension that collapses indentation in
+template source when a template is compiled, so rendering costs nothing
+extra and values inserted at render time (message text shown with
+``whitespace-pre-wrap``) are never altered. ``<pre>``, ``<textarea>``,
+``<script>`` and ``<style>`` blocks and Jinja tags are left as written.
+It is switched on with ``HTML_MINIFY``.
+"""
+
+import itertools
+import re
+import zlib
+
+from jinja2.ext import Extension
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+})
+SKIPPED_STATUSES = ('204', '206', '304')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, level=6, brotli_quality=4, mimetypes=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.mimetypes = mimetypes
+
+    def _negotiate(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        # Highest q-value wins, br on a tie; anything at q=0 is refused
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        return accepted.best_match(('br', 'gzip') if brotli is not None else ('gzip',))
+
+    def _should_compress(self, status, headers):
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip().lower()
+        return (
+            mimetype in self.mimetypes
+            and not status.startswith(SKIPPED_STATUSES)
+            and 'Content-Encoding' not in headers
+            and 'no-transform' not in headers.get('Cache-Control', '')
+        )
+
+    def _stream(self, chunks, encoding, flush):
+        if encoding == 'br':
+            compressor = _BrotliStream(self.brotli_quality)
+        else:
+            compressor = _GzipStream(self.level)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if flush:
+                data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    def __call__(self, environ, start_response):
+        encoding = self._negotiate(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        response = []
+        buffered = []
+
+        def capture(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return buffered.append
+
+        app_iter = self.app(environ, capture)
+        close = getattr(app_iter, 'close', None)
+        chunks = iter(app_iter)
+        if not response:
+            # The app may call start_response on its first iteration
+            buffered.extend(itertools.islice(chunks, 1))
+        status, headers = response[0], Headers(response[1])
+
+        def passthrough():
+            start_response(status, headers.to_wsgi_list())
+            if not buffered:
+                return app_iter
+            return ClosingIterator(itertools.chain(buffered, chunks), close)
+
+        if not self._should_compress(status, headers):
+            return passthrough()
+
+        length = headers.get('Content-Length', type=int)
+        if length is not None and length < self.minimum_size:
+            return passthrough()
+        if length is None:
+            size = sum(len(chunk) for chunk in buffered)
+            while size < self.minimum_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    # The whole streamed body turned out to be small
+                    headers['Content-Length'] = str(size)
+                    if close is not None:
+                        close()
+                    start_response(status, headers.to_wsgi_list())
+                    return buffered
+                buffered.append(chunk)
+                size += len(chunk)
+
+        headers.remove('Content-Length')
+        headers['Content-Encoding'] = encoding
+        vary = headers.get('Vary')
+        if not vary:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            headers['Vary'] = f'{vary}, Accept-Encoding'
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # The compressed body is a different byte sequence
+            headers['ETag'] = f'W/{etag}'
+
+        start_response(status, headers.to_wsgi_list())
+        stream = self._stream(itertools.chain(buffered, chunks), encoding, flush=length is None)
+        return ClosingIterator(stream, close)
+
+
+_PROTECTED = re.compile(
+    r'(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}|<(pre|textarea|script|style)\b.*?</\2\s*>)',
+    re.DOTALL | re.IGNORECASE,
+)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _collapse(match):
+    return '\n' if '\n' in match.group() else ' '
+
+
+def minify_whitespace(source):
+    """Collapse runs of whitespace in template text, keeping protected blocks as written."""
+    parts = []
+    position = 0
+    for match in _PROTECTED.finditer(source):
+        parts.append(_WHITESPACE.sub(_collapse, source[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(_WHITESPACE.sub(_collapse, source[position:]))
+    return ''.join(parts)
+
+
+class WhitespaceMinifier(Extension):
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(minify_whitespace=False)
+
+    def preprocess(self, source, name, filename=None):
+        if not self.environment.minify_whitespace:
+            return source
+        return minify_whitespace(source)
+
+
+def init_compression(app):
+    app.jinja_env.add_extension(WhitespaceMinifier)
+    app.jinja_env.minify_whitespace = app.config['HTML_MINIFY']
+    if app.config['COMPRESSION_ENABLED']:
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            minimum_size=app.config['COMPRESSION_MIN_SIZE'],
+            level=app.config['COMPRESSION_LEVEL'],
+            brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'],
+        )
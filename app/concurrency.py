@@ -0,0 +1,70 @@
+"""
+Optimistic concurrency helpers.
+
+Versioned models declare ``version_id_col`` so the ORM adds ``WHERE version = ?``
+to every UPDATE and raises ``StaleDataError`` when another request got there
+first. Forms carry the version the user was looking at, checked with
+``check_version()``, and bulk paths use ``compare_and_swap()`` to update many
+rows in a single conditional statement. No row locks are taken.
+"""
+
+from urllib.parse import urlparse
+
+from flask import flash, jsonify, redirect, request, url_for
+from sqlalchemy import tuple_, update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+
+CONFLICT_MESSAGE = 'This record was changed by someone else while you were editing it. Review the latest version and try again.'
+
+
+class VersionConflict(Exception):
+    def __init__(self, obj=None):
+        super().__init__(CONFLICT_MESSAGE)
+        self.obj = obj
+
+
+def check_version(obj, submitted_version):
+    """Raise ``VersionConflict`` if the form was rendered from an older version of ``obj``."""
+    if submitted_version is not None and submitted_version != obj.version:
+        raise VersionConflict(obj)
+
+
+def compare_and_swap(model, expected_versions, values, criteria=(), returning=None):
+    """Apply ``values`` to every row whose ``(id, version)`` is in ``expected_versions``.
+
+    Runs one UPDATE that also bumps ``version``; rows changed since the caller
+    read them simply do not match. Returns the ``returning`` columns (default:
+    ``id``) of the rows that were updated.
+    """
+    if not expected_versions:
+        return []
+
+    stmt = (
+        update(model)
+        .where(tuple_(model.id, model.version).in_(list(expected_versions.items())))
+        .where(*criteria)
+        .values(version=model.version + 1, **values)
+        .returning(*(returning or (model.id,)))
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(stmt).all()
+
+
+def _safe_referrer():
+    referrer = request.referrer
+    if referrer and urlparse(referrer).netloc == request.host:
+        return referrer
+    return None
+
+
+def init_concurrency(app):
+    @app.errorhandler(VersionConflict)
+    @app.errorhandler(StaleDataError)
+    def handle_version_conflict(error):
+        db.session.rollback()
+        if request.is_json or request.accept_mimetypes.best == 'application/json':
+            return jsonify(error=CONFLICT_MESSAGE), 409
+        flash(CONFLICT_MESSAGE, 'error')
+        return redirect(_safe_referrer() or url_for('main.index'))
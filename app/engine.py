@@ -0,0 +1,25 @@
+from sqlalchemy import event
+
+
+def sqlite_pragma_listener(pragmas):
+    """Return a ``connect`` listener that applies ``pragmas`` to each new SQLite connection."""
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def configure_engines(app, db):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, DecimalField, IntegerField, DateField, FileField
-from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
+from wtforms import StringField, PasswordField, SelectField, TextAreaField, DecimalField, IntegerField, DateField, FileField, MultipleFileField, BooleanField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, ValidationError
 from wtforms.widgets import TextArea
 
 class LoginForm(FlaskForm):
@@ -32,11 +32,16 @@ class LeaseForm(FlaskForm):
     end_date = DateField('End Date', validators=[DataRequired()])
     monthly_rent = DecimalField('Monthly Rent', validators=[DataRequired(), NumberRange(min=0)], places=2)
     security_deposit = DecimalField('Security Deposit', validators=[Optional(), NumberRange(min=0)], places=2)
+    
+    def validate_end_date(self, field):
+        if self.start_date.data and field.data and field.data < self.start_date.data:
+            raise ValidationError('End date must be on or after the start date.')
 
 class MessageForm(FlaskForm):
     recipient_id = SelectField('Recipient', coerce=int, validators=[DataRequired()])
     property_id = SelectField('Property (Optional)', coerce=int, validators=[Optional()])
     message_text = TextAreaField('Message', validators=[DataRequired(), Length(min=1, max=1000)])
+    attachment = FileField('Attachment (Optional)', validators=[Optional()])
 
 class MaintenanceRequestForm(FlaskForm):
     property_id = SelectField('Property', coerce=int, validators=[DataRequired()])
@@ -45,10 +50,24 @@ class MaintenanceRequestForm(FlaskForm):
     priority = SelectField('Priority', 
                           choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')],
                           validators=[DataRequired()])
+    photos = MultipleFileField('Photos (Optional)', validators=[Optional()])
 
 class DocumentUploadForm(FlaskForm):
     lease_id = SelectField('Lease', coerce=int, validators=[DataRequired()])
     document_type = SelectField('Document Type', 
                                choices=[('lease_agreement', 'Lease Agreement'), ('addendum', 'Addendum'), ('notice', 'Notice')],
                                validators=[DataRequired()])
-    file = FileField('Document File', validators=[DataRequired()])
\ No newline at end of file
+    file = FileField('Document File', validators=[DataRequired()])
+
+class DocumentVersionForm(FlaskForm):
+    file = FileField('New Version', validators=[DataRequired()])
+
+class NotificationPreferenceForm(FlaskForm):
+    email_enabled = BooleanField('Email notifications')
+    sms_enabled = BooleanField('SMS notifications')
+    digest_minutes = SelectField('Delivery', coerce=int,
+                                 choices=[(0, 'Immediately'), (60, 'Hourly digest'), (1440, 'Daily digest')])
+
+class SignDocumentForm(FlaskForm):
+    signed_name = StringField('Full name', validators=[DataRequired(), Length(max=200)])
+    agree = BooleanField('I have read this document and agree to sign it electronically', validators=[DataRequired()])
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Deferred loading for the app factory.
+
+Most of the start-up cost of ``create_app`` is imports that only matter for
+some entry points: the views pull in the forms stack (Flask-WTF, WTForms,
+email-validator) and Flask-Migrate pulls in Alembic. CLI commands and
+background workers that never serve a page don't need either.
+
+``LazyViews`` registers the blueprints just before the first request is
+handled; ``LazyGroup`` is a click group whose subcommands are imported the
+first time the group is invoked or asked for help.
+"""
+
+import threading
+from importlib import import_module
+
+import click
+
+
+def import_string(path):
+    """Import ``'package.module:attribute'`` and return the attribute."""
+    module, _, attribute = path.partition(':')
+    return getattr(import_module(module), attribute)
+
+
+def register_blueprints(app, blueprints):
+    for path, url_prefix in blueprints:
+        app.register_blueprint(import_string(path), url_prefix=url_prefix)
+
+
+class LazyViews:
+    """WSGI wrapper that registers ``blueprints`` on ``app`` when the first request arrives."""
+
+    def __init__(self, app, wsgi_app, blueprints):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.blueprints = blueprints
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Register the blueprints now; call before using ``url_for`` outside a request."""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                register_blueprints(self.app, self.blueprints)
+                self.loaded = True
+
+    def __call__(self, environ, start_response):
+        if not self.loaded:
+            self.load()
+        return self.wsgi_app(environ, start_response)
+
+
+class LazyGroup(click.Group):
+    """Click group whose real subcommands come from ``loader()``, called on first use."""
+
+    def __init__(self, name, loader, **kwargs):
+        super().__init__(name, **kwargs)
+        self._loader = loader
+        self._group = None
+
+    def _load(self):
+        if self._group is None:
+            self._group = self._loader()
+        return self._group
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._load().get_command(ctx, name)
+
+
+def _migrate_commands():
+    from flask import current_app
+    from flask_migrate import Migrate
+    from flask_migrate.cli import db as db_group
+
+    from app import db
+
+    Migrate(current_app, db)
+    return db_group
+
+
+def init_lazy(app, blueprints, lazy):
+    app.cli.add_command(LazyGroup('db', _migrate_commands, help='Perform database migrations.'))
+    if lazy:
+        views = LazyViews(app, app.wsgi_app, blueprints)
+        app.extensions['lazy_views'] = views
+        app.wsgi_app = views
+    else:
+        register_blueprints(app, blueprints)
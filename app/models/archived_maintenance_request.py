@@ -0,0 +1,33 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class ArchivedMaintenanceRequest(OrganizationScoped, db.Model):
+    """Cold copy of a closed maintenance request, with its status history inlined as JSON."""
+    __tablename__ = 'maintenance_requests_archive'
+    __table_args__ = (
+        db.Index('ix_maintenance_requests_archive_org_property_created', 'organization_id', 'property_id', 'created_at'),
+        db.Index('ix_maintenance_requests_archive_org_tenant_created', 'organization_id', 'tenant_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tenant_id = db.Column(db.Integer, nullable=False)
+    property_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    priority = db.Column(db.String(20))
+    status = db.Column(db.String(20))
+    assigned_to_id = db.Column(db.Integer)
+    vendor_name = db.Column(db.String(255))
+    cost = db.Column(db.Numeric(10, 2))
+    due_at = db.Column(db.DateTime)
+    closed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer)
+    deleted_at = db.Column(db.DateTime)
+    status_history = db.Column(db.JSON)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<ArchivedMaintenanceRequest {self.title} - {self.status}>'
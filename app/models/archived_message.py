@@ -0,0 +1,25 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class ArchivedMessage(OrganizationScoped, db.Model):
+    """Cold copy of a message moved out of ``messages`` by the archival job."""
+    __tablename__ = 'messages_archive'
+    __table_args__ = (
+        db.Index('ix_messages_archive_org_recipient_sent', 'organization_id', 'recipient_id', 'sent_at'),
+        db.Index('ix_messages_archive_org_sender_sent', 'organization_id', 'sender_id', 'sent_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    property_id = db.Column(db.Integer)
+    message_text = db.Column(db.Text, nullable=False)
+    attachment_url = db.Column(db.String(500))
+    is_read = db.Column(db.Boolean)
+    sent_at = db.Column(db.DateTime)
+    deleted_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<ArchivedMessage {self.id}>'
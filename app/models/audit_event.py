@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+
+class AuditEvent(db.Model):
+    """Append-only record of a create, update or delete of an audited entity.
+
+    ``period`` (``YYYYMM``) partitions the log by month: the time-range index
+    leads with it and retention drops whole periods. Per-entity history is
+    served by the ``(organization_id, entity_type, entity_id, occurred_at)``
+    index.
+    """
+    __tablename__ = 'audit_events'
+    __table_args__ = (
+        db.Index('ix_audit_events_entity', 'organization_id', 'entity_type', 'entity_id', 'occurred_at'),
+        db.Index('ix_audit_events_period_occurred', 'period', 'occurred_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Integer, nullable=False)
+    occurred_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))
+    # No foreign key: events must outlive the users and rows they describe
+    actor_id = db.Column(db.Integer)
+    action = db.Column(db.Enum('create', 'update', 'delete', name='audit_actions'), nullable=False)
+    entity_type = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    changes = db.Column(db.JSON)
+    
+    def __repr__(self):
+        return f'<AuditEvent {self.action} {self.entity_type}:{self.entity_id}>'
+
+@event.listens_for(AuditEvent, 'before_update')
+@event.listens_for(AuditEvent, 'before_delete')
+def _reject_audit_rewrite(mapper, connection, target):
+    raise ValueError('The audit log is append-only')
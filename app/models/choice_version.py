@@ -0,0 +1,11 @@
+from app import db
+
+class ChoiceVersion(db.Model):
+    """Counter bumped whenever a table behind an organization's select-field choices changes."""
+    __tablename__ = 'choice_versions'
+    
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ChoiceVersion org={self.organization_id} v{self.version}>'
\ No newline at end of file
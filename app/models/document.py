@@ -1,8 +1,13 @@
 from datetime import datetime
 from app import db
+from app.models.organization import OrganizationScoped
 
-class Document(db.Model):
+class Document(OrganizationScoped, db.Model):
+    """A lease document. The file columns describe its current version; older ones are in ``document_versions``."""
     __tablename__ = 'documents'
+    __table_args__ = (
+        db.Index('ix_documents_org_lease', 'organization_id', 'lease_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     lease_id = db.Column(db.Integer, db.ForeignKey('leases.id'), nullable=False)
@@ -13,6 +18,9 @@ class Document(db.Model):
     mime_type = db.Column(db.String(100))
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    content_hash = db.Column(db.String(64))
+    # Kept in step with document_versions so listings never count the versions
+    version_count = db.Column(db.Integer, nullable=False, default=0)
     
     uploader = db.relationship('User', backref='uploaded_documents')
     
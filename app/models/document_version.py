@@ -0,0 +1,27 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class DocumentVersion(OrganizationScoped, db.Model):
+    """One uploaded revision of a document; versions with the same ``content_hash`` share a stored file."""
+    __tablename__ = 'document_versions'
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'version', name='uq_document_versions_document_version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    file_name = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer)
+    mime_type = db.Column(db.String(100))
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    document = db.relationship('Document')
+    uploader = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<DocumentVersion {self.file_name} v{self.version}>'
\ No newline at end of file
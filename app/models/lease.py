@@ -1,8 +1,17 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
 from app import db
+from app.models.organization import OrganizationScoped
 
-class Lease(db.Model):
+class Lease(OrganizationScoped, db.Model):
     __tablename__ = 'leases'
+    __table_args__ = (
+        db.Index('ix_leases_org_status', 'organization_id', 'status'),
+        db.Index('ix_leases_org_property', 'organization_id', 'property_id'),
+        # Overlap checks: property_id = ? AND start_date <= ? AND end_date >= ?
+        db.Index('ix_leases_property_period', 'property_id', 'start_date', 'end_date'),
+        db.Index('ix_leases_org_tenant', 'organization_id', 'tenant_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -14,6 +23,9 @@ class Lease(db.Model):
     status = db.Column(db.Enum('active', 'expired', 'terminated', name='lease_statuses'), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     documents = db.relationship('Document', backref='lease', lazy=True)
@@ -23,4 +35,14 @@ class Lease(db.Model):
         return self.status == 'active' and self.start_date <= datetime.now().date() <= self.end_date
     
     def __repr__(self):
-        return f'<Lease {self.tenant.full_name} - {self.property.address}>'
\ No newline at end of file
+        return f'<Lease {self.tenant.full_name} - {self.property.address}>'
+
+# On PostgreSQL the database itself rejects overlapping leases on a property,
+# closing the race between two concurrent overlap checks. Existing databases
+# get the constraint from migration 7c2e4d1a9b35 (``flask db upgrade``).
+event.listen(Lease.__table__, 'after_create', DDL(
+    "CREATE EXTENSION IF NOT EXISTS btree_gist; "
+    "ALTER TABLE leases ADD CONSTRAINT leases_no_overlap EXCLUDE USING gist "
+    "(property_id WITH =, daterange(start_date, end_date, '[]') WITH &&) "
+    "WHERE (status <> 'terminated')"
+).execute_if(dialect='postgresql'))
\ No newline at end of file
@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+
+class LoginAttempt(db.Model):
+    """Failed login attempt, used by the shared (database) login rate-limit backend."""
+    __tablename__ = 'login_attempts'
+    __table_args__ = (
+        db.Index('ix_login_attempts_key_attempted', 'key', 'attempted_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(150), nullable=False)
+    attempted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<LoginAttempt {self.key} at {self.attempted_at}>'
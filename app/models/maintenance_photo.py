@@ -0,0 +1,28 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class MaintenancePhoto(OrganizationScoped, db.Model):
+    """Photo of a reported issue; its files are stored under ``content_hash``, outside the database."""
+    __tablename__ = 'maintenance_photos'
+    __table_args__ = (
+        db.Index('ix_maintenance_photos_status_created', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the request may since have moved to maintenance_requests_archive
+    request_id = db.Column(db.Integer, nullable=False, index=True)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # False when Pillow was unavailable and only the stripped original exists
+    resized = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.Enum('pending', 'processing', 'ready', 'failed', name='photo_statuses'), nullable=False, default='pending')
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<MaintenancePhoto {self.content_hash[:12]} for request {self.request_id}>'
\ No newline at end of file
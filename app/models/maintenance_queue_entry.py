@@ -0,0 +1,25 @@
+from app import db
+from app.models.organization import OrganizationScoped
+
+class MaintenanceQueueEntry(OrganizationScoped, db.Model):
+    """One row per open maintenance request, kept in sync by the workflow engine.
+
+    The maintenance board and overdue checks read this small table through
+    its indexes instead of sorting the full request history.
+    """
+    __tablename__ = 'maintenance_queue'
+    __table_args__ = (
+        db.Index('ix_maintenance_queue_org_priority_due', 'organization_id', 'priority_rank', 'due_at'),
+        db.Index('ix_maintenance_queue_org_due', 'organization_id', 'due_at'),
+    )
+    
+    request_id = db.Column(db.Integer, db.ForeignKey('maintenance_requests.id', ondelete='CASCADE'), primary_key=True)
+    priority_rank = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    
+    request = db.relationship('MaintenanceRequest', backref=db.backref('queue_entry', uselist=False, cascade='all, delete-orphan', passive_deletes=True))
+    
+    def __repr__(self):
+        return f'<MaintenanceQueueEntry {self.request_id} rank={self.priority_rank}>'
@@ -1,8 +1,15 @@
 from datetime import datetime
 from app import db
+from app.models.organization import OrganizationScoped
+from app.models.soft_delete import SoftDeletable
 
-class MaintenanceRequest(db.Model):
+class MaintenanceRequest(OrganizationScoped, SoftDeletable, db.Model):
     __tablename__ = 'maintenance_requests'
+    __table_args__ = (
+        db.Index('ix_maintenance_requests_org_status_updated', 'organization_id', 'status', 'updated_at'),
+        db.Index('ix_maintenance_requests_org_tenant_created', 'organization_id', 'tenant_id', 'created_at'),
+        db.Index('ix_maintenance_requests_status_closed', 'status', 'closed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -11,8 +18,24 @@ class MaintenanceRequest(db.Model):
     description = db.Column(db.Text, nullable=False)
     priority = db.Column(db.Enum('low', 'medium', 'high', 'urgent', name='priority_levels'), default='medium')
     status = db.Column(db.Enum('pending', 'in_progress', 'completed', 'cancelled', name='request_statuses'), default='pending')
+    assigned_to_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    vendor_name = db.Column(db.String(255))
+    cost = db.Column(db.Numeric(10, 2))
+    due_at = db.Column(db.DateTime)
+    closed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    assigned_to = db.relationship('User', foreign_keys=[assigned_to_id], backref='assigned_maintenance_requests')
+    status_history = db.relationship('MaintenanceStatusChange', backref='request', lazy=True, passive_deletes='all',
+                                     order_by='MaintenanceStatusChange.changed_at')
+    
+    @property
+    def is_overdue(self):
+        return self.due_at is not None and self.closed_at is None and self.due_at < datetime.utcnow()
     
     def __repr__(self):
-        return f'<MaintenanceRequest {self.title} - {self.status}>'
\ No newline at end of file
+        return f'<MaintenanceRequest {self.title} - {self.status}>'
@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+
+class MaintenanceStatusChange(db.Model):
+    """Append-only history of maintenance request transitions and assignments."""
+    __tablename__ = 'maintenance_status_changes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('maintenance_requests.id', ondelete='CASCADE'), nullable=False, index=True)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    changed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    note = db.Column(db.Text)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    actor = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<MaintenanceStatusChange {self.request_id}: {self.from_status} -> {self.to_status}>'
+
+@event.listens_for(MaintenanceStatusChange, 'before_update')
+@event.listens_for(MaintenanceStatusChange, 'before_delete')
+def _reject_history_rewrite(mapper, connection, target):
+    raise ValueError('Maintenance status history is append-only')
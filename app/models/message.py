@@ -1,8 +1,15 @@
 from datetime import datetime
 from app import db
+from app.models.organization import OrganizationScoped
+from app.models.soft_delete import SoftDeletable
 
-class Message(db.Model):
+class Message(OrganizationScoped, SoftDeletable, db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_org_recipient_sent', 'organization_id', 'recipient_id', 'sent_at'),
+        db.Index('ix_messages_org_sender_sent', 'organization_id', 'sender_id', 'sent_at'),
+        db.Index('ix_messages_read_sent', 'is_read', 'sent_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,34 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class MessageAttachment(OrganizationScoped, db.Model):
+    """Image or PDF sent with a message; the file itself lives in attachment storage, not the database."""
+    __tablename__ = 'message_attachments'
+    __table_args__ = (
+        db.Index('ix_message_attachments_status_created', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the message may since have moved to messages_archive
+    message_id = db.Column(db.Integer, index=True)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'))
+    storage_key = db.Column(db.String(255), nullable=False, unique=True)
+    file_name = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    # Images wait in 'pending' until the background worker has downscaled them
+    status = db.Column(db.Enum('pending', 'processing', 'ready', name='attachment_statuses'), nullable=False, default='ready')
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    uploader = db.relationship('User', foreign_keys=[uploader_id])
+    
+    @property
+    def is_image(self):
+        return self.content_type.startswith('image/')
+    
+    def __repr__(self):
+        return f'<MessageAttachment {self.file_name}>'
\ No newline at end of file
@@ -0,0 +1,51 @@
+from datetime import datetime
+from app import db
+
+class NotificationPreference(db.Model):
+    __tablename__ = 'notification_preferences'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    email_enabled = db.Column(db.Boolean, default=True)
+    sms_enabled = db.Column(db.Boolean, default=False)
+    # 0 sends as soon as possible; otherwise pending events are coalesced into one digest
+    digest_minutes = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    user = db.relationship('User', backref=db.backref('notification_preference', uselist=False))
+    
+    @property
+    def channels(self):
+        channels = []
+        if self.email_enabled:
+            channels.append('email')
+        if self.sms_enabled:
+            channels.append('sms')
+        return channels
+    
+    def __repr__(self):
+        return f'<NotificationPreference user={self.user_id}>'
+
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_status_created', 'status', 'created_at'),
+        db.Index('ix_notifications_user_status', 'user_id', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum('pending', 'sending', 'sent', 'failed', 'skipped', name='notification_statuses'), default='pending', nullable=False)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User', backref=db.backref('notifications', lazy='dynamic'))
+    
+    def __repr__(self):
+        return f'<Notification {self.event_type} to user={self.user_id} - {self.status}>'
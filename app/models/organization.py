@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy.orm import declared_attr
+from app import db
+
+class Organization(db.Model):
+    __tablename__ = 'organizations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Organization {self.name}>'
+
+class OrganizationScoped:
+    """Mixin for models partitioned by organization.
+
+    Queries against these models are filtered to the current organization
+    automatically (see ``app.tenancy``), and new rows inherit it on flush.
+    """
+    
+    @declared_attr
+    def organization_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
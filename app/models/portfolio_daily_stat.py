@@ -0,0 +1,21 @@
+from app import db
+from app.models.organization import OrganizationScoped
+
+class PortfolioDailyStat(OrganizationScoped, db.Model):
+    """Daily rollup across an organization's properties, written by the analytics job."""
+    __tablename__ = 'portfolio_daily_stats'
+    
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    properties = db.Column(db.Integer, nullable=False, default=0)
+    occupied = db.Column(db.Integer, nullable=False, default=0)
+    rent_roll = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    open_maintenance = db.Column(db.Integer, nullable=False, default=0)
+    maintenance_cost = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    @property
+    def occupancy_rate(self):
+        return self.occupied / self.properties if self.properties else 0.0
+    
+    def __repr__(self):
+        return f'<PortfolioDailyStat {self.organization_id} {self.day}>'
@@ -1,8 +1,12 @@
 from datetime import datetime
 from app import db
+from app.models.organization import OrganizationScoped
 
-class Property(db.Model):
+class Property(OrganizationScoped, db.Model):
     __tablename__ = 'properties'
+    __table_args__ = (
+        db.Index('ix_properties_org_owner', 'organization_id', 'owner_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -16,6 +20,9 @@ class Property(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     leases = db.relationship('Lease', backref='property', lazy=True)
@@ -25,7 +32,8 @@ class Property(db.Model):
     @property
     def current_tenant(self):
         from app.models.lease import Lease
-        active_lease = Lease.query.filter_by(property_id=self.id, status='active').first()
+        # Leases on a property do not overlap; a renewal signed ahead of time starts later
+        active_lease = Lease.query.filter_by(property_id=self.id, status='active').order_by(Lease.start_date).first()
         return active_lease.tenant if active_lease else None
     
     def __repr__(self):
@@ -0,0 +1,27 @@
+from app import db
+from app.models.organization import OrganizationScoped
+
+class PropertyDailyStat(OrganizationScoped, db.Model):
+    """Daily rollup per property, written by the analytics job.
+    
+    ``property_type`` and ``square_footage`` are copied from the property so
+    the analytics page can group and divide without joining back.
+    """
+    __tablename__ = 'property_daily_stats'
+    __table_args__ = (
+        db.Index('ix_property_daily_stats_org_day', 'organization_id', 'day'),
+    )
+    
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    property_type = db.Column(db.String(20), nullable=False)
+    square_footage = db.Column(db.Integer)
+    occupied = db.Column(db.Boolean, nullable=False, default=False)
+    rent_roll = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    open_maintenance = db.Column(db.Integer, nullable=False, default=0)
+    maintenance_cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    property = db.relationship('Property')
+    
+    def __repr__(self):
+        return f'<PropertyDailyStat {self.property_id} {self.day}>'
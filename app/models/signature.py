@@ -0,0 +1,83 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class SignatureRequest(OrganizationScoped, db.Model):
+    """A document sent to one signer; the link carries a token whose SHA-256 is ``token_hash``."""
+    __tablename__ = 'signature_requests'
+    __table_args__ = (
+        db.Index('ix_signature_requests_signer_status', 'signer_id', 'status'),
+        db.Index('ix_signature_requests_document_status', 'document_id', 'status'),
+        db.Index('ix_signature_requests_status_expires', 'status', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    signer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('signature_batches.id'), index=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    # Hash of the file when the request was sent; signing is refused if the file has changed since
+    document_sha256 = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Enum('pending', 'signed', 'declined', 'cancelled', 'expired', name='signature_request_statuses'),
+                       nullable=False, default='pending')
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime)
+    
+    document = db.relationship('Document')
+    signer = db.relationship('User', foreign_keys=[signer_id])
+    requester = db.relationship('User', foreign_keys=[requested_by])
+    signature = db.relationship('Signature', uselist=False, back_populates='request')
+    
+    @property
+    def is_open(self):
+        return self.status == 'pending' and self.expires_at > datetime.utcnow()
+    
+    def __repr__(self):
+        return f'<SignatureRequest document={self.document_id} signer={self.signer_id} - {self.status}>'
+
+class Signature(OrganizationScoped, db.Model):
+    """The record of a completed signature, sealed with an HMAC over what was signed and by whom."""
+    __tablename__ = 'signatures'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('signature_requests.id'), nullable=False, unique=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
+    signer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    signed_name = db.Column(db.String(200), nullable=False)
+    # SHA-256 of the exact bytes the signer was shown and agreed to
+    document_sha256 = db.Column(db.String(64), nullable=False)
+    seal = db.Column(db.String(64), nullable=False)
+    ip_address = db.Column(db.String(45))
+    user_agent = db.Column(db.String(255))
+    signed_at = db.Column(db.DateTime, nullable=False)
+    
+    request = db.relationship('SignatureRequest', back_populates='signature')
+    signer = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<Signature document={self.document_id} signer={self.signer_id}>'
+
+class SignatureBatch(OrganizationScoped, db.Model):
+    """A queued "send all renewals for signature" job, worked through by the background runner."""
+    __tablename__ = 'signature_batches'
+    __table_args__ = (
+        db.Index('ix_signature_batches_status_created', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.Enum('queued', 'running', 'done', 'failed', name='signature_batch_statuses'),
+                       nullable=False, default='queued')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    
+    creator = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<SignatureBatch {self.id} - {self.status}>'
\ No newline at end of file
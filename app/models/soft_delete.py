@@ -0,0 +1,38 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import declared_attr, with_loader_criteria
+from app import db
+
+class SoftDeletable:
+    """Mixin for rows that are hidden instead of deleted.
+    
+    ORM queries, including relationship loads, skip rows with ``deleted_at``
+    set unless the statement runs with ``execution_options(include_deleted=True)``.
+    The archival job later moves them out of the hot table for good.
+    """
+    
+    @declared_attr
+    def deleted_at(cls):
+        return db.Column(db.DateTime)
+    
+    @property
+    def is_deleted(self):
+        return self.deleted_at is not None
+    
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+    
+    def restore(self):
+        self.deleted_at = None
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _hide_deleted_rows(execute_state):
+    # Column loads refresh an object already in hand, so they must still find it
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.execution_options.get('include_deleted', False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(SoftDeletable, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+from app.models.organization import OrganizationScoped
+
+class StorageUsage(OrganizationScoped, db.Model):
+    """Running total of attachment bytes per user or property, kept in step with every upload."""
+    __tablename__ = 'storage_usage'
+    
+    scope = db.Column(db.Enum('user', 'property', name='storage_scopes'), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0)
+    files = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StorageUsage {self.scope} {self.owner_id}: {self.bytes_used} bytes>'
\ No newline at end of file
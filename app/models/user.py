@@ -1,10 +1,15 @@
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from app import db
+from app.models.organization import OrganizationScoped
 
-class User(UserMixin, db.Model):
+class User(OrganizationScoped, UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_org_role', 'organization_id', 'role', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -19,14 +24,15 @@ class User(UserMixin, db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
+    organization = db.relationship('Organization', backref=db.backref('members', lazy='dynamic'))
     properties_owned = db.relationship('Property', backref='owner', lazy=True, foreign_keys='Property.owner_id')
     leases = db.relationship('Lease', backref='tenant', lazy=True, foreign_keys='Lease.tenant_id')
     sent_messages = db.relationship('Message', backref='sender', lazy=True, foreign_keys='Message.sender_id')
     received_messages = db.relationship('Message', backref='recipient', lazy=True, foreign_keys='Message.recipient_id')
-    maintenance_requests = db.relationship('MaintenanceRequest', backref='tenant', lazy=True)
+    maintenance_requests = db.relationship('MaintenanceRequest', backref='tenant', lazy=True, foreign_keys='MaintenanceRequest.tenant_id')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+
+class UserSession(db.Model):
+    """Server-side session data; the browser's cookie only holds the signed token for ``id``."""
+    __tablename__ = 'user_sessions'
+    
+    # SHA-256 of the token, so rows read from the database can't be replayed as cookies
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, index=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<UserSession for user {self.user_id}>'
\ No newline at end of file
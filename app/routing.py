@@ -0,0 +1,128 @@
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from app.assets import STATIC_ENDPOINTS
+
+READ_ONLY_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+class ReplicaRouter:
+    """Round-robin over replica binds, skipping any that failed a recent health check."""
+
+    def __init__(self, bind_keys, check_interval=30):
+        self.bind_keys = list(bind_keys)
+        self.check_interval = check_interval
+        self._cycle = itertools.cycle(self.bind_keys)
+        self._lock = threading.Lock()
+        self._healthy = {key: True for key in self.bind_keys}
+        self._checked_at = {key: 0.0 for key in self.bind_keys}
+
+    def choose(self, engines):
+        """Return the next healthy replica engine, or ``None`` to fall back to the primary."""
+        for _ in range(len(self.bind_keys)):
+            with self._lock:
+                key = next(self._cycle)
+            if self.is_healthy(key, engines[key]):
+                return engines[key]
+        return None
+
+    def is_healthy(self, key, engine):
+        if time.monotonic() - self._checked_at[key] >= self.check_interval:
+            self.check(key, engine)
+        return self._healthy[key]
+
+    def check(self, key, engine):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            healthy = True
+        except Exception:
+            current_app.logger.warning('Replica %s failed health check', key)
+            healthy = False
+        self._healthy[key] = healthy
+        self._checked_at[key] = time.monotonic()
+        return healthy
+
+    def status(self):
+        return dict(self._healthy)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica while the current request is read-only.
+
+    Flushes always go to the primary, as does anything outside a request
+    (CLI commands, scripts) or any model with its own ``bind_key``.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._flushing or not _reads_from_replica():
+            return primary
+
+        engines = self._db.engines
+        if primary is not engines.get(None):
+            return primary
+
+        router = current_app.extensions.get('replica_router')
+        if router is None:
+            return primary
+        return router.choose(engines) or primary
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_to_primary(db_session, flush_context):
+    # Once this request has written, later reads must see the write
+    if has_request_context():
+        g.db_use_replica = False
+        g.db_wrote = True
+
+
+def _reads_from_replica():
+    return has_request_context() and g.get('db_use_replica', False)
+
+
+def configure_replica_binds(app):
+    """Register ``SQLALCHEMY_REPLICA_URIS`` as ``replica_<n>`` binds. Call before ``db.init_app``."""
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    if not uris:
+        return []
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    bind_keys = []
+    for index, uri in enumerate(uris):
+        key = f'{REPLICA_BIND_PREFIX}{index}'
+        binds[key] = {'url': uri, **app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS', {})}
+        bind_keys.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    return bind_keys
+
+
+def init_replica_routing(app, bind_keys):
+    if not bind_keys:
+        return
+
+    app.extensions['replica_router'] = ReplicaRouter(
+        bind_keys, check_interval=app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 30)
+    )
+    window = app.config.get('REPLICA_READ_AFTER_WRITE_SECONDS', 5)
+
+    @app.before_request
+    def choose_read_target():
+        # A user who just wrote keeps reading from the primary until the
+        # replicas have had time to catch up (e.g. the redirect after a POST)
+        if request.endpoint in STATIC_ENDPOINTS:
+            return
+        pinned_until = session.get('_db_primary_until', 0)
+        g.db_use_replica = request.method in READ_ONLY_METHODS and time.time() >= pinned_until
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote'):
+            session['_db_primary_until'] = time.time() + window
+        return response
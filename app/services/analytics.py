@@ -0,0 +1,330 @@
+"""
+Occupancy and vacancy analytics.
+
+The analytics job materializes one row per property per day into
+``property_daily_stats`` (occupied, rent roll, open maintenance requests,
+maintenance cost closed that day) and one row per organization per day into
+``portfolio_daily_stats``. The analytics page reads only these tables.
+
+A range is computed by turning every lease and maintenance request into a
+day interval and summing the intervals with a difference array (+value on
+the first day, -value the day after the last, then a running sum), so the
+work is O(leases + requests + properties x days) instead of
+O(leases x days). The whole property x day grid is built with a few
+vectorized NumPy operations; NumPy is in requirements.txt, and the same
+algorithm in plain Python is only a fallback for environments without it.
+"""
+
+import functools
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, or_
+
+from app import db
+from app.models.archived_maintenance_request import ArchivedMaintenanceRequest
+from app.models.lease import Lease
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.portfolio_daily_stat import PortfolioDailyStat
+from app.models.property import Property
+from app.models.property_daily_stat import PropertyDailyStat
+
+
+@functools.cache
+def load_numpy():
+    """NumPy, or None when it is not installed.
+
+    Imported on first use: it outweighs the rest of the app's imports.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+# Interval arithmetic
+
+def interval_sums(n_rows, first_day, n_days, rows, starts, ends, values):
+    """Sum ``values`` over inclusive day intervals into an ``n_rows`` x ``n_days`` grid.
+
+    ``starts``/``ends`` are date ordinals; intervals are clipped to
+    ``[first_day, first_day + n_days)`` and empty ones are ignored. Returns a
+    NumPy array when NumPy is available, otherwise a list of lists.
+    """
+    if load_numpy() is not None:
+        return _interval_sums_numpy(n_rows, first_day, n_days, rows, starts, ends, values)
+    return _interval_sums_python(n_rows, first_day, n_days, rows, starts, ends, values)
+
+
+def _interval_sums_numpy(n_rows, first_day, n_days, rows, starts, ends, values):
+    np = load_numpy()
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.maximum(np.asarray(starts, dtype=np.int64) - first_day, 0)
+    ends = np.minimum(np.asarray(ends, dtype=np.int64) - first_day, n_days - 1)
+    values = np.asarray(values, dtype=np.float64)
+    keep = starts <= ends
+
+    diff = np.zeros((n_rows, n_days + 1))
+    np.add.at(diff, (rows[keep], starts[keep]), values[keep])
+    np.add.at(diff, (rows[keep], ends[keep] + 1), -values[keep])
+    return np.cumsum(diff[:, :-1], axis=1)
+
+
+def _interval_sums_python(n_rows, first_day, n_days, rows, starts, ends, values):
+    diff = [[0.0] * (n_days + 1) for _ in range(n_rows)]
+    for row, start, end, value in zip(rows, starts, ends, values):
+        start = max(start - first_day, 0)
+        end = min(end - first_day, n_days - 1)
+        if start <= end:
+            diff[row][start] += value
+            diff[row][end + 1] -= value
+
+    grid = []
+    for row in diff:
+        running = 0.0
+        sums = []
+        for delta in row[:-1]:
+            running += delta
+            sums.append(running)
+        grid.append(sums)
+    return grid
+
+
+# Rollup computation
+
+def _load_properties():
+    properties = (
+        db.session.query(
+            Property.id, Property.organization_id, Property.property_type,
+            Property.square_footage, Property.created_at,
+        )
+        .order_by(Property.id)
+        .all()
+    )
+    first_lease = dict(
+        db.session.query(Lease.property_id, func.min(Lease.start_date))
+        .group_by(Lease.property_id)
+        .all()
+    )
+    # A property is in the portfolio from its first lease or its creation, whichever came first
+    since = {}
+    for prop in properties:
+        created = prop.created_at.date() if prop.created_at else date.max
+        since[prop.id] = min(created, first_lease.get(prop.id, date.max))
+    return properties, since
+
+
+def _lease_intervals(start, end):
+    leases = (
+        db.session.query(Lease.property_id, Lease.start_date, Lease.end_date, Lease.monthly_rent,
+                         Lease.status, Lease.updated_at)
+        .filter(Lease.start_date <= end, Lease.end_date >= start)
+        .all()
+    )
+    for lease in leases:
+        last_day = lease.end_date
+        if lease.status == 'terminated' and lease.updated_at:
+            # Terminated early: occupied until the termination was recorded
+            last_day = min(last_day, lease.updated_at.date())
+        rent = float(lease.monthly_rent or 0)
+        yield lease.property_id, lease.start_date.toordinal(), last_day.toordinal(), rent
+
+
+def _maintenance_rows(start, end):
+    window_start = datetime.combine(start, datetime.min.time())
+    window_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    # Back-fills reach into periods whose closed requests were already archived
+    for model in (MaintenanceRequest, ArchivedMaintenanceRequest):
+        yield from (
+            db.session.query(model.property_id, model.created_at, model.closed_at, model.cost)
+            .filter(
+                model.deleted_at.is_(None),
+                model.created_at < window_end,
+                or_(model.closed_at.is_(None), model.closed_at >= window_start),
+            )
+            .all()
+        )
+
+
+def compute_rollups(start, end):
+    """Return ``(property_rows, portfolio_rows)`` for every day in ``[start, end]``."""
+    properties, since = _load_properties()
+    index = {prop.id: i for i, prop in enumerate(properties)}
+    first_day = start.toordinal()
+    n_days = (end - start).days + 1
+    n_rows = len(properties)
+
+    leases = [(index[p], s, e, rent) for p, s, e, rent in _lease_intervals(start, end) if p in index]
+    occupancy = interval_sums(n_rows, first_day, n_days, *_columns(leases, 4, value=1.0))
+    rent_roll = interval_sums(n_rows, first_day, n_days, *_columns(leases, 4))
+
+    open_intervals = []
+    costs = []
+    for property_id, created_at, closed_at, cost in _maintenance_rows(start, end):
+        if property_id not in index:
+            continue
+        row = index[property_id]
+        # Open from the day it was reported until the day before it was closed
+        last_open = (closed_at.date() - timedelta(days=1)).toordinal() if closed_at else end.toordinal()
+        open_intervals.append((row, created_at.date().toordinal(), last_open, 1.0))
+        if closed_at and cost:
+            costs.append((row, closed_at.date().toordinal(), closed_at.date().toordinal(), float(cost)))
+    open_maintenance = interval_sums(n_rows, first_day, n_days, *_columns(open_intervals, 4))
+    maintenance_cost = interval_sums(n_rows, first_day, n_days, *_columns(costs, 4))
+
+    # Plain lists for the per-day loop below; indexing NumPy scalars one by one is slower
+    occupancy, rent_roll, open_maintenance, maintenance_cost = (
+        grid.tolist() if hasattr(grid, 'tolist') else grid
+        for grid in (occupancy, rent_roll, open_maintenance, maintenance_cost)
+    )
+
+    property_rows = []
+    portfolio = {}
+    for i, prop in enumerate(properties):
+        first = max(0, since[prop.id].toordinal() - first_day) if since[prop.id] != date.max else n_days
+        for d in range(first, n_days):
+            day = date.fromordinal(first_day + d)
+            row = {
+                'property_id': prop.id,
+                'organization_id': prop.organization_id,
+                'day': day,
+                'property_type': prop.property_type,
+                'square_footage': prop.square_footage,
+                'occupied': occupancy[i][d] > 0.5,
+                'rent_roll': round(rent_roll[i][d], 2),
+                'open_maintenance': int(round(open_maintenance[i][d])),
+                'maintenance_cost': round(maintenance_cost[i][d], 2),
+            }
+            property_rows.append(row)
+
+            totals = portfolio.setdefault((prop.organization_id, day), {
+                'organization_id': prop.organization_id, 'day': day, 'properties': 0, 'occupied': 0,
+                'rent_roll': 0.0, 'open_maintenance': 0, 'maintenance_cost': 0.0,
+            })
+            totals['properties'] += 1
+            totals['occupied'] += row['occupied']
+            totals['rent_roll'] += row['rent_roll']
+            totals['open_maintenance'] += row['open_maintenance']
+            totals['maintenance_cost'] += row['maintenance_cost']
+
+    return property_rows, list(portfolio.values())
+
+
+def _columns(intervals, width, value=None):
+    """Split ``(row, start, end, value)`` tuples into column lists, optionally overriding the value."""
+    if not intervals:
+        return [[] for _ in range(width)]
+    rows, starts, ends, values = (list(column) for column in zip(*intervals))
+    if value is not None:
+        values = [value] * len(rows)
+    return rows, starts, ends, values
+
+
+def refresh(start, end):
+    """Recompute and replace the rollups for ``[start, end]``, one chunk of days per transaction."""
+    chunk = timedelta(days=current_app.config['ANALYTICS_CHUNK_DAYS'])
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + chunk - timedelta(days=1))
+        property_rows, portfolio_rows = compute_rollups(chunk_start, chunk_end)
+        for model in (PropertyDailyStat, PortfolioDailyStat):
+            db.session.execute(delete(model).where(model.day.between(chunk_start, chunk_end)))
+        if property_rows:
+            db.session.execute(insert(PropertyDailyStat), property_rows)
+        if portfolio_rows:
+            db.session.execute(insert(PortfolioDailyStat), portfolio_rows)
+        db.session.commit()
+        written += len(property_rows)
+        chunk_start = chunk_end + timedelta(days=1)
+    return written
+
+
+def refresh_recent(today=None):
+    """Incremental refresh: recompute the last few days already rolled up and everything after them.
+
+    The look-back picks up leases and requests edited after their day was
+    rolled up. With no rollups yet, the default back-fill window is used.
+    """
+    config = current_app.config
+    today = today or date.today()
+    last_day = db.session.query(func.max(PortfolioDailyStat.day)).scalar()
+    if last_day is None:
+        start = today - timedelta(days=config['ANALYTICS_BACKFILL_DAYS'])
+    else:
+        start = min(last_day, today) - timedelta(days=config['ANALYTICS_REFRESH_LOOKBACK_DAYS'])
+    return start, refresh(start, today)
+
+
+# Queries for the analytics page; all read the rollup tables only
+
+def portfolio_series(start, end):
+    return (
+        PortfolioDailyStat.query
+        .filter(PortfolioDailyStat.day.between(start, end))
+        .order_by(PortfolioDailyStat.day)
+        .all()
+    )
+
+
+def property_summary(start, end):
+    occupied_days = func.sum(case((PropertyDailyStat.occupied, 1), else_=0))
+    return (
+        db.session.query(
+            PropertyDailyStat.property_id,
+            func.count().label('days'),
+            occupied_days.label('occupied_days'),
+            (func.count() - occupied_days).label('vacancy_days'),
+            func.avg(PropertyDailyStat.open_maintenance).label('avg_open_maintenance'),
+            func.sum(PropertyDailyStat.maintenance_cost).label('maintenance_cost'),
+        )
+        .filter(PropertyDailyStat.day.between(start, end))
+        .group_by(PropertyDailyStat.property_id)
+        .order_by(PropertyDailyStat.property_id)
+        .all()
+    )
+
+
+def rent_per_sqft_by_type(day):
+    """Monthly rent per square foot of occupied space on ``day``, by property type."""
+    return (
+        db.session.query(
+            PropertyDailyStat.property_type,
+            func.count().label('properties'),
+            (func.sum(PropertyDailyStat.rent_roll) / func.sum(PropertyDailyStat.square_footage)).label('rent_per_sqft'),
+        )
+        .filter(
+            PropertyDailyStat.day == day,
+            PropertyDailyStat.occupied.is_(True),
+            PropertyDailyStat.square_footage > 0,
+        )
+        .group_by(PropertyDailyStat.property_type)
+        .order_by(PropertyDailyStat.property_type)
+        .all()
+    )
+
+
+analytics_cli = AppGroup('analytics', help='Occupancy and vacancy rollups.')
+
+
+@analytics_cli.command('refresh')
+def refresh_command():
+    """Roll up the days since the last run (schedule nightly)."""
+    start, written = refresh_recent()
+    click.echo(f'Refreshed {written} property-days from {start.isoformat()}')
+
+
+@analytics_cli.command('backfill')
+@click.option('--start', 'start', required=True, type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--end', 'end', default=None, type=click.DateTime(formats=['%Y-%m-%d']), help='Defaults to today.')
+def backfill_command(start, end):
+    """Recompute the rollups for a date range."""
+    end = end.date() if end else date.today()
+    click.echo(f'Back-filled {refresh(start.date(), end)} property-days')
+
+
+def init_analytics(app):
+    app.cli.add_command(analytics_cli)
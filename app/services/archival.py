@@ -0,0 +1,149 @@
+"""
+Retention and archival.
+
+Read messages and closed maintenance requests past their retention age, and
+soft-deleted rows past the undo window, are moved from the hot tables into
+``messages_archive`` / ``maintenance_requests_archive``. Each batch copies
+and deletes at most ``ARCHIVE_BATCH_SIZE`` rows in its own short
+transaction, so the job can run alongside live traffic (schedule
+``flask archive run`` from cron) and resumes where it stopped if interrupted.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, delete, insert, or_, select
+
+from app import db
+from app.models.archived_maintenance_request import ArchivedMaintenanceRequest
+from app.models.archived_message import ArchivedMessage
+from app.models.maintenance_queue_entry import MaintenanceQueueEntry
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.maintenance_status_change import MaintenanceStatusChange
+from app.models.message import Message
+
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+
+def _move_batch(table, archive_table, criteria, batch_size, before_delete=None):
+    """Copy up to ``batch_size`` matching rows into ``archive_table`` and delete them; returns the count."""
+    # Core table statements: the soft-delete filter must not hide rows from the job
+    ids = db.session.execute(
+        select(table.c.id).where(criteria).order_by(table.c.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [dict(row, archived_at=now) for row in db.session.execute(select(table).where(table.c.id.in_(ids))).mappings()]
+    if before_delete is not None:
+        before_delete(ids, rows)
+    db.session.execute(insert(archive_table), rows)
+    db.session.execute(delete(table).where(table.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+
+def _inline_history(ids, rows):
+    history_table = MaintenanceStatusChange.__table__
+    history = {}
+    for change in db.session.execute(
+        select(history_table).where(history_table.c.request_id.in_(ids)).order_by(history_table.c.changed_at)
+    ).mappings():
+        history.setdefault(change['request_id'], []).append({
+            'from_status': change['from_status'],
+            'to_status': change['to_status'],
+            'changed_by': change['changed_by'],
+            'note': change['note'],
+            'changed_at': change['changed_at'].isoformat(),
+        })
+    for row in rows:
+        row['status_history'] = history.get(row['id'], [])
+    # The history lives on in the archive row; this is the only path allowed to remove it
+    db.session.execute(delete(history_table).where(history_table.c.request_id.in_(ids)))
+    queue_table = MaintenanceQueueEntry.__table__
+    db.session.execute(delete(queue_table).where(queue_table.c.request_id.in_(ids)))
+
+
+def archive_messages(now=None, batch_size=None, max_batches=None):
+    config = current_app.config
+    now = now or datetime.utcnow()
+    table = Message.__table__
+    criteria = or_(
+        and_(table.c.is_read.is_(True), table.c.sent_at < now - timedelta(days=config['MESSAGE_ARCHIVE_AFTER_DAYS'])),
+        table.c.deleted_at < now - timedelta(days=config['SOFT_DELETE_RETENTION_DAYS']),
+    )
+    return _run(table, ArchivedMessage.__table__, criteria, batch_size, max_batches)
+
+
+def archive_maintenance_requests(now=None, batch_size=None, max_batches=None):
+    config = current_app.config
+    now = now or datetime.utcnow()
+    table = MaintenanceRequest.__table__
+    criteria = or_(
+        and_(
+            table.c.status.in_(CLOSED_STATUSES),
+            table.c.closed_at < now - timedelta(days=config['MAINTENANCE_ARCHIVE_AFTER_DAYS']),
+        ),
+        table.c.deleted_at < now - timedelta(days=config['SOFT_DELETE_RETENTION_DAYS']),
+    )
+    return _run(table, ArchivedMaintenanceRequest.__table__, criteria, batch_size, max_batches, _inline_history)
+
+
+def _run(table, archive_table, criteria, batch_size, max_batches, before_delete=None):
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    pause = current_app.config['ARCHIVE_BATCH_PAUSE']
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = _move_batch(table, archive_table, criteria, batch_size, before_delete)
+        moved += count
+        batches += 1
+        if count < batch_size:
+            break
+        # Let other writers in between batches
+        time.sleep(pause)
+    return moved
+
+
+def search_archive(query, user, limit=50):
+    """Archived maintenance requests and messages whose text contains ``query``, newest first.
+
+    Messages are limited to conversations ``user`` took part in, as in the live message list.
+    """
+    pattern = f'%{query}%'
+    requests = (
+        ArchivedMaintenanceRequest.query
+        .filter(or_(ArchivedMaintenanceRequest.title.ilike(pattern), ArchivedMaintenanceRequest.description.ilike(pattern)))
+        .order_by(ArchivedMaintenanceRequest.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    messages = (
+        ArchivedMessage.query
+        .filter(ArchivedMessage.message_text.ilike(pattern))
+        .filter(or_(ArchivedMessage.sender_id == user.id, ArchivedMessage.recipient_id == user.id))
+        .order_by(ArchivedMessage.sent_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return requests, messages
+
+
+archive_cli = AppGroup('archive', help='Retention and archival.')
+
+
+@archive_cli.command('run')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction; defaults to ARCHIVE_BATCH_SIZE.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches per table.')
+def run_command(batch_size, max_batches):
+    """Move old read messages, closed maintenance requests and expired soft deletes to the archive tables."""
+    messages = archive_messages(batch_size=batch_size, max_batches=max_batches)
+    requests = archive_maintenance_requests(batch_size=batch_size, max_batches=max_batches)
+    click.echo(f'Archived {messages} messages and {requests} maintenance requests')
+
+
+def init_archival(app):
+    app.cli.add_command(archive_cli)
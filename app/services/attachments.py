@@ -0,0 +1,460 @@
+"""
+Message attachments.
+
+An upload is copied from the request stream into attachment storage (a
+directory outside the database, ``ATTACHMENT_STORAGE_PATH``) in fixed-size
+chunks, hashed and measured on the way, so a file is never held in memory
+and an oversized one is cut off at ``ATTACHMENT_MAX_SIZE``. The type comes
+from the file's leading bytes, not its name or what the browser claims.
+
+Quotas are enforced with ``storage_usage`` counters. One conditional UPDATE
+per scope (uploader and property) adds the file's size only if the total
+stays under the limit, in the same transaction as the message, so
+concurrent uploads can't both slip under a limit and nothing ever sums the
+attachments table on the request path.
+
+Images are stored as uploaded and marked ``pending``. A background worker
+(a thread in each web process, or ``flask attachments run``) claims them,
+downscales anything larger than ``ATTACHMENT_IMAGE_MAX_DIMENSION`` with
+Pillow and credits the bytes saved back to the counters. Without Pillow
+installed images are kept as uploaded.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, send_file, url_for
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.archived_message import ArchivedMessage
+from app.models.message import Message
+from app.models.message_attachment import MessageAttachment
+from app.models.storage_usage import StorageUsage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+WRITTEN_KEY = 'attachment_files_written'
+QUEUED_KEY = 'attachments_queued'
+# Leading bytes of each accepted file type
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'GIF87a', 'image/gif', '.gif'),
+    (b'GIF89a', 'image/gif', '.gif'),
+    (b'%PDF-', 'application/pdf', '.pdf'),
+]
+# Types the worker downscales; GIFs may be animated and are kept as they are
+RESIZABLE = {'image/jpeg': 'JPEG', 'image/png': 'PNG', 'image/webp': 'WEBP'}
+
+
+class AttachmentError(Exception):
+    """The upload was rejected; the message can be shown to the user."""
+
+
+def sniff(head):
+    """``(content_type, extension)`` for the first bytes of a file, or None if the type is not accepted."""
+    for signature, content_type, extension in SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', '.webp'
+    return None
+
+
+def storage_root(app=None):
+    app = app or current_app
+    return app.config['ATTACHMENT_STORAGE_PATH'] or os.path.join(app.instance_path, 'attachments')
+
+
+def storage_path(key):
+    return os.path.join(storage_root(), *key.split('/'))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_stream(stream, head, directory, max_size):
+    """Write ``head`` and the rest of ``stream`` to a temporary file in ``directory``.
+
+    Returns ``(path, size, sha256)``, or None once more than ``max_size``
+    bytes have been read (nothing is left on disk then).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+    except BaseException:
+        os.unlink(path)
+        raise
+    if size > max_size:
+        os.unlink(path)
+        return None
+    return path, size, digest.hexdigest()
+
+
+# Quota counters
+
+def _reserve(scope, owner_id, size, limit):
+    """Add ``size`` bytes and one file to a usage counter unless that passes ``limit``; False when it would."""
+    for _ in range(2):
+        reserved = db.session.execute(
+            update(StorageUsage)
+            .where(
+                StorageUsage.scope == scope,
+                StorageUsage.owner_id == owner_id,
+                StorageUsage.bytes_used + size <= limit,
+            )
+            .values(bytes_used=StorageUsage.bytes_used + size, files=StorageUsage.files + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if reserved:
+            return True
+        if db.session.get(StorageUsage, (scope, owner_id)) is not None:
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.add(StorageUsage(scope=scope, owner_id=owner_id, bytes_used=0, files=0))
+        except IntegrityError:
+            pass  # another upload created the counter first
+    return False
+
+
+def _adjust(scope, owner_id, delta):
+    db.session.execute(
+        update(StorageUsage)
+        .where(StorageUsage.scope == scope, StorageUsage.owner_id == owner_id)
+        .values(bytes_used=StorageUsage.bytes_used + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def usage(scope, owner_id):
+    """Bytes charged to a user or property so far (one primary-key read)."""
+    counter = db.session.get(StorageUsage, (scope, owner_id))
+    return counter.bytes_used if counter else 0
+
+
+def recount():
+    """Rebuild every counter from the attachments table; for repairs, not the request path."""
+    db.session.execute(delete(StorageUsage))
+    for scope, owner in (('user', MessageAttachment.uploader_id), ('property', MessageAttachment.property_id)):
+        rows = (
+            db.session.query(owner, MessageAttachment.organization_id,
+                             func.sum(MessageAttachment.size), func.count())
+            .filter(owner.isnot(None))
+            .group_by(owner, MessageAttachment.organization_id)
+            .all()
+        )
+        if rows:
+            db.session.execute(insert(StorageUsage), [
+                {'scope': scope, 'owner_id': owner_id, 'organization_id': organization_id,
+                 'bytes_used': total, 'files': files}
+                for owner_id, organization_id, total, files in rows
+            ])
+    db.session.commit()
+
+
+# Uploads
+
+def store(upload, uploader, property_id=None):
+    """Save an uploaded file and charge it to the uploader's and the property's quotas.
+
+    The new ``MessageAttachment`` is added to the session; link it to its
+    message with ``attach()``. Raises ``AttachmentError`` when the file is
+    rejected, leaving the session as it was.
+    """
+    config = current_app.config
+    head = upload.stream.read(CHUNK_SIZE)
+    kind = sniff(head)
+    if kind is None:
+        raise AttachmentError('Attachments must be JPEG, PNG, GIF or WebP images, or PDF files.')
+    content_type, extension = kind
+
+    root = storage_root()
+    incoming = os.path.join(root, 'incoming')
+    os.makedirs(incoming, exist_ok=True)
+    copied = copy_stream(upload.stream, head, incoming, config['ATTACHMENT_MAX_SIZE'])
+    if copied is None:
+        raise AttachmentError(f'Attachments can be at most {config["ATTACHMENT_MAX_SIZE"] // (1024 * 1024)} MB.')
+    temp_path, size, sha256 = copied
+    try:
+        with db.session.begin_nested():
+            if not _reserve('user', uploader.id, size, config['ATTACHMENT_USER_QUOTA']):
+                raise AttachmentError('You have used all of your attachment storage.')
+            if property_id and not _reserve('property', property_id, size, config['ATTACHMENT_PROPERTY_QUOTA']):
+                raise AttachmentError('This property has used all of its attachment storage.')
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    key = f'{sha256[:2]}/{uuid.uuid4().hex}{extension}'
+    path = storage_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_path, path)
+    db.session.info.setdefault(WRITTEN_KEY, []).append(path)
+
+    pending = Image is not None and content_type in RESIZABLE
+    attachment = MessageAttachment(
+        uploader_id=uploader.id,
+        property_id=property_id,
+        storage_key=key,
+        file_name=secure_filename(upload.filename or '') or f'attachment{extension}',
+        content_type=content_type,
+        size=size,
+        sha256=sha256,
+        status='pending' if pending else 'ready',
+    )
+    db.session.add(attachment)
+    if pending:
+        db.session.info[QUEUED_KEY] = True
+    return attachment
+
+
+def attach(attachment, message):
+    """Link ``attachment`` to ``message`` and point ``message.attachment_url`` at it."""
+    db.session.flush()
+    attachment.message_id = message.id
+    message.attachment_url = url_for('main.message_attachment', attachment_id=attachment.id,
+                                     filename=attachment.file_name)
+
+
+def can_view(attachment, user):
+    if user.is_admin() or attachment.uploader_id == user.id:
+        return True
+    # Participants keep access after the message is deleted or moved to the archive
+    for model in (Message, ArchivedMessage):
+        if db.session.query(
+            model.query
+            .filter(model.id == attachment.message_id)
+            .filter(or_(model.recipient_id == user.id, model.sender_id == user.id))
+            .exists()
+        ).execution_options(include_deleted=True).scalar():
+            return True
+    return False
+
+
+def send_attachment(attachment):
+    """Serve the file with a content-hash ETag, so repeat views are answered with 304 Not Modified."""
+    response = send_file(
+        storage_path(attachment.storage_key),
+        mimetype=attachment.content_type,
+        download_name=attachment.file_name,
+        conditional=True,
+        etag=attachment.sha256,
+        max_age=current_app.config['ATTACHMENT_CACHE_MAX_AGE'],
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_processor(session):
+    session.info.pop(WRITTEN_KEY, None)
+    if session.info.pop(QUEUED_KEY, False):
+        processor = current_app.extensions.get('attachment_processor')
+        if processor is not None and processor.inline:
+            processor.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _remove_unsaved_files(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        # A savepoint rolled back; the outer transaction may still commit
+        # rows that refer to these files
+        return
+    session.info.pop(QUEUED_KEY, None)
+    for path in session.info.pop(WRITTEN_KEY, []):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# Background downscaling
+
+def downscale(attachment):
+    """Shrink an image to ``ATTACHMENT_IMAGE_MAX_DIMENSION`` on its longest side and credit the bytes saved."""
+    limit = current_app.config['ATTACHMENT_IMAGE_MAX_DIMENSION']
+    path = storage_path(attachment.storage_key)
+    with Image.open(path) as image:
+        if max(image.size) <= limit:
+            return
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.resize-')
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, RESIZABLE[attachment.content_type], optimize=True, quality=85)
+
+    size = os.path.getsize(temp_path)
+    if size >= attachment.size:
+        os.unlink(temp_path)
+        return
+    os.replace(temp_path, path)
+    delta = size - attachment.size
+    _adjust('user', attachment.uploader_id, delta)
+    if attachment.property_id:
+        _adjust('property', attachment.property_id, delta)
+    attachment.size = size
+    attachment.sha256 = file_sha256(path)
+
+
+def claim_pending(limit):
+    """Claim up to ``limit`` pending attachments with a conditional UPDATE each; returns their ids."""
+    now = datetime.utcnow()
+    candidates = (
+        db.session.query(MessageAttachment.id)
+        .filter(MessageAttachment.status == 'pending')
+        .order_by(MessageAttachment.created_at)
+        .limit(limit)
+        .all()
+    )
+    claimed = []
+    for (attachment_id,) in candidates:
+        if (
+            MessageAttachment.query
+            .filter_by(id=attachment_id, status='pending')
+            .update({'status': 'processing', 'claimed_at': now}, synchronize_session=False)
+        ):
+            claimed.append(attachment_id)
+    db.session.commit()
+    return claimed
+
+
+def release_stale_claims(older_than=timedelta(minutes=15)):
+    """Return attachments left in ``processing`` by a worker that died to the queue."""
+    cutoff = datetime.utcnow() - older_than
+    released = (
+        MessageAttachment.query
+        .filter(MessageAttachment.status == 'processing', MessageAttachment.claimed_at < cutoff)
+        .update({'status': 'pending'}, synchronize_session=False)
+    )
+    db.session.commit()
+    return released
+
+
+class AttachmentProcessor:
+    def __init__(self, app):
+        self.app = app
+        self.inline = app.config['ATTACHMENT_INLINE_WORKER'] and Image is not None
+        self.poll_interval = app.config['ATTACHMENT_POLL_INTERVAL']
+        self.batch_size = app.config['ATTACHMENT_BATCH_SIZE']
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        # Started lazily so gunicorn workers each get their own thread after forking
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='attachment-processor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_pending() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception('Attachment processing failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def process_pending(self):
+        with self.app.app_context():
+            release_stale_claims()
+            claimed = claim_pending(self.batch_size)
+            for attachment_id in claimed:
+                attachment = db.session.get(MessageAttachment, attachment_id)
+                try:
+                    downscale(attachment)
+                except Exception:
+                    # Keep serving the original rather than retrying a file Pillow can't handle
+                    logger.exception('Downscaling attachment %s failed', attachment_id)
+                    db.session.rollback()
+                    attachment = db.session.get(MessageAttachment, attachment_id)
+                attachment.status = 'ready'
+                db.session.commit()
+        return len(claimed)
+
+
+attachments_cli = AppGroup('attachments', help='Message attachments.')
+
+
+@attachments_cli.command('run')
+@click.option('--once', is_flag=True, help='Process everything pending, then exit.')
+def run_worker(once):
+    """Run a dedicated image downscaling worker."""
+    if Image is None:
+        raise click.ClickException('Pillow is not installed; images are kept as uploaded')
+    processor = current_app.extensions['attachment_processor']
+    if once:
+        total = 0
+        while True:
+            processed = processor.process_pending()
+            total += processed
+            if processed < processor.batch_size:
+                break
+        click.echo(f'Processed {total} attachments')
+        return
+    click.echo('Attachment worker running, press Ctrl+C to stop')
+    try:
+        processor.run()
+    except KeyboardInterrupt:
+        processor.stop()
+
+
+@attachments_cli.command('recount')
+def recount_command():
+    """Rebuild the per-user and per-property storage counters from the attachments table."""
+    recount()
+    click.echo('Storage counters rebuilt')
+
+
+def init_attachments(app):
+    app.extensions['attachment_processor'] = AttachmentProcessor(app)
+    app.cli.add_command(attachments_cli)
@@ -0,0 +1,276 @@
+"""
+Audit log.
+
+An ``after_flush`` hook snapshots every create, update and delete of the
+audited models while the ORM still holds the pre-flush state, and parks the
+events on the session. They are handed to a per-process ``AuditWriter`` only
+once the transaction commits (and dropped on rollback), and the writer
+bulk-inserts them from a background thread in batches. A request therefore
+pays for building a few dicts, not for an extra INSERT.
+
+Bulk UPDATE/DELETE statements bypass the unit of work; code that issues them
+calls ``record()`` for the rows it changed.
+
+Events buffered in memory are lost if the process is killed before the next
+flush (at most ``AUDIT_FLUSH_INTERVAL`` seconds' worth); a clean shutdown
+flushes them.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from datetime import date, datetime
+
+import click
+from flask import current_app, has_request_context
+from flask.cli import AppGroup
+from flask_login import current_user
+from sqlalchemy import delete, event, inspect, insert, select
+
+from app import db
+from app.models.audit_event import AuditEvent
+from app.models.document import Document
+from app.models.lease import Lease
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.message import Message
+from app.models.property import Property
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+AUDITED_MODELS = (User, Property, Lease, Document, Message, MaintenanceRequest)
+IGNORED_FIELDS = frozenset({'version', 'updated_at'})
+REDACTED_FIELDS = frozenset({'password_hash'})
+PENDING_KEY = 'audit_pending'
+PRUNE_BATCH_SIZE = 5000
+
+
+def period_of(moment):
+    return moment.year * 100 + moment.month
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _field(key, value):
+    return '[redacted]' if key in REDACTED_FIELDS else _jsonable(value)
+
+
+def _snapshot(state):
+    # Only what is already loaded; touching an expired attribute of a deleted row would query for it
+    return {
+        attr.key: _field(attr.key, state.dict[attr.key])
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict and attr.key not in IGNORED_FIELDS
+    }
+
+
+def _diff(state):
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key in IGNORED_FIELDS:
+            continue
+        history = state.attrs[attr.key].history
+        if history.has_changes():
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            changes[attr.key] = [_field(attr.key, old), _field(attr.key, new)]
+    return changes
+
+
+def _actor_id():
+    if not has_request_context():
+        return None
+    # Read the identity without loading attributes; this runs inside a flush
+    state = inspect(current_user._get_current_object(), raiseerr=False)
+    return state.identity[0] if state is not None and state.identity else None
+
+
+def _event(entity_type, entity_id, action, changes, organization_id, actor_id, occurred_at):
+    return {
+        'period': period_of(occurred_at),
+        'occurred_at': occurred_at,
+        'organization_id': organization_id,
+        'actor_id': actor_id,
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'changes': changes,
+    }
+
+
+def record(entity_type, entity_id, action, changes=None, organization_id=None):
+    """Add an event for a change made outside the unit of work, e.g. by a bulk UPDATE."""
+    session = db.session()
+    session.info.setdefault(PENDING_KEY, []).append(
+        _event(entity_type, entity_id, action, changes, organization_id, _actor_id(), datetime.utcnow())
+    )
+
+
+@event.listens_for(db.session, 'after_flush')
+def _capture_changes(session, flush_context):
+    now = datetime.utcnow()
+    actor_id = None
+    events = []
+    for action, objects in (('create', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if not isinstance(obj, AUDITED_MODELS):
+                continue
+            state = inspect(obj)
+            changes = _diff(state) if action == 'update' else _snapshot(state)
+            if action == 'update' and not changes:
+                continue
+            if actor_id is None:
+                actor_id = _actor_id()
+            events.append(_event(
+                obj.__tablename__, state.mapper.primary_key_from_instance(obj)[0], action, changes,
+                state.dict.get('organization_id'), actor_id, now,
+            ))
+    if events:
+        session.info.setdefault(PENDING_KEY, []).extend(events)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _hand_off_events(session):
+    events = session.info.pop(PENDING_KEY, None)
+    if events:
+        current_app.extensions['audit_writer'].submit(events)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_events(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(PENDING_KEY, None)
+
+
+class AuditWriter:
+    def __init__(self, app):
+        self.app = app
+        self.flush_interval = app.config['AUDIT_FLUSH_INTERVAL']
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self._buffer = queue.Queue(maxsize=app.config['AUDIT_BUFFER_SIZE'])
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def start(self):
+        # Started lazily so gunicorn workers each get their own thread after forking
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, events):
+        self.start()
+        for audit_event in events:
+            try:
+                self._buffer.put_nowait(audit_event)
+            except queue.Full:
+                # The writer is falling behind; write from this thread rather than drop events
+                self.flush()
+                self._buffer.put(audit_event)
+        if self._buffer.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing audit events failed')
+
+    def flush(self):
+        """Insert everything buffered so far, ``batch_size`` rows per statement."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return written
+                try:
+                    # A fresh app context gives this write its own session, even on a request thread
+                    with self.app.app_context():
+                        db.session.execute(insert(AuditEvent), batch)
+                        db.session.commit()
+                except Exception:
+                    logger.exception('Dropped %d audit events', len(batch))
+                    continue
+                written += len(batch)
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+
+# Queries
+
+def entity_history(organization_id, entity_type, entity_id, limit=100):
+    """Newest-first events of one entity, served by ``ix_audit_events_entity``."""
+    return (
+        AuditEvent.query
+        .filter_by(organization_id=organization_id, entity_type=entity_type, entity_id=entity_id)
+        .order_by(AuditEvent.occurred_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def recent_events(organization_id, since, entity_type=None, limit=200):
+    """Newest-first events since ``since``; only the periods in range are scanned."""
+    query = AuditEvent.query.filter(
+        AuditEvent.period >= period_of(since),
+        AuditEvent.occurred_at >= since,
+        AuditEvent.organization_id == organization_id,
+    )
+    if entity_type:
+        query = query.filter(AuditEvent.entity_type == entity_type)
+    return query.order_by(AuditEvent.occurred_at.desc()).limit(limit).all()
+
+
+def prune(keep_months):
+    """Delete whole periods older than ``keep_months``, in bounded batches."""
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - keep_months
+    cutoff = (months // 12) * 100 + months % 12 + 1
+    deleted = 0
+    while True:
+        ids = select(AuditEvent.id).where(AuditEvent.period < cutoff).limit(PRUNE_BATCH_SIZE)
+        removed = db.session.execute(delete(AuditEvent).where(AuditEvent.id.in_(ids))).rowcount
+        db.session.commit()
+        deleted += removed
+        if removed < PRUNE_BATCH_SIZE:
+            return deleted
+
+
+audit_cli = AppGroup('audit', help='Audit log.')
+
+
+@audit_cli.command('prune')
+@click.option('--keep-months', type=int, default=None, help='Defaults to AUDIT_RETENTION_MONTHS.')
+def prune_command(keep_months):
+    """Drop audit periods past the retention window."""
+    keep_months = keep_months if keep_months is not None else current_app.config['AUDIT_RETENTION_MONTHS']
+    click.echo(f'Deleted {prune(keep_months)} audit events')
+
+
+def init_audit(app):
+    app.extensions['audit_writer'] = AuditWriter(app)
+    app.cli.add_command(audit_cli)
@@ -0,0 +1,172 @@
+"""
+Select-field choices.
+
+Each choice list is one query over ``(id, label)`` columns, with the label
+built in SQL and any joins done by the database, so no ORM objects are
+loaded. Lists are cached in process per admin, together with the
+organization's ``choice_versions`` counter. Every flush that inserts,
+updates or deletes a row behind the lists bumps that counter in the same
+transaction, and every lookup reads it back with one primary-key probe, so
+a row added or edited through any worker process is offered (and accepted
+by form validation) on the next request. Bulk UPDATEs skip the mapper
+events; none of the existing ones change a label.
+
+Lists longer than ``CHOICES_TYPEAHEAD_THRESHOLD`` are rendered as a typeahead
+input backed by ``/admin/choices/<kind>`` instead of one ``<option>`` per row.
+"""
+
+import threading
+
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+
+from app import db
+from app.models.choice_version import ChoiceVersion
+from app.models.lease import Lease
+from app.models.property import Property
+from app.models.user import User
+
+TOUCHED_KEY = 'choices_touched'
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class ChoiceSource:
+    def __init__(self, models, build):
+        self.models = models  # tables whose changes invalidate the cached list
+        self.build = build  # user -> (query selecting id and label, label expression)
+
+    def fetch(self, user, search=None, limit=None):
+        query, label = self.build(user)
+        if search:
+            query = query.filter(label.ilike(f'%{_escape_like(search)}%', escape='\\'))
+        if limit:
+            query = query.limit(limit)
+        return [(row.id, row.label) for row in query]
+
+
+def _tenants(user):
+    label = User.first_name + ' ' + User.last_name
+    query = (
+        db.session.query(User.id, label.label('label'))
+        .filter(User.role == 'tenant', User.is_active.is_(True))
+        .order_by(User.first_name, User.last_name)
+    )
+    return query, label
+
+
+def _properties(user):
+    label = Property.address
+    query = (
+        db.session.query(Property.id, label.label('label'))
+        .filter(Property.owner_id == user.id)
+        .order_by(Property.address)
+    )
+    return query, label
+
+
+def _leases(user):
+    label = User.first_name + ' ' + User.last_name + ' - ' + Property.address
+    query = (
+        db.session.query(Lease.id, label.label('label'))
+        .join(User, User.id == Lease.tenant_id)
+        .join(Property, Property.id == Lease.property_id)
+        .order_by(Lease.start_date.desc())
+    )
+    return query, label
+
+
+SOURCES = {
+    'tenants': ChoiceSource((User,), _tenants),
+    'properties': ChoiceSource((Property,), _properties),
+    'leases': ChoiceSource((Lease, User, Property), _leases),
+}
+
+
+def current_version(organization_id):
+    version = (
+        db.session.query(ChoiceVersion.version)
+        .filter(ChoiceVersion.organization_id == organization_id)
+        .scalar()
+    )
+    return version or 0
+
+
+class ChoiceCache:
+    def __init__(self):
+        self._entries = {}  # (kind, user_id) -> (version, choices)
+        self._lock = threading.Lock()
+
+    def get(self, kind, user):
+        key = (kind, user.id)
+        # Read before the list, so a change committed in between only costs another rebuild
+        version = current_version(user.organization_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        choices = tuple(SOURCES[kind].fetch(user))
+        with self._lock:
+            self._entries[key] = (version, choices)
+        return choices
+
+
+def get_choices(kind, user=None):
+    """Cached ``(id, label)`` tuples for ``kind`` as seen by ``user`` (default: the current admin)."""
+    return current_app.extensions['choice_cache'].get(kind, user or current_user._get_current_object())
+
+
+def search_choices(kind, search, user=None, limit=None):
+    """Up to ``limit`` choices whose label contains ``search``, straight from the database."""
+    return SOURCES[kind].fetch(
+        user or current_user._get_current_object(), search, limit or current_app.config['CHOICES_TYPEAHEAD_LIMIT']
+    )
+
+
+def _note_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.organization_id is not None:
+        session.info.setdefault(TOUCHED_KEY, set()).add(target.organization_id)
+
+
+def _increment(session, organization_id):
+    return session.execute(
+        update(ChoiceVersion)
+        .where(ChoiceVersion.organization_id == organization_id)
+        .values(version=ChoiceVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+for _model in {model for source in SOURCES.values() for model in source.models}:
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _note_change)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _bump_versions(session, flush_context):
+    for organization_id in session.info.pop(TOUCHED_KEY, ()):
+        if _increment(session, organization_id):
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(insert(ChoiceVersion).values(organization_id=organization_id, version=1))
+        except IntegrityError:
+            _increment(session, organization_id)  # another transaction created the counter first
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_touched(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(TOUCHED_KEY, None)
+
+
+def init_choices(app):
+    app.extensions['choice_cache'] = ChoiceCache()
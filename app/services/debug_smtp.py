@@ -0,0 +1,60 @@
+"""
+Minimal SMTP sink for local development: accepts every message and prints it.
+
+Stands in for a real mail server (``MAIL_SERVER=localhost``, ``MAIL_PORT=1025``)
+without needing ``aiosmtpd`` or the ``smtpd`` module removed in Python 3.12.
+"""
+
+import socketserver
+
+
+class DebugSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 retreat-housing debug SMTP ready')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 OK')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:], 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:])
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data.decode(errors='replace').rstrip('\r\n'))
+                print(f"---------- MESSAGE FROM {envelope['from']} TO {', '.join(envelope['to'])} ----------")
+                print('\n'.join(lines))
+                print('------------------------ END MESSAGE ------------------------', flush=True)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(host='localhost', port=1025):
+    with DebugSMTPServer((host, port), DebugSMTPHandler) as server:
+        server.serve_forever()
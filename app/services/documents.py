@@ -0,0 +1,236 @@
+"""
+Versioned lease documents.
+
+"Upload new version" on a document's versions page adds a
+``document_versions`` row instead of a second, unrelated document; a plain
+upload always starts a new document. The ``documents`` row always
+describes the current version. Its file columns are updated with every new
+version, so tenant pages and downloads resolve the latest file from the
+document's primary key with nothing else to look up. ``version_count`` is
+incremented in the same UPDATE that numbers the new version, so listings
+show how many versions there are without counting them.
+
+Files are stored by content hash under ``DOCUMENT_STORAGE_PATH``
+(``<hh>/<sha256><ext>``). An upload is streamed to a temporary file and
+hashed on the way. If a file with that hash is already stored (an unchanged
+re-upload, or a revert to an older version) the copy is dropped and the new
+version points at the existing file. A stored file is only deleted once no
+version of any document refers to it.
+
+A new version cancels signature requests still open for an earlier one, so
+nobody signs content that has been replaced.
+
+Documents uploaded before versioning have no version rows. They get
+version 1 for their existing file the first time a new version is added,
+or all at once with ``flask documents backfill``.
+"""
+
+import os
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.models.signature import SignatureRequest
+from app.services.attachments import CHUNK_SIZE, copy_stream, file_sha256
+from app.tenancy import scoped_to
+
+WRITTEN_KEY = 'document_files_written'
+REMOVED_KEY = 'document_files_removed'
+
+
+class DocumentError(Exception):
+    """The upload was rejected; the message can be shown to the user."""
+
+
+def storage_root(app=None):
+    app = app or current_app
+    return app.config['DOCUMENT_STORAGE_PATH'] or os.path.join(app.instance_path, 'documents')
+
+
+def store_file(upload):
+    """Stream ``upload`` into content-addressed storage; returns ``(path, size, sha256)``.
+
+    A file whose content is already stored is not written a second time.
+    """
+    root = storage_root()
+    incoming = os.path.join(root, 'incoming')
+    os.makedirs(incoming, exist_ok=True)
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    copied = copy_stream(upload.stream, upload.stream.read(CHUNK_SIZE), incoming, max_size)
+    if copied is None:
+        raise DocumentError(f'Documents can be at most {max_size // (1024 * 1024)} MB.')
+    temp_path, size, sha256 = copied
+    if size == 0:
+        os.unlink(temp_path)
+        raise DocumentError('The uploaded file is empty.')
+
+    extension = os.path.splitext(secure_filename(upload.filename or ''))[1].lower()
+    path = os.path.join(root, sha256[:2], f'{sha256}{extension}')
+    if os.path.exists(path):
+        os.unlink(temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        db.session.info.setdefault(WRITTEN_KEY, []).append(path)
+    return path, size, sha256
+
+
+def _next_version(document):
+    """Bump ``version_count`` with one UPDATE and return the new number.
+
+    The UPDATE holds the row until commit, so concurrent uploads to the
+    same document are numbered one after the other.
+    """
+    Document.query.filter_by(id=document.id).update(
+        {'version_count': Document.version_count + 1}, synchronize_session=False
+    )
+    number = db.session.query(Document.version_count).filter_by(id=document.id).scalar()
+    set_committed_value(document, 'version_count', number)
+    return number
+
+
+def _adopt_legacy_file(document):
+    """Record a document's pre-versioning file as version 1."""
+    try:
+        content_hash = document.content_hash or file_sha256(document.file_path)
+    except OSError:
+        return None
+    version = DocumentVersion(
+        organization_id=document.organization_id,
+        document_id=document.id,
+        version=_next_version(document),
+        content_hash=content_hash,
+        file_name=document.file_name,
+        file_path=document.file_path,
+        file_size=document.file_size,
+        mime_type=document.mime_type,
+        uploaded_by=document.uploaded_by,
+        uploaded_at=document.uploaded_at or datetime.utcnow(),
+    )
+    db.session.add(version)
+    document.content_hash = content_hash
+    return version
+
+
+def add_version(document, upload, uploaded_by):
+    """Store ``upload`` as the new current version of ``document``; the caller commits."""
+    if document.version_count == 0:
+        _adopt_legacy_file(document)
+    path, size, sha256 = store_file(upload)
+    if sha256 == document.content_hash:
+        raise DocumentError('This file is identical to the current version.')
+
+    now = datetime.utcnow()
+    version = DocumentVersion(
+        organization_id=document.organization_id,
+        document_id=document.id,
+        version=_next_version(document),
+        content_hash=sha256,
+        file_name=secure_filename(upload.filename or '') or document.file_name,
+        file_path=path,
+        file_size=size,
+        mime_type=upload.mimetype,
+        uploaded_by=uploaded_by.id,
+        uploaded_at=now,
+    )
+    db.session.add(version)
+    SignatureRequest.query.filter(
+        SignatureRequest.document_id == document.id,
+        SignatureRequest.status == 'pending',
+        SignatureRequest.document_sha256 != sha256,
+    ).update({'status': 'cancelled', 'completed_at': now}, synchronize_session=False)
+    document.file_name = version.file_name
+    document.file_path = path
+    document.file_size = size
+    document.mime_type = version.mime_type
+    document.content_hash = sha256
+    document.uploaded_by = uploaded_by.id
+    document.uploaded_at = now
+    return version
+
+
+def create_document(lease_id, document_type, upload, uploaded_by):
+    """Add ``upload`` to the lease as a new document at version 1; the caller commits."""
+    document = Document(lease_id=lease_id, document_type=document_type,
+                        file_name=secure_filename(upload.filename or ''), file_path='', uploaded_by=uploaded_by.id)
+    db.session.add(document)
+    db.session.flush()
+    add_version(document, upload, uploaded_by)
+    return document
+
+
+def get_version(document, number):
+    """One probe of the ``(document_id, version)`` unique index."""
+    return DocumentVersion.query.filter_by(document_id=document.id, version=number).first()
+
+
+def versions(document):
+    return DocumentVersion.query.filter_by(document_id=document.id).order_by(DocumentVersion.version.desc()).all()
+
+
+def delete_document(document):
+    """Delete ``document`` with its versions; stored files no other version uses are removed after commit."""
+    paths = {document.file_path}
+    paths.update(path for (path,) in db.session.query(DocumentVersion.file_path).filter_by(document_id=document.id))
+    DocumentVersion.query.filter_by(document_id=document.id).delete(synchronize_session=False)
+    db.session.delete(document)
+    db.session.flush()
+    # Files are shared by content across organizations, so look past the current one
+    with scoped_to(db.session, None):
+        in_use = {
+            path for (path,) in
+            db.session.query(DocumentVersion.file_path).filter(DocumentVersion.file_path.in_(paths))
+        }
+    db.session.info.setdefault(REMOVED_KEY, set()).update(path for path in paths - in_use if path)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _remove_deleted_files(session):
+    session.info.pop(WRITTEN_KEY, None)
+    for path in session.info.pop(REMOVED_KEY, ()):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _remove_unsaved_files(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(REMOVED_KEY, None)
+    for path in session.info.pop(WRITTEN_KEY, []):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+documents_cli = AppGroup('documents', help='Lease documents.')
+
+
+@documents_cli.command('backfill')
+def backfill_command():
+    """Give every document uploaded before versioning its version 1."""
+    adopted = missing = 0
+    with scoped_to(db.session, None):
+        for document in Document.query.filter_by(version_count=0).all():
+            with scoped_to(db.session, document.organization_id):
+                if _adopt_legacy_file(document) is None:
+                    missing += 1
+                else:
+                    adopted += 1
+            db.session.commit()
+    click.echo(f'Recorded version 1 of {adopted} documents; {missing} files were missing')
+
+
+def init_documents(app):
+    app.cli.add_command(documents_cli)
@@ -0,0 +1,125 @@
+import heapq
+from collections import namedtuple
+from datetime import date
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+
+from app import db
+from app.models.lease import Lease
+from app.services.audit import record
+
+# Terminated leases no longer hold the unit, so they never conflict
+OCCUPYING_STATUSES = ('active', 'expired')
+# PostgreSQL's exclusion constraint behind find_overlapping (see app.models.lease)
+OVERLAP_CONSTRAINT = 'leases_no_overlap'
+
+LeaseInterval = namedtuple('LeaseInterval', 'id property_id tenant_id start_date end_date')
+
+
+def find_overlapping(property_id, start_date, end_date, exclude_id=None):
+    """Return a lease on ``property_id`` whose dates overlap ``[start_date, end_date]``, or ``None``.
+
+    A single range probe on ``ix_leases_property_period``.
+    """
+    query = Lease.query.filter(
+        Lease.property_id == property_id,
+        Lease.start_date <= end_date,
+        Lease.end_date >= start_date,
+        Lease.status.in_(OCCUPYING_STATUSES),
+    )
+    if exclude_id is not None:
+        query = query.filter(Lease.id != exclude_id)
+    return query.order_by(Lease.start_date).first()
+
+
+def overlap_message(conflict):
+    if conflict is None:
+        return 'This property is already leased for some of those dates.'
+    return (f'This property is already leased to {conflict.tenant.full_name} from '
+            f'{conflict.start_date.strftime("%b %d, %Y")} to {conflict.end_date.strftime("%b %d, %Y")}.')
+
+
+def is_overlap_violation(error):
+    """Whether an ``IntegrityError`` came from the overlap constraint, i.e. a concurrent save won the race."""
+    return OVERLAP_CONSTRAINT in str(error.orig)
+
+
+def find_conflicts(candidates=()):
+    """Scan every occupying lease once and return the overlapping pairs.
+
+    Leases are streamed in ``(property_id, start_date)`` order, straight off
+    the interval index, and each is compared with the latest-ending lease seen
+    so far on the same property. ``candidates`` are extra ``LeaseInterval``
+    rows (e.g. from an import, with ``id=None``) checked together with the
+    stored leases before anything is written. Every lease that overlaps an
+    earlier one is reported once, as an ``(earlier, later)`` pair of
+    ``LeaseInterval`` rows.
+    """
+    stored = (
+        LeaseInterval(*row) for row in
+        db.session.query(Lease.id, Lease.property_id, Lease.tenant_id, Lease.start_date, Lease.end_date)
+        .filter(Lease.status.in_(OCCUPYING_STATUSES))
+        .order_by(Lease.property_id, Lease.start_date)
+        .yield_per(1000)
+    )
+    extra = sorted(candidates, key=lambda lease: (lease.property_id, lease.start_date))
+    ordered = heapq.merge(stored, extra, key=lambda lease: (lease.property_id, lease.start_date))
+
+    conflicts = []
+    reach = None  # lease with the latest end date so far on the current property
+    for lease in ordered:
+        if reach is not None and reach.property_id == lease.property_id and lease.start_date <= reach.end_date:
+            conflicts.append((reach, lease))
+        if reach is None or reach.property_id != lease.property_id or lease.end_date > reach.end_date:
+            reach = lease
+    return conflicts
+
+
+def expire_ended_leases(today=None):
+    """Mark every active lease whose end date has passed as expired, in one UPDATE.
+
+    The status check in the WHERE clause makes this a compare-and-swap: a lease
+    an admin terminated or renewed concurrently is left alone, and each row
+    that changes gets its version bumped so open edit forms see the conflict.
+    """
+    today = today or date.today()
+    expired = db.session.execute(
+        update(Lease)
+        .where(Lease.status == 'active', Lease.end_date < today)
+        .values(status='expired', version=Lease.version + 1)
+        .returning(Lease.id, Lease.organization_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for lease_id, organization_id in expired:
+        record(Lease.__tablename__, lease_id, 'update', {'status': ['active', 'expired']}, organization_id)
+    db.session.commit()
+    return len(expired)
+
+
+leases_cli = AppGroup('leases', help='Lease maintenance tasks.')
+
+
+@leases_cli.command('check-overlaps')
+def check_overlaps_command():
+    """Report leases that overlap another lease on the same property."""
+    conflicts = find_conflicts()
+    for earlier, later in conflicts:
+        click.echo(
+            f'Property {later.property_id}: lease {earlier.id} ({earlier.start_date} to {earlier.end_date}) '
+            f'overlaps lease {later.id} ({later.start_date} to {later.end_date})'
+        )
+    click.echo(f'{len(conflicts)} overlapping lease pairs')
+    if conflicts:
+        raise SystemExit(1)
+
+
+@leases_cli.command('expire')
+def expire_command():
+    """Expire active leases whose end date has passed."""
+    click.echo(f'Expired {expire_ended_leases()} leases')
+
+
+def init_leases(app):
+    app.cli.add_command(leases_cli)
@@ -0,0 +1,234 @@
+"""
+Login protection.
+
+Failed attempts are counted in sliding windows per client IP, per client
+IP and username, and per username alone, and checked *before* any password
+hash is computed, so a credential-stuffing burst is rejected cheaply instead
+of pinning workers on PBKDF2/scrypt. The tight limit is on the (IP,
+username) pair, so guessing at someone's username from elsewhere doesn't
+lock them out; the per-username limit is much higher and only stops a
+guessing run spread over many addresses. Hash verification itself is capped at a few concurrent
+computations per process; requests beyond that wait briefly and then fail
+fast rather than queueing behind the attack.
+"""
+
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import db
+from app.models.login_attempt import LoginAttempt
+
+
+class HashingBusy(Exception):
+    pass
+
+
+# Limiter backends
+
+class MemoryBackend:
+    """Per-process attempt log. Each gunicorn worker keeps its own counts."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._attempts = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._adds = 0
+
+    def count(self, key, since, cap):
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if not attempts:
+                return 0
+            while attempts and attempts[0] < since:
+                attempts.popleft()
+            if not attempts:
+                del self._attempts[key]
+                return 0
+            return len(attempts)
+
+    def oldest(self, key, since):
+        with self._lock:
+            attempts = self._attempts.get(key)
+            return attempts[0] if attempts and attempts[0] >= since else None
+
+    def add(self, key, now, since, cap):
+        with self._lock:
+            attempts = self._attempts[key]
+            attempts.append(now)
+            # Only the newest ``cap`` attempts can matter for the limit
+            while len(attempts) > cap:
+                attempts.popleft()
+            self._adds += 1
+            if self._adds % self.SWEEP_EVERY == 0:
+                # Drop keys that went quiet, e.g. usernames sprayed once by an attacker
+                for stale in [k for k, v in self._attempts.items() if v[-1] < since]:
+                    del self._attempts[stale]
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+class DatabaseBackend:
+    """Attempt log in the ``login_attempts`` table, shared by every worker and host."""
+
+    PRUNE_EVERY = 100
+
+    def __init__(self):
+        self._adds = 0
+
+    def count(self, key, since, cap):
+        return LoginAttempt.query.filter(
+            LoginAttempt.key == key, LoginAttempt.attempted_at >= _to_datetime(since)
+        ).count()
+
+    def oldest(self, key, since):
+        attempt = LoginAttempt.query.filter(
+            LoginAttempt.key == key, LoginAttempt.attempted_at >= _to_datetime(since)
+        ).order_by(LoginAttempt.attempted_at).first()
+        return attempt.attempted_at.timestamp() if attempt else None
+
+    def add(self, key, now, since, cap):
+        db.session.add(LoginAttempt(key=key, attempted_at=_to_datetime(now)))
+        self._adds += 1
+        if self._adds % self.PRUNE_EVERY == 0:
+            # Expired rows of keys that never come back (one-off attacker IPs)
+            self.prune(since)
+        else:
+            db.session.commit()
+
+    def reset(self, key):
+        LoginAttempt.query.filter_by(key=key).delete(synchronize_session=False)
+        db.session.commit()
+
+    def prune(self, before):
+        deleted = LoginAttempt.query.filter(LoginAttempt.attempted_at < _to_datetime(before)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        return deleted
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp)
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'database': DatabaseBackend,
+}
+
+
+class SlidingWindowLimiter:
+    def __init__(self, backend, limit, window):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+
+    def retry_after(self, key, now=None):
+        """Seconds until ``key`` may try again, or 0 if it is under the limit."""
+        now = now or time.time()
+        since = now - self.window
+        if self.backend.count(key, since, self.limit) < self.limit:
+            return 0
+        oldest = self.backend.oldest(key, since) or now
+        return max(1, int(oldest + self.window - now))
+
+    def hit(self, key, now=None):
+        now = now or time.time()
+        self.backend.add(key, now, now - self.window, self.limit)
+
+    def reset(self, key):
+        self.backend.reset(key)
+
+
+class LoginGuard:
+    def __init__(self, backend, ip_limit, ip_username_limit, username_limit, window):
+        self.by_ip = SlidingWindowLimiter(backend, ip_limit, window)
+        self.by_ip_username = SlidingWindowLimiter(backend, ip_username_limit, window)
+        self.by_username = SlidingWindowLimiter(backend, username_limit, window)
+
+    @staticmethod
+    def _keys(ip, username):
+        username = (username or '').strip().lower()
+        return f'ip:{ip}', f'ipuser:{ip}:{username}', f'user:{username}'
+
+    def retry_after(self, ip, username):
+        ip_key, ip_user_key, user_key = self._keys(ip, username)
+        return max(
+            self.by_ip.retry_after(ip_key),
+            self.by_ip_username.retry_after(ip_user_key),
+            self.by_username.retry_after(user_key),
+        )
+
+    def record_failure(self, ip, username):
+        ip_key, ip_user_key, user_key = self._keys(ip, username)
+        self.by_ip.hit(ip_key)
+        self.by_ip_username.hit(ip_user_key)
+        self.by_username.hit(user_key)
+
+    def record_success(self, ip, username):
+        # A correct password clears this client's window for the username; the
+        # IP and username-wide windows keep counting so one valid login cannot
+        # launder a stuffing run
+        self.by_ip_username.reset(self._keys(ip, username)[1])
+
+
+# Password hashing
+
+class PasswordHasher:
+    def __init__(self, max_concurrent, wait_timeout):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.wait_timeout = wait_timeout
+
+    def verify(self, user, password):
+        """Check ``password`` for ``user``; an unknown user (``None``) costs the same hash and fails."""
+        # Built on the first check whoever it is for, so that one doesn't stand out either
+        dummy_hash = _dummy_hash(current_app.config['PASSWORD_HASH_METHOD'])
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise HashingBusy()
+        try:
+            if user is None:
+                # Answering early would tell which usernames exist
+                check_password_hash(dummy_hash, password)
+                return False
+            return user.check_password(password)
+        finally:
+            self._slots.release()
+
+
+@lru_cache(maxsize=None)
+def _dummy_hash(method):
+    return generate_password_hash(secrets.token_hex(16), method=method)
+
+
+@lru_cache(maxsize=None)
+def canonical_hash_method(method):
+    """Expand a short method such as ``'pbkdf2'`` into the prefix werkzeug stores, e.g. ``'pbkdf2:sha256:600000'``."""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != canonical_hash_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def init_login_protection(app):
+    backend = BACKENDS[app.config['LOGIN_RATE_LIMIT_BACKEND']]()
+    app.extensions['login_guard'] = LoginGuard(
+        backend,
+        ip_limit=app.config['LOGIN_MAX_ATTEMPTS_PER_IP'],
+        ip_username_limit=app.config['LOGIN_MAX_ATTEMPTS_PER_IP_USERNAME'],
+        username_limit=app.config['LOGIN_MAX_ATTEMPTS_PER_USERNAME'],
+        window=app.config['LOGIN_ATTEMPT_WINDOW'],
+    )
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_CONCURRENCY'], app.config['PASSWORD_HASH_WAIT_TIMEOUT']
+    )
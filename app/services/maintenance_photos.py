@@ -0,0 +1,501 @@
+"""
+Maintenance request photos.
+
+Tenants can attach photos when they report an issue. Each upload is
+streamed to ``MAINTENANCE_PHOTO_STORAGE_PATH`` and named by the SHA-256 of
+its bytes, so a photo uploaded twice is stored and processed once. A
+worker pool then renders the variants: threads inside each web process, or
+processes under ``flask maintenance-photos run --processes N`` for a
+backlog.
+
+``original``   the upload with EXIF, XMP, IPTC and comment metadata removed
+``web``        JPEG, at most ``MAINTENANCE_PHOTO_SIZES['web']`` pixels on the long side
+``thumbnail``  JPEG, at most ``MAINTENANCE_PHOTO_SIZES['thumbnail']`` pixels
+
+Metadata is cut out of the encoded bytes, so originals keep their exact
+image data and stripping needs no imaging library. Only a photo whose EXIF
+orientation turns it is re-encoded, upright, since the turn would be lost
+with the tag. The resized variants need Pillow; without it just the
+stripped original is kept and shown in their place. A variant's file never
+changes once written, so it is served with an immutable cache lifetime.
+"""
+
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import Request, current_app, send_file
+from flask.cli import AppGroup
+from sqlalchemy import event
+
+from app import db
+from app.models.maintenance_photo import MaintenancePhoto
+from app.models.archived_maintenance_request import ArchivedMaintenanceRequest
+from app.models.maintenance_request import MaintenanceRequest
+from app.services.attachments import CHUNK_SIZE, copy_stream, sniff
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ('thumbnail', 'web', 'original')
+EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'}
+PILLOW_FORMATS = {'image/jpeg': 'JPEG', 'image/png': 'PNG', 'image/webp': 'WEBP'}
+EXIF_ORIENTATION = 0x0112
+WRITTEN_KEY = 'maintenance_photos_written'
+QUEUED_KEY = 'maintenance_photos_queued'
+# Views whose form takes photos, and room for their other fields on top of the photos
+UPLOAD_ENDPOINTS = ('tenant.request_maintenance',)
+FORM_OVERHEAD = 1024 * 1024
+
+
+class PhotoError(Exception):
+    """The upload was rejected; the message can be shown to the user."""
+
+
+# Metadata stripping
+
+# APP1 (EXIF, XMP), APP3-APP13 (IPTC and vendor data), APP15 and comments;
+# APP0 (JFIF), APP2 (ICC profile) and APP14 (Adobe colour transform) are kept
+JPEG_DROPPED_MARKERS = frozenset({0xE1, 0xEF, 0xFE} | set(range(0xE3, 0xEE)))
+PNG_DROPPED_CHUNKS = frozenset({b'eXIf', b'tEXt', b'iTXt', b'zTXt', b'tIME'})
+WEBP_DROPPED_CHUNKS = frozenset({b'EXIF', b'XMP '})
+
+
+def _strip_jpeg(data):
+    parts = [data[:2]]
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            break
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1  # fill byte
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan: the rest is image data
+            parts.append(data[position:])
+            return b''.join(parts)
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        if marker not in JPEG_DROPPED_MARKERS:
+            parts.append(data[position:position + 2 + length])
+        position += 2 + length
+    raise ValueError('Malformed JPEG')
+
+
+def _strip_png(data):
+    parts = [data[:8]]
+    position = 8
+    while position + 12 <= len(data):
+        length = int.from_bytes(data[position:position + 4], 'big')
+        kind = data[position + 4:position + 8]
+        end = position + 12 + length
+        if kind not in PNG_DROPPED_CHUNKS:
+            parts.append(data[position:end])
+        position = end
+        if kind == b'IEND':
+            return b''.join(parts)
+    raise ValueError('Malformed PNG')
+
+
+def _strip_webp(data):
+    parts = [b'WEBP']
+    position = 12
+    while position + 8 <= len(data):
+        kind = data[position:position + 4]
+        length = int.from_bytes(data[position + 4:position + 8], 'little')
+        end = position + 8 + length + (length & 1)
+        if kind not in WEBP_DROPPED_CHUNKS:
+            chunk = data[position:end]
+            if kind == b'VP8X':
+                # Clear the "has EXIF" and "has XMP" flags
+                chunk = chunk[:8] + bytes([chunk[8] & ~0x0C & 0xFF]) + chunk[9:]
+            parts.append(chunk)
+        position = end
+    body = b''.join(parts)
+    return b'RIFF' + len(body).to_bytes(4, 'little') + body
+
+
+STRIPPERS = {'image/jpeg': _strip_jpeg, 'image/png': _strip_png, 'image/webp': _strip_webp}
+
+
+def strip_metadata(data, content_type):
+    """``data`` without its metadata segments; the image data itself is untouched."""
+    return STRIPPERS[content_type](data)
+
+
+# Storage
+
+def storage_root(app=None):
+    app = app or current_app
+    return app.config['MAINTENANCE_PHOTO_STORAGE_PATH'] or os.path.join(app.instance_path, 'maintenance_photos')
+
+
+def incoming_path(root, content_hash):
+    return os.path.join(root, 'incoming', content_hash)
+
+
+def variant_path(root, variant, content_hash, content_type):
+    extension = EXTENSIONS[content_type] if variant == 'original' else '.jpg'
+    return os.path.join(root, variant, content_hash[:2], content_hash + extension)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.write-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(source, root, content_hash, content_type, sizes, quality):
+    """Write every variant of one upload and return ``(width, height, resized)``.
+
+    Runs in pool workers, so it takes plain arguments and never touches the
+    app or the database.
+    """
+    with open(source, 'rb') as f:
+        data = f.read()
+    original = strip_metadata(data, content_type)
+    width = height = None
+    resized = False
+
+    if Image is not None:
+        with Image.open(io.BytesIO(data)) as image:
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            width, height = image.size if orientation < 5 else image.size[::-1]
+            if orientation == 1:
+                # Only the resized variants need decoding: let libjpeg scale down while it decodes
+                longest = max(sizes.values())
+                image.draft('RGB', (longest, longest))
+            upright = ImageOps.exif_transpose(image)
+            if orientation != 1:
+                # Pillow carries comments and XMP over to the re-encoded file, so strip that too
+                original = strip_metadata(_encode(upright, PILLOW_FORMATS[content_type], quality=95,
+                                                  icc_profile=image.info.get('icc_profile')), content_type)
+        if upright.mode not in ('RGB', 'L'):
+            flattened = Image.new('RGB', upright.size, 'white')
+            flattened.paste(upright.convert('RGBA'), mask=upright.convert('RGBA').getchannel('A'))
+            upright = flattened
+        for variant, limit in sorted(sizes.items(), key=lambda item: -item[1]):
+            # Largest first, each from the previous one: less work for every smaller size
+            upright.thumbnail((limit, limit), reducing_gap=3.0)
+            _write(variant_path(root, variant, content_hash, content_type),
+                   _encode(upright, 'JPEG', quality=quality, optimize=True, progressive=True))
+        resized = True
+
+    _write(variant_path(root, 'original', content_hash, content_type), original)
+    return width, height, resized
+
+
+# Uploads
+
+def add_photos(maintenance_request, uploads, uploader):
+    """Store photos for ``maintenance_request`` and queue them for processing.
+
+    ``uploads`` are werkzeug ``FileStorage`` objects; empty file inputs are
+    skipped. Raises ``PhotoError`` for a rejected file, after which the
+    caller should roll back.
+    """
+    config = current_app.config
+    uploads = [upload for upload in uploads if upload]
+    if len(uploads) > config['MAINTENANCE_PHOTO_MAX_COUNT']:
+        raise PhotoError(size_limit_message(config))
+    if not uploads:
+        return []
+
+    db.session.flush()
+    root = storage_root()
+    os.makedirs(os.path.join(root, 'incoming'), exist_ok=True)
+    photos = []
+    for upload in uploads:
+        head = upload.stream.read(CHUNK_SIZE)
+        kind = sniff(head)
+        if kind is None or kind[0] not in EXTENSIONS:
+            raise PhotoError(f'{upload.filename or "A file"} is not a JPEG, PNG or WebP photo.')
+        copied = copy_stream(upload.stream, head, os.path.join(root, 'incoming'), config['MAINTENANCE_PHOTO_MAX_SIZE'])
+        if copied is None:
+            raise PhotoError(size_limit_message(config))
+        temp_path, size, content_hash = copied
+
+        photo = MaintenancePhoto(request_id=maintenance_request.id, uploader_id=uploader.id,
+                                 content_hash=content_hash, content_type=kind[0], size=size)
+        processed = (
+            MaintenancePhoto.query
+            .filter_by(content_hash=content_hash, status='ready')
+            .first()
+        )
+        if processed is not None:
+            # Same bytes as a photo already processed; its variants are reused
+            os.unlink(temp_path)
+            photo.width, photo.height, photo.resized = processed.width, processed.height, processed.resized
+            photo.status = 'ready'
+        else:
+            path = incoming_path(root, content_hash)
+            if os.path.exists(path):
+                os.unlink(temp_path)
+            else:
+                os.replace(temp_path, path)
+                db.session.info.setdefault(WRITTEN_KEY, []).append(path)
+            db.session.info[QUEUED_KEY] = True
+        db.session.add(photo)
+        photos.append(photo)
+    return photos
+
+
+def request_size_limit(config):
+    """The largest request an upload form accepts: the most photos, each at the maximum size."""
+    return config['MAINTENANCE_PHOTO_MAX_COUNT'] * config['MAINTENANCE_PHOTO_MAX_SIZE'] + FORM_OVERHEAD
+
+
+def size_limit_message(config):
+    return (f'Add at most {config["MAINTENANCE_PHOTO_MAX_COUNT"]} photos of up to '
+            f'{config["MAINTENANCE_PHOTO_MAX_SIZE"] // (1024 * 1024)} MB each.')
+
+
+class PhotoUploadRequest(Request):
+    """Lets the photo upload forms through ``MAX_CONTENT_LENGTH``, which is sized for a single file."""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in UPLOAD_ENDPOINTS:
+            return request_size_limit(current_app.config)
+        return super().max_content_length
+
+
+def photos_for(request_id):
+    return MaintenancePhoto.query.filter_by(request_id=request_id).order_by(MaintenancePhoto.id).all()
+
+
+def can_view(photo, user):
+    if user.is_admin():
+        return True
+    # Tenants keep seeing their photos after the request is archived
+    return any(
+        db.session.query(model.query.filter_by(id=photo.request_id, tenant_id=user.id).exists()).scalar()
+        for model in (MaintenanceRequest, ArchivedMaintenanceRequest)
+    )
+
+
+def send_photo(photo, variant):
+    if variant != 'original' and not photo.resized:
+        variant = 'original'
+    response = send_file(
+        variant_path(storage_root(), variant, photo.content_hash, photo.content_type),
+        mimetype=photo.content_type if variant == 'original' else 'image/jpeg',
+        conditional=True,
+        etag=f'{photo.content_hash}-{variant}',
+        max_age=current_app.config['MAINTENANCE_PHOTO_CACHE_MAX_AGE'],
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_processor(session):
+    session.info.pop(WRITTEN_KEY, None)
+    if session.info.pop(QUEUED_KEY, False):
+        processor = current_app.extensions.get('photo_processor')
+        if processor is not None and processor.inline:
+            processor.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _remove_unsaved_files(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(QUEUED_KEY, None)
+    for path in session.info.pop(WRITTEN_KEY, []):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# Processing
+
+def claim_pending(limit):
+    """Claim up to ``limit`` pending photos; returns ``(id, content_hash, content_type)`` for each."""
+    now = datetime.utcnow()
+    candidates = (
+        db.session.query(MaintenancePhoto.id, MaintenancePhoto.content_hash, MaintenancePhoto.content_type)
+        .filter(MaintenancePhoto.status == 'pending')
+        .order_by(MaintenancePhoto.created_at)
+        .limit(limit)
+        .all()
+    )
+    claimed = []
+    for photo_id, content_hash, content_type in candidates:
+        if (
+            MaintenancePhoto.query
+            .filter_by(id=photo_id, status='pending')
+            .update({'status': 'processing', 'claimed_at': now}, synchronize_session=False)
+        ):
+            claimed.append((photo_id, content_hash, content_type))
+    db.session.commit()
+    return claimed
+
+
+def release_stale_claims(older_than=timedelta(minutes=15)):
+    """Return photos left in ``processing`` by a worker that died to the queue."""
+    cutoff = datetime.utcnow() - older_than
+    released = (
+        MaintenancePhoto.query
+        .filter(MaintenancePhoto.status == 'processing', MaintenancePhoto.claimed_at < cutoff)
+        .update({'status': 'pending'}, synchronize_session=False)
+    )
+    db.session.commit()
+    return released
+
+
+class PhotoProcessor:
+    def __init__(self, app):
+        self.app = app
+        self.inline = app.config['MAINTENANCE_PHOTO_INLINE_WORKER']
+        self.poll_interval = app.config['MAINTENANCE_PHOTO_POLL_INTERVAL']
+        self.max_workers = app.config['MAINTENANCE_PHOTO_WORKERS']
+        self.batch_size = app.config['MAINTENANCE_PHOTO_BATCH_SIZE']
+        self.pool = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        # Started lazily so gunicorn workers each get their own thread after forking
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='photo-processor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_pending() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception('Maintenance photo processing failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def process_pending(self):
+        """Render one batch across the pool; returns the number of photos claimed."""
+        if self.pool is None:
+            # Pillow releases the GIL while it decodes, resizes and encodes
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='photo')
+        with self.app.app_context():
+            release_stale_claims()
+            claimed = claim_pending(self.batch_size)
+            if not claimed:
+                return 0
+            root = storage_root(self.app)
+            sizes = self.app.config['MAINTENANCE_PHOTO_SIZES']
+            quality = self.app.config['MAINTENANCE_PHOTO_QUALITY']
+
+            uploads = {}
+            for photo_id, content_hash, content_type in claimed:
+                uploads.setdefault((content_hash, content_type), []).append(photo_id)
+            jobs = {}
+            for (content_hash, content_type), photo_ids in uploads.items():
+                source = incoming_path(root, content_hash)
+                processed = MaintenancePhoto.query.filter_by(content_hash=content_hash, status='ready').first()
+                if processed is not None and not os.path.exists(source):
+                    # Processed by another worker since this photo was uploaded
+                    self._finish(photo_ids, 'ready', processed.width, processed.height, processed.resized)
+                    continue
+                future = self.pool.submit(render_variants, source, root, content_hash, content_type, sizes, quality)
+                jobs[future] = (source, photo_ids)
+
+            for future, (source, photo_ids) in jobs.items():
+                try:
+                    width, height, resized = future.result()
+                except Exception:
+                    logger.exception('Processing maintenance photos %s failed', photo_ids)
+                    self._finish(photo_ids, 'failed')
+                    continue
+                self._finish(photo_ids, 'ready', width, height, resized)
+                db.session.commit()
+                try:
+                    os.unlink(source)
+                except OSError:
+                    pass
+            db.session.commit()
+        return len(claimed)
+
+    def _finish(self, photo_ids, status, width=None, height=None, resized=False):
+        values = {'status': status, 'width': width, 'height': height, 'resized': resized}
+        MaintenancePhoto.query.filter(MaintenancePhoto.id.in_(photo_ids)).update(values, synchronize_session=False)
+
+
+photos_cli = AppGroup('maintenance-photos', help='Maintenance request photos.')
+
+
+@photos_cli.command('run')
+@click.option('--once', is_flag=True, help='Process everything pending, then exit.')
+@click.option('--processes', type=int, default=0, help='Render in this many processes instead of threads.')
+def run_worker(once, processes):
+    """Run a dedicated photo processing worker."""
+    processor = current_app.extensions['photo_processor']
+    if processes:
+        processor.pool = ProcessPoolExecutor(max_workers=processes)
+        processor.batch_size = max(processor.batch_size, processes * 4)
+    if once:
+        total = 0
+        while True:
+            processed = processor.process_pending()
+            total += processed
+            if processed < processor.batch_size:
+                break
+        processor.pool.shutdown(wait=True)
+        click.echo(f'Processed {total} photos')
+        return
+    click.echo('Maintenance photo worker running, press Ctrl+C to stop')
+    try:
+        processor.run()
+    except KeyboardInterrupt:
+        processor.stop()
+
+
+@photos_cli.command('retry')
+def retry_failed():
+    """Queue failed photos for another attempt."""
+    retried = MaintenancePhoto.query.filter_by(status='failed').update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Queued {retried} photos')
+
+
+def init_maintenance_photos(app):
+    app.extensions['photo_processor'] = PhotoProcessor(app)
+    app.request_class = PhotoUploadRequest
+    app.cli.add_command(photos_cli)
@@ -0,0 +1,254 @@
+"""
+Maintenance request workflow.
+
+All status changes go through ``transition()``, which checks the move against
+``TRANSITIONS``, appends a ``MaintenanceStatusChange`` row and keeps the
+``maintenance_queue`` table in step. The queue only holds open requests, so
+board and overdue queries stay proportional to the open work, not the full
+request history.
+"""
+
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, update
+
+from app import db
+from app.concurrency import compare_and_swap
+from app.services.audit import record
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.maintenance_status_change import MaintenanceStatusChange
+from app.models.maintenance_queue_entry import MaintenanceQueueEntry
+
+OPEN_STATUSES = ('pending', 'in_progress')
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+TRANSITIONS = {
+    'pending': ('in_progress', 'completed', 'cancelled'),
+    'in_progress': ('pending', 'completed', 'cancelled'),
+    'completed': ('in_progress',),  # reopen when the fix did not hold
+    'cancelled': ('pending',),
+}
+
+STATUS_LABELS = {
+    'pending': 'Pending',
+    'in_progress': 'In Progress',
+    'completed': 'Completed',
+    'cancelled': 'Cancelled',
+}
+
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def sla_deadline(priority, opened_at):
+    hours = current_app.config['MAINTENANCE_SLA_HOURS'][priority or 'medium']
+    return opened_at + timedelta(hours=hours)
+
+
+def open_request(maintenance_request, actor_id):
+    """Add a new request to the session with its SLA deadline, first history entry and queue row."""
+    now = datetime.utcnow()
+    maintenance_request.status = 'pending'
+    maintenance_request.created_at = maintenance_request.created_at or now
+    maintenance_request.due_at = sla_deadline(maintenance_request.priority, maintenance_request.created_at)
+    db.session.add(maintenance_request)
+    _record(maintenance_request, None, 'pending', actor_id, None, now)
+    sync_queue(maintenance_request)
+
+
+def transition(maintenance_request, new_status, actor_id, note=None):
+    current = maintenance_request.status
+    if new_status not in TRANSITIONS.get(current, ()):
+        raise InvalidTransition(
+            f'Cannot change a {STATUS_LABELS.get(current, current)} request to '
+            f'{STATUS_LABELS.get(new_status, new_status)}.'
+        )
+
+    now = datetime.utcnow()
+    maintenance_request.status = new_status
+    if new_status in CLOSED_STATUSES:
+        maintenance_request.closed_at = now
+    elif current in CLOSED_STATUSES:
+        # Reopened work gets a fresh SLA window
+        maintenance_request.closed_at = None
+        maintenance_request.due_at = sla_deadline(maintenance_request.priority, now)
+
+    _record(maintenance_request, current, new_status, actor_id, note, now)
+    sync_queue(maintenance_request)
+
+
+def assign(maintenance_request, assignee, vendor_name, actor_id):
+    maintenance_request.assigned_to = assignee
+    maintenance_request.vendor_name = vendor_name or None
+
+    parts = []
+    if assignee is not None:
+        parts.append(f'staff: {assignee.full_name}')
+    if vendor_name:
+        parts.append(f'vendor: {vendor_name}')
+    note = f"Assigned to {', '.join(parts)}" if parts else 'Assignment cleared'
+    _record(maintenance_request, maintenance_request.status, maintenance_request.status, actor_id, note, datetime.utcnow())
+
+
+def soft_delete(maintenance_request, actor_id):
+    maintenance_request.soft_delete()
+    _record(maintenance_request, maintenance_request.status, maintenance_request.status, actor_id, 'Deleted', datetime.utcnow())
+    sync_queue(maintenance_request)
+
+
+def restore(maintenance_request, actor_id):
+    maintenance_request.restore()
+    _record(maintenance_request, maintenance_request.status, maintenance_request.status, actor_id, 'Restored', datetime.utcnow())
+    sync_queue(maintenance_request)
+
+
+def _record(maintenance_request, from_status, to_status, actor_id, note, changed_at):
+    db.session.add(MaintenanceStatusChange(
+        request=maintenance_request,
+        from_status=from_status,
+        to_status=to_status,
+        changed_by=actor_id,
+        note=note,
+        changed_at=changed_at,
+    ))
+
+
+def sync_queue(maintenance_request):
+    """Insert, update or drop the request's queue row to match its current state."""
+    entry = maintenance_request.queue_entry
+    if maintenance_request.status not in OPEN_STATUSES or maintenance_request.is_deleted:
+        if entry is not None:
+            maintenance_request.queue_entry = None
+        return
+
+    if entry is None:
+        entry = MaintenanceQueueEntry(organization_id=maintenance_request.organization_id)
+        maintenance_request.queue_entry = entry
+    entry.priority_rank = PRIORITY_RANK[maintenance_request.priority or 'medium']
+    entry.status = maintenance_request.status
+    entry.due_at = maintenance_request.due_at
+    entry.created_at = maintenance_request.created_at
+
+
+def bulk_transition(expected_versions, new_status, actor_id, note=None):
+    """Move many open requests to ``new_status`` without loading them.
+
+    ``expected_versions`` maps request id to the version the admin saw. Each
+    allowed source status is handled by one compare-and-swap UPDATE, followed
+    by one history INSERT and one queue statement. Returns the updated rows
+    as ``(id, tenant_id, title, organization_id)`` and the ids that were skipped because they
+    changed in the meantime or cannot move to ``new_status``.
+    """
+    if new_status not in STATUS_LABELS:
+        raise InvalidTransition(f'Unknown status {new_status!r}.')
+
+    now = datetime.utcnow()
+    remaining = dict(expected_versions)
+    updated = []
+    history = []
+    values = {'status': new_status, 'updated_at': now}
+    if new_status in CLOSED_STATUSES:
+        values['closed_at'] = now
+
+    for from_status in OPEN_STATUSES:
+        if new_status not in TRANSITIONS[from_status] or not remaining:
+            continue
+        rows = compare_and_swap(
+            MaintenanceRequest, remaining, values,
+            criteria=[MaintenanceRequest.status == from_status],
+            returning=(MaintenanceRequest.id, MaintenanceRequest.tenant_id, MaintenanceRequest.title,
+                       MaintenanceRequest.organization_id),
+        )
+        for row in rows:
+            remaining.pop(row.id)
+            updated.append(row)
+            record(MaintenanceRequest.__tablename__, row.id, 'update',
+                   {'status': [from_status, new_status]}, row.organization_id)
+            history.append({
+                'request_id': row.id, 'from_status': from_status, 'to_status': new_status,
+                'changed_by': actor_id, 'note': note, 'changed_at': now,
+            })
+
+    if updated:
+        ids = [row.id for row in updated]
+        db.session.execute(insert(MaintenanceStatusChange), history)
+        if new_status in OPEN_STATUSES:
+            db.session.execute(
+                update(MaintenanceQueueEntry)
+                .where(MaintenanceQueueEntry.request_id.in_(ids))
+                .values(status=new_status)
+            )
+        else:
+            db.session.execute(delete(MaintenanceQueueEntry).where(MaintenanceQueueEntry.request_id.in_(ids)))
+
+    return updated, list(remaining)
+
+
+def open_queue(limit=None):
+    """Open requests, most urgent first and then by SLA deadline."""
+    query = (
+        MaintenanceRequest.query
+        .join(MaintenanceQueueEntry, MaintenanceQueueEntry.request_id == MaintenanceRequest.id)
+        .order_by(MaintenanceQueueEntry.priority_rank, MaintenanceQueueEntry.due_at)
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def overdue_queue(now=None):
+    now = now or datetime.utcnow()
+    return (
+        MaintenanceRequest.query
+        .join(MaintenanceQueueEntry, MaintenanceQueueEntry.request_id == MaintenanceRequest.id)
+        .filter(MaintenanceQueueEntry.due_at < now)
+        .order_by(MaintenanceQueueEntry.due_at)
+        .all()
+    )
+
+
+def queue_counts(now=None):
+    """Open counts by status plus urgent and overdue counts, read from the queue table only."""
+    now = now or datetime.utcnow()
+    counts = dict.fromkeys(OPEN_STATUSES, 0)
+    counts.update(
+        db.session.query(MaintenanceQueueEntry.status, func.count())
+        .group_by(MaintenanceQueueEntry.status)
+        .all()
+    )
+    counts['urgent'] = MaintenanceQueueEntry.query.filter_by(priority_rank=PRIORITY_RANK['urgent']).count()
+    counts['overdue'] = MaintenanceQueueEntry.query.filter(MaintenanceQueueEntry.due_at < now).count()
+    return counts
+
+
+def rebuild_queue():
+    """Recreate every queue row from the requests table. Also back-fills missing SLA deadlines."""
+    MaintenanceQueueEntry.query.delete()
+    db.session.expire_all()
+    rebuilt = 0
+    for maintenance_request in MaintenanceRequest.query.filter(MaintenanceRequest.status.in_(OPEN_STATUSES)):
+        if maintenance_request.due_at is None:
+            maintenance_request.due_at = sla_deadline(maintenance_request.priority, maintenance_request.created_at)
+        sync_queue(maintenance_request)
+        rebuilt += 1
+    db.session.commit()
+    return rebuilt
+
+
+maintenance_cli = AppGroup('maintenance', help='Maintenance workflow.')
+
+
+@maintenance_cli.command('rebuild-queue')
+def rebuild_queue_command():
+    """Rebuild the open-request queue from the requests table."""
+    click.echo(f'Queued {rebuild_queue()} open requests')
+
+
+def init_maintenance_workflow(app):
+    app.cli.add_command(maintenance_cli)
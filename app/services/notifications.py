@@ -0,0 +1,332 @@
+"""
+Notification fan-out.
+
+Views call ``notify()``, which only adds outbox rows to the current
+transaction. Once that transaction commits, a dispatcher thread claims the
+rows that are due, coalesces them per user into a single message (a digest
+when the user asked for one) and hands each user's batch to a worker pool,
+so delivery never runs on the request path.
+"""
+
+import logging
+import smtplib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func
+
+from app import db
+from app.models.notification import Notification, NotificationPreference
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+SMS_MAX_LENGTH = 320
+
+
+def notify(user_id, event_type, subject, body):
+    """Queue a notification for ``user_id``; it is delivered after the current transaction commits."""
+    db.session.add(Notification(user_id=user_id, event_type=event_type, subject=subject, body=body))
+    db.session.info['notifications_queued'] = True
+
+
+def notify_many(user_ids, event_type, subject, body):
+    for user_id in set(user_ids):
+        notify(user_id, event_type, subject, body)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('notifications_queued', False):
+        dispatcher = current_app.extensions.get('notification_dispatcher')
+        if dispatcher is not None and dispatcher.inline:
+            dispatcher.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_queued(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop('notifications_queued', None)
+
+
+# Transports
+
+class Transport:
+    """Delivers one message to one address. Subclasses implement ``send``."""
+
+    def send(self, address, subject, body):
+        raise NotImplementedError
+
+
+class SMTPTransport(Transport):
+    def __init__(self, host, port, sender, username=None, password=None, use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            host=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            sender=config['MAIL_DEFAULT_SENDER'],
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', False),
+        )
+
+    def send(self, address, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = address
+        message['Subject'] = subject
+        message.set_content(body)
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+class LogTransport(Transport):
+    """Writes messages to the application log. Used for SMS until a provider is configured."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, address, subject, body):
+        logger.info('[%s] to=%s subject=%s\n%s', self.channel, address, subject, body)
+
+
+def build_transports(config):
+    transports = {}
+    for channel, name in config['NOTIFICATION_TRANSPORTS'].items():
+        if name == 'smtp':
+            transports[channel] = SMTPTransport.from_config(config)
+        elif name == 'log':
+            transports[channel] = LogTransport(channel)
+        else:
+            raise ValueError(f'Unknown notification transport {name!r} for channel {channel!r}')
+    return transports
+
+
+# Dispatch
+
+def compose(notifications):
+    """Coalesce a user's pending notifications into one (subject, body) pair."""
+    if len(notifications) == 1:
+        return notifications[0].subject, notifications[0].body
+
+    subject = f'You have {len(notifications)} new updates from Retreat Housing'
+    sections = [
+        f"{n.created_at.strftime('%b %d, %I:%M %p')} - {n.subject}\n{n.body}"
+        for n in notifications
+    ]
+    return subject, '\n\n'.join(sections)
+
+
+class NotificationDispatcher:
+    def __init__(self, app):
+        self.app = app
+        self.inline = app.config['NOTIFICATION_INLINE_WORKER']
+        self.poll_interval = app.config['NOTIFICATION_POLL_INTERVAL']
+        self.max_workers = app.config['NOTIFICATION_WORKERS']
+        self.batch_size = app.config['NOTIFICATION_BATCH_SIZE']
+        self.transports = build_transports(app.config)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        # Started lazily so gunicorn workers each get their own thread after forking
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='notify')
+            self._thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.dispatch_due()
+            except Exception:
+                logger.exception('Notification dispatch failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def dispatch_due(self, wait=False):
+        with self.app.app_context():
+            release_stale_claims()
+            claims = claim_due(self.batch_size)
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='notify')
+        futures = [self._pool.submit(self.deliver, user_id, token) for user_id, token in claims]
+        if wait:
+            for future in futures:
+                future.result()
+        return len(claims)
+
+    def deliver(self, user_id, token):
+        with self.app.app_context():
+            notifications = Notification.query.filter_by(claim_token=token).order_by(Notification.created_at).all()
+            if not notifications:
+                return
+
+            user = db.session.get(User, user_id)
+            preference = user.notification_preference if user else None
+            channels = preference.channels if preference else ['email']
+            addresses = {'email': user.email if user else None, 'sms': user.phone if user else None}
+            targets = [(c, addresses[c]) for c in channels if addresses.get(c) and c in self.transports]
+
+            if not user or not user.is_active or not targets:
+                mark(notifications, 'skipped')
+                db.session.commit()
+                return
+
+            subject, body = compose(notifications)
+            try:
+                for channel, address in targets:
+                    text = body if channel != 'sms' else f'{subject}: {body}'[:SMS_MAX_LENGTH]
+                    self.transports[channel].send(address, subject, text)
+            except Exception:
+                logger.exception('Delivering %d notifications to user %s failed', len(notifications), user_id)
+                for notification in notifications:
+                    notification.attempts = (notification.attempts or 0) + 1
+                    notification.claim_token = None
+                    notification.status = 'failed' if notification.attempts >= MAX_ATTEMPTS else 'pending'
+            else:
+                mark(notifications, 'sent')
+            db.session.commit()
+
+
+def mark(notifications, status):
+    now = datetime.utcnow()
+    for notification in notifications:
+        notification.status = status
+        notification.sent_at = now
+
+
+def _due_cutoff(now):
+    """The newest ``created_at`` a user's oldest pending event may have for their batch to be due.
+
+    Interval arithmetic differs between SQLite and PostgreSQL, so the cutoff
+    for each digest interval in use is computed here and picked per user with
+    a CASE.
+    """
+    digest_minutes = func.coalesce(NotificationPreference.digest_minutes, 0)
+    intervals = [minutes for (minutes,) in db.session.query(digest_minutes).distinct() if minutes]
+    if not intervals:
+        return now
+    return case(*((digest_minutes == minutes, now - timedelta(minutes=minutes)) for minutes in intervals), else_=now)
+
+
+def claim_due(limit):
+    """Claim pending notifications of users whose batch is due; returns ``[(user_id, claim_token)]``.
+
+    A user's batch is due once the oldest pending event is older than their
+    digest interval. The due check runs in SQL, oldest batch first, so users
+    still collecting a digest never take the places of users who are due.
+    Claiming is a conditional UPDATE, so several dispatchers (one per gunicorn
+    worker, or a dedicated worker process) never send the same row twice.
+    """
+    now = datetime.utcnow()
+    oldest = func.min(Notification.created_at)
+    user_ids = (
+        db.session.query(Notification.user_id)
+        .outerjoin(NotificationPreference, NotificationPreference.user_id == Notification.user_id)
+        .filter(Notification.status == 'pending')
+        .group_by(Notification.user_id, NotificationPreference.digest_minutes)
+        .having(oldest <= _due_cutoff(now))
+        .order_by(oldest)
+        .limit(limit)
+        .all()
+    )
+
+    claims = []
+    for (user_id,) in user_ids:
+        token = uuid.uuid4().hex
+        claimed = (
+            Notification.query
+            .filter_by(user_id=user_id, status='pending')
+            .update({'status': 'sending', 'claim_token': token, 'claimed_at': now}, synchronize_session=False)
+        )
+        if claimed:
+            claims.append((user_id, token))
+    db.session.commit()
+    return claims
+
+
+def release_stale_claims(older_than=timedelta(minutes=15)):
+    """Return rows left in ``sending`` by a worker that died mid-delivery to the queue."""
+    cutoff = datetime.utcnow() - older_than
+    released = (
+        Notification.query
+        .filter(Notification.status == 'sending', Notification.claimed_at < cutoff)
+        .update({'status': 'pending', 'claim_token': None}, synchronize_session=False)
+    )
+    db.session.commit()
+    return released
+
+
+notifications_cli = AppGroup('notifications', help='Notification delivery.')
+
+
+@notifications_cli.command('run')
+@click.option('--once', is_flag=True, help='Deliver everything that is due, then exit.')
+def run_worker(once):
+    """Run a dedicated notification worker."""
+    dispatcher = current_app.extensions['notification_dispatcher']
+    if once:
+        click.echo(f'Delivered {dispatcher.dispatch_due(wait=True)} batches')
+        return
+    click.echo('Notification worker running, press Ctrl+C to stop')
+    try:
+        dispatcher.run()
+    except KeyboardInterrupt:
+        dispatcher.stop()
+
+
+@notifications_cli.command('debug-smtp')
+@click.option('--host', default='localhost')
+@click.option('--port', default=1025, type=int)
+def debug_smtp(host, port):
+    """Run a local SMTP server that prints every message instead of sending it."""
+    from app.services.debug_smtp import serve
+    click.echo(f'Debug SMTP server listening on {host}:{port}')
+    serve(host, port)
+
+
+def init_notifications(app):
+    app.extensions['notification_dispatcher'] = NotificationDispatcher(app)
+    app.cli.add_command(notifications_cli)
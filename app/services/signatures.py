@@ -0,0 +1,465 @@
+"""
+Lease document signatures.
+
+A signature request sends one document to its lease's tenant. The link in
+the notification carries a random token and only its SHA-256 is stored, so
+the table can't be used to forge links. The signer opens the link while
+logged in, reads the document and types their name. Signing re-hashes the
+file and refuses if it no longer matches the hash taken when the request
+was sent, so what was signed is exactly what was sent. The ``signatures``
+row keeps that hash and an HMAC seal over the request, document hash,
+signer, typed name and time. ``flask signatures verify`` checks both.
+
+"Send all renewals for signature" doesn't create requests in the view.
+It queues a ``signature_batches`` row and a background runner (a thread in
+each web process, or ``flask signatures run``) works through it. The runner
+finds every active lease ending within ``SIGNATURE_RENEWAL_WINDOW_DAYS`` with
+one query, taking each lease's latest signable document (agreement or
+addendum); a lease is skipped if that document's current version already
+has an open or signed request. It then hashes the files and inserts
+requests and notifications ``SIGNATURE_BATCH_CHUNK`` at a time with one
+multi-row INSERT each. Every chunk commits on its own, and a batch picked
+up again after a crash skips the documents it already sent.
+"""
+
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from sqlalchemy import event, exists, func, insert, or_
+
+from app import db
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.models.lease import Lease
+from app.models.notification import Notification
+from app.models.signature import Signature, SignatureBatch, SignatureRequest
+from app.services.attachments import file_sha256
+from app.services.notifications import notify
+from app.tenancy import scoped_to
+
+logger = logging.getLogger(__name__)
+
+QUEUED_KEY = 'signature_batches_queued'
+# Document types that are sent for signature; notices are only for reading
+SIGNABLE_TYPES = ('lease_agreement', 'addendum')
+# A document version with a request in one of these states is not sent again
+OUTSTANDING_STATUSES = ('pending', 'signed')
+
+
+class SignatureError(Exception):
+    """The request can't be sent or signed; the message can be shown to the user."""
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _new_token():
+    token = secrets.token_urlsafe(32)
+    return token, _digest(token)
+
+
+def _for_current_version():
+    """Requests sent for the document's current content; documents from before versioning have no hash to compare."""
+    return or_(Document.content_hash.is_(None), SignatureRequest.document_sha256 == Document.content_hash)
+
+
+def _request_message(file_name, link, expires_at):
+    subject = f'Please sign "{file_name}"'
+    body = (f'"{file_name}" is ready for your signature. Review and sign it here before '
+            f'{expires_at.strftime("%b %d, %Y")}:\n\n{link}')
+    return subject, body
+
+
+def request_signature(document, requested_by):
+    """Send ``document`` to its lease's tenant for signature; the caller commits."""
+    if document.document_type not in SIGNABLE_TYPES:
+        raise SignatureError('Notices are not sent for signature.')
+    if (
+        SignatureRequest.query
+        .join(Document, Document.id == SignatureRequest.document_id)
+        .filter(SignatureRequest.document_id == document.id, SignatureRequest.status.in_(OUTSTANDING_STATUSES))
+        .filter(_for_current_version())
+        .first()
+    ) is not None:
+        raise SignatureError('This version of the document already has an open or completed signature request.')
+    try:
+        document_sha256 = file_sha256(document.file_path)
+    except OSError:
+        raise SignatureError('The document file is missing.')
+
+    token, token_hash = _new_token()
+    expires_at = datetime.utcnow() + timedelta(days=current_app.config['SIGNATURE_REQUEST_TTL_DAYS'])
+    signature_request = SignatureRequest(
+        document_id=document.id,
+        signer_id=document.lease.tenant_id,
+        requested_by=requested_by.id,
+        token_hash=token_hash,
+        document_sha256=document_sha256,
+        expires_at=expires_at,
+    )
+    db.session.add(signature_request)
+    subject, body = _request_message(document.file_name, url_for('main.sign_document', token=token, _external=True), expires_at)
+    notify(signature_request.signer_id, 'signature_request', subject, body)
+    return signature_request
+
+
+def find_request(token):
+    """Look up a request by the token from its link: one probe of the unique ``token_hash`` index."""
+    return SignatureRequest.query.filter_by(token_hash=_digest(token)).first()
+
+
+def seal(request_id, document_sha256, signer_id, signed_name, signed_at):
+    message = '\n'.join([str(request_id), document_sha256, str(signer_id), signed_name, signed_at.isoformat()])
+    return hmac.new(current_app.config['SECRET_KEY'].encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def sign(signature_request, signer, signed_name, ip_address=None, user_agent=None):
+    """Record ``signer``'s signature; the caller commits."""
+    if not signature_request.is_open:
+        raise SignatureError('This signature request is no longer open.')
+    try:
+        document_sha256 = file_sha256(signature_request.document.file_path)
+    except OSError:
+        raise SignatureError('The document file is missing. Please contact your property manager.')
+    if document_sha256 != signature_request.document_sha256:
+        signature_request.status = 'cancelled'
+        signature_request.completed_at = datetime.utcnow()
+        raise SignatureError('The document has changed since it was sent, so this request was cancelled. '
+                             'Your property manager will send the new version.')
+
+    signed_at = datetime.utcnow()
+    # Conditional on the status, so a double submit can't produce two signatures
+    if not (
+        SignatureRequest.query
+        .filter_by(id=signature_request.id, status='pending')
+        .update({'status': 'signed', 'completed_at': signed_at}, synchronize_session=False)
+    ):
+        raise SignatureError('This signature request is no longer open.')
+    signature = Signature(
+        request_id=signature_request.id,
+        document_id=signature_request.document_id,
+        signer_id=signer.id,
+        signed_name=signed_name,
+        document_sha256=document_sha256,
+        seal=seal(signature_request.id, document_sha256, signer.id, signed_name, signed_at),
+        ip_address=ip_address,
+        user_agent=(user_agent or '')[:255] or None,
+        signed_at=signed_at,
+    )
+    db.session.add(signature)
+    file_name = signature_request.document.file_name
+    notify(signature_request.requested_by, 'signature_signed', f'"{file_name}" was signed',
+           f'{signer.full_name} signed "{file_name}" on {signed_at.strftime("%b %d, %Y at %H:%M")} UTC.')
+    return signature
+
+
+def decline(signature_request, signer):
+    """Mark the request declined; the caller commits."""
+    if not signature_request.is_open:
+        raise SignatureError('This signature request is no longer open.')
+    signature_request.status = 'declined'
+    signature_request.completed_at = datetime.utcnow()
+    file_name = signature_request.document.file_name
+    notify(signature_request.requested_by, 'signature_declined', f'"{file_name}" was declined',
+           f'{signer.full_name} declined to sign "{file_name}".')
+
+
+def verify(signature):
+    """Return ``(seal_ok, file_ok)``: the record is untampered, and the file still hashes to what was signed."""
+    expected = seal(signature.request_id, signature.document_sha256, signature.signer_id,
+                    signature.signed_name, signature.signed_at)
+    # Later uploads replace the document's file, but the signed version is kept
+    version = DocumentVersion.query.filter_by(document_id=signature.document_id,
+                                              content_hash=signature.document_sha256).first()
+    path = version.file_path if version is not None else signature.request.document.file_path
+    try:
+        file_ok = file_sha256(path) == signature.document_sha256
+    except OSError:
+        file_ok = False
+    return hmac.compare_digest(expected, signature.seal), file_ok
+
+
+def latest_statuses(document_ids):
+    """Map each of ``document_ids`` whose current version has been sent to the status of its latest request."""
+    if not document_ids:
+        return {}
+    latest = (
+        db.session.query(func.max(SignatureRequest.id))
+        .join(Document, Document.id == SignatureRequest.document_id)
+        .filter(SignatureRequest.document_id.in_(document_ids), _for_current_version())
+        .group_by(SignatureRequest.document_id)
+    )
+    return dict(
+        db.session.query(SignatureRequest.document_id, SignatureRequest.status)
+        .filter(SignatureRequest.id.in_(latest))
+        .all()
+    )
+
+
+def status_counts():
+    return dict(
+        db.session.query(SignatureRequest.status, func.count(SignatureRequest.id))
+        .group_by(SignatureRequest.status)
+        .all()
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_runner(session):
+    if session.info.pop(QUEUED_KEY, False):
+        runner = current_app.extensions.get('signature_batch_runner')
+        if runner is not None and runner.inline:
+            runner.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_queued(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(QUEUED_KEY, None)
+
+
+# Batches
+
+def queue_renewals(created_by):
+    """Queue a batch sending every renewal for signature, or return ``None`` if one is already waiting or running."""
+    if SignatureBatch.query.filter(SignatureBatch.status.in_(('queued', 'running'))).first() is not None:
+        return None
+    batch = SignatureBatch(created_by=created_by.id)
+    db.session.add(batch)
+    db.session.info[QUEUED_KEY] = True
+    return batch
+
+
+def renewal_candidates(today=None):
+    """Latest signable document of each active lease ending within the renewal window, if not already sent."""
+    today = today or date.today()
+    latest = (
+        db.session.query(func.max(Document.id).label('document_id'))
+        .filter(Document.document_type.in_(SIGNABLE_TYPES))
+        .group_by(Document.lease_id)
+        .subquery()
+    )
+    already_sent = exists().where(
+        SignatureRequest.document_id == Document.id,
+        SignatureRequest.status.in_(OUTSTANDING_STATUSES),
+        _for_current_version(),
+    )
+    return (
+        db.session.query(Document.id, Document.file_name, Document.file_path, Lease.tenant_id)
+        .join(latest, latest.c.document_id == Document.id)
+        .join(Lease, Lease.id == Document.lease_id)
+        .filter(
+            Lease.status == 'active',
+            Lease.end_date >= today,
+            Lease.end_date <= today + timedelta(days=current_app.config['SIGNATURE_RENEWAL_WINDOW_DAYS']),
+            ~already_sent,
+        )
+        .order_by(Lease.end_date, Document.id)
+        .all()
+    )
+
+
+def send_batch(batch):
+    """Create and notify every request of ``batch``, committing each chunk."""
+    lazy_views = current_app.extensions.get('lazy_views')
+    if lazy_views is not None:
+        lazy_views.load()  # url_for needs the main blueprint
+    candidates = renewal_candidates()
+    batch.total = batch.sent + len(candidates)
+    batch.skipped = 0
+    db.session.commit()
+
+    chunk_size = current_app.config['SIGNATURE_BATCH_CHUNK']
+    expires_at = datetime.utcnow() + timedelta(days=current_app.config['SIGNATURE_REQUEST_TTL_DAYS'])
+    with current_app.test_request_context(base_url=current_app.config['PUBLIC_BASE_URL']):
+        for start in range(0, len(candidates), chunk_size):
+            requests, notifications = [], []
+            for document_id, file_name, file_path, tenant_id in candidates[start:start + chunk_size]:
+                try:
+                    document_sha256 = file_sha256(file_path)
+                except OSError:
+                    logger.warning('Skipping document %s in signature batch %s: file missing', document_id, batch.id)
+                    batch.skipped += 1
+                    continue
+                token, token_hash = _new_token()
+                requests.append({
+                    'organization_id': batch.organization_id,
+                    'document_id': document_id,
+                    'signer_id': tenant_id,
+                    'requested_by': batch.created_by,
+                    'batch_id': batch.id,
+                    'token_hash': token_hash,
+                    'document_sha256': document_sha256,
+                    'expires_at': expires_at,
+                })
+                subject, body = _request_message(file_name, url_for('main.sign_document', token=token, _external=True), expires_at)
+                notifications.append({'user_id': tenant_id, 'event_type': 'signature_request', 'subject': subject, 'body': body})
+            if requests:
+                db.session.execute(insert(SignatureRequest), requests)
+                db.session.execute(insert(Notification), notifications)
+                db.session.info['notifications_queued'] = True
+            batch.sent += len(requests)
+            db.session.commit()
+
+    batch.status = 'done'
+    batch.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def expire_overdue():
+    """Mark pending requests past their expiry as expired, so their documents can be sent again."""
+    now = datetime.utcnow()
+    expired = (
+        SignatureRequest.query
+        .filter(SignatureRequest.status == 'pending', SignatureRequest.expires_at <= now)
+        .update({'status': 'expired', 'completed_at': now}, synchronize_session=False)
+    )
+    db.session.commit()
+    return expired
+
+
+def claim_queued(limit):
+    """Claim up to ``limit`` queued batches with a conditional UPDATE each; returns their ids."""
+    now = datetime.utcnow()
+    candidates = (
+        db.session.query(SignatureBatch.id)
+        .filter(SignatureBatch.status == 'queued')
+        .order_by(SignatureBatch.created_at)
+        .limit(limit)
+        .all()
+    )
+    claimed = []
+    for (batch_id,) in candidates:
+        if (
+            SignatureBatch.query
+            .filter_by(id=batch_id, status='queued')
+            .update({'status': 'running', 'claimed_at': now}, synchronize_session=False)
+        ):
+            claimed.append(batch_id)
+    db.session.commit()
+    return claimed
+
+
+def release_stale_claims(older_than=timedelta(minutes=15)):
+    """Requeue batches left ``running`` by a worker that died; they resume where they stopped."""
+    cutoff = datetime.utcnow() - older_than
+    released = (
+        SignatureBatch.query
+        .filter(SignatureBatch.status == 'running', SignatureBatch.claimed_at < cutoff)
+        .update({'status': 'queued'}, synchronize_session=False)
+    )
+    db.session.commit()
+    return released
+
+
+class SignatureBatchRunner:
+    def __init__(self, app):
+        self.app = app
+        self.inline = app.config['SIGNATURE_INLINE_WORKER']
+        self.poll_interval = app.config['SIGNATURE_POLL_INTERVAL']
+        self.batch_size = app.config['SIGNATURE_BATCH_SIZE']
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        # Started lazily so gunicorn workers each get their own thread after forking
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='signature-batch-runner', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_pending() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception('Signature batch processing failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def process_pending(self):
+        with self.app.app_context():
+            release_stale_claims()
+            expire_overdue()
+            claimed = claim_queued(self.batch_size)
+            for batch_id in claimed:
+                batch = db.session.get(SignatureBatch, batch_id)
+                with scoped_to(db.session, batch.organization_id):
+                    try:
+                        send_batch(batch)
+                    except Exception:
+                        # Chunks already committed stay sent; a retry would only repeat the failure
+                        logger.exception('Signature batch %s failed', batch_id)
+                        db.session.rollback()
+                        batch = db.session.get(SignatureBatch, batch_id)
+                        batch.status = 'failed'
+                        batch.finished_at = datetime.utcnow()
+                        db.session.commit()
+        return len(claimed)
+
+
+signatures_cli = AppGroup('signatures', help='Document signature requests.')
+
+
+@signatures_cli.command('run')
+@click.option('--once', is_flag=True, help='Send every queued batch, then exit.')
+def run_worker(once):
+    """Run a dedicated signature batch worker."""
+    runner = current_app.extensions['signature_batch_runner']
+    if once:
+        total = 0
+        while True:
+            processed = runner.process_pending()
+            total += processed
+            if processed < runner.batch_size:
+                break
+        click.echo(f'Sent {total} signature batches')
+        return
+    click.echo('Signature worker running, press Ctrl+C to stop')
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+@signatures_cli.command('verify')
+@click.argument('signature_id', type=int)
+def verify_command(signature_id):
+    """Check a signature's seal and that its document still matches what was signed."""
+    signature = db.session.get(Signature, signature_id)
+    if signature is None:
+        raise click.ClickException(f'No signature {signature_id}')
+    seal_ok, file_ok = verify(signature)
+    click.echo(f'Seal: {"valid" if seal_ok else "INVALID"}')
+    click.echo(f'Document: {"unchanged" if file_ok else "CHANGED OR MISSING"} (signed sha256 {signature.document_sha256})')
+    if not (seal_ok and file_ok):
+        raise SystemExit(1)
+
+
+def init_signatures(app):
+    app.extensions['signature_batch_runner'] = SignatureBatchRunner(app)
+    app.cli.add_command(signatures_cli)
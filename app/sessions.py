@@ -0,0 +1,379 @@
+"""
+Server-side sessions.
+
+Flask's default session is the whole session dict signed into the cookie.
+It is re-sent and re-verified on every request, and flashed messages, such
+as the generated password from ``add_tenant``, travel inside it.
+``ServerSessionInterface`` keeps the data in a session store instead. The
+cookie only carries a random, signed token.
+
+Sessions load lazily: the store is read the first time a request looks at
+the session. Requests that never do, such as static files or endpoints
+without a login check, make no lookup and deserialise nothing. Nothing is
+written back unless the session changed, or its expiry was last pushed
+back more than ``SESSION_TOUCH_INTERVAL`` ago.
+
+A new token is issued whenever the logged-in user changes (login or
+logout). Deactivating a user deletes all of that user's sessions, so a
+revoked session is simply missing on its next request. There is no
+revocation list to check per request.
+
+``SESSION_BACKEND`` picks the store:
+
+- ``database``: the ``user_sessions`` table, shared by every worker and host.
+- ``memory``: per process, for development.
+- ``cookie``: Flask's signed cookie.
+- The import path of a store class, such as a Redis store.
+
+Expired sessions are deleted in batches every ``SESSION_PRUNE_EVERY`` new
+sessions, and by ``flask sessions prune``.
+"""
+
+import hashlib
+import itertools
+import secrets
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import current_app, session as current_session
+from flask.cli import AppGroup
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, event, inspect, insert, select, update
+
+from app import db
+from app.lazy import import_string
+from app.models.user import User
+from app.models.user_session import UserSession
+
+REVOKED_KEY = 'sessions_revoked'
+serializer = TaggedJSONSerializer()
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Stores
+
+class DatabaseStore:
+    """Sessions in the ``user_sessions`` table, shared by every worker and host.
+
+    Statements run on their own connection, outside the request's
+    ``db.session`` transaction, so saving a session never commits a view's
+    unfinished work.
+    """
+
+    def load(self, key):
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(UserSession.data, UserSession.user_id, UserSession.expires_at).where(UserSession.id == key)
+            ).first()
+        return tuple(row) if row else None
+
+    def save(self, key, data, user_id, expires_at, new):
+        with db.engine.begin() as connection:
+            if new:
+                connection.execute(insert(UserSession).values(id=key, data=data, user_id=user_id, expires_at=expires_at))
+            else:
+                connection.execute(
+                    update(UserSession).where(UserSession.id == key)
+                    .values(data=data, user_id=user_id, expires_at=expires_at)
+                )
+
+    def touch(self, key, expires_at):
+        with db.engine.begin() as connection:
+            connection.execute(update(UserSession).where(UserSession.id == key).values(expires_at=expires_at))
+
+    def delete(self, key):
+        with db.engine.begin() as connection:
+            connection.execute(delete(UserSession).where(UserSession.id == key))
+
+    def revoke_user(self, user_ids):
+        with db.engine.begin() as connection:
+            return connection.execute(delete(UserSession).where(UserSession.user_id.in_(user_ids))).rowcount
+
+    def prune(self, now, batch_size):
+        deleted = 0
+        while True:
+            # Bounded batches keep each write lock short
+            with db.engine.begin() as connection:
+                expired = select(UserSession.id).where(UserSession.expires_at < now).limit(batch_size)
+                batch = connection.execute(delete(UserSession).where(UserSession.id.in_(expired))).rowcount
+            deleted += batch
+            if batch < batch_size:
+                return deleted
+
+
+class MemoryStore:
+    """Per-process sessions for development; a login only holds on the worker that handled it."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        with self._lock:
+            return self._sessions.get(key)
+
+    def save(self, key, data, user_id, expires_at, new):
+        with self._lock:
+            self._sessions[key] = (data, user_id, expires_at)
+
+    def touch(self, key, expires_at):
+        with self._lock:
+            if key in self._sessions:
+                data, user_id, _ = self._sessions[key]
+                self._sessions[key] = (data, user_id, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def revoke_user(self, user_ids):
+        with self._lock:
+            revoked = [key for key, (_, user_id, _) in self._sessions.items() if user_id in user_ids]
+            for key in revoked:
+                del self._sessions[key]
+        return len(revoked)
+
+    def prune(self, now, batch_size):
+        with self._lock:
+            expired = [key for key, (_, _, expires_at) in self._sessions.items() if expires_at < now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+
+STORES = {
+    'database': DatabaseStore,
+    'memory': MemoryStore,
+}
+
+
+# Flask integration
+
+class ServerSession(SessionMixin):
+    """Session whose data is read from the store the first time it is used."""
+
+    def __init__(self, store, token=None):
+        self.token = token
+        self.key = _digest(token) if token else None
+        self.user_id = None
+        self.expires_at = None
+        self.modified = False
+        self.accessed = False
+        self._store = store
+        self._data = None if token else {}
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            entry = self._store.load(self.key)
+            if entry is None or entry[2] <= datetime.utcnow():
+                self.token = self.key = None
+                self._data = {}
+            else:
+                data, self.user_id, self.expires_at = entry
+                self._data = serializer.loads(data)
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+def _session_user_id(session):
+    user_id = session.get('_user_id')
+    return int(user_id) if user_id and str(user_id).isdigit() else None
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, touch_interval, prune_every, prune_batch_size):
+        self.store = store
+        self.touch_interval = timedelta(seconds=touch_interval)
+        self.prune_every = prune_every
+        self.prune_batch_size = prune_batch_size
+        self._created = itertools.count(1)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session', key_derivation='hmac')
+
+    def open_session(self, app, request):
+        token = None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                token = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                pass  # forged or from an old secret key: treated as no session, without a store lookup
+        return ServerSession(self.store, token)
+
+    def save_session(self, app, session, response):
+        if not session.accessed:
+            return
+        response.vary.add('Cookie')
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if not session:
+            if session.token:
+                self.store.delete(session.key)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly)
+            return
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        expires_at = now + lifetime
+        user_id = _session_user_id(session)
+        if session.token is None or user_id != session.user_id:
+            # A new session, or a login or logout: a token seen before the change stops working
+            if session.token:
+                self.store.delete(session.key)
+            session.token = secrets.token_urlsafe(32)
+            session.key = _digest(session.token)
+            self.store.save(session.key, serializer.dumps(dict(session)), user_id, expires_at, new=True)
+            if next(self._created) % self.prune_every == 0:
+                self.prune(now)
+        elif session.modified:
+            self.store.save(session.key, serializer.dumps(dict(session)), user_id, expires_at, new=False)
+            if not session.permanent:
+                return
+        elif session.expires_at < expires_at - self.touch_interval:
+            self.store.touch(session.key, expires_at)
+            if not session.permanent:
+                return
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.token).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+    def prune(self, now=None):
+        """Delete expired sessions; returns how many."""
+        return self.store.prune(now or datetime.utcnow(), self.prune_batch_size)
+
+
+def revoke_user_sessions(user_ids):
+    """End every session of ``user_ids``; returns how many were deleted."""
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSessionInterface):
+        return 0
+    return interface.store.revoke_user(set(user_ids))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _note_deactivated_users(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            history = inspect(obj).attrs.is_active.history
+            if history.deleted and history.deleted[0] and not obj.is_active:
+                session.info.setdefault(REVOKED_KEY, set()).add(obj.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _revoke_deactivated_users(session):
+    user_ids = session.info.pop(REVOKED_KEY, None)
+    if user_ids:
+        revoke_user_sessions(user_ids)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_deactivated_users(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop(REVOKED_KEY, None)
+
+
+sessions_cli = AppGroup('sessions', help='Server-side sessions.')
+
+
+def _server_sessions():
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSessionInterface):
+        raise click.ClickException('SESSION_BACKEND is "cookie"; sessions are not stored server-side')
+    return interface
+
+
+@sessions_cli.command('prune')
+def prune_command():
+    """Delete expired sessions."""
+    click.echo(f'Deleted {_server_sessions().prune()} expired sessions')
+
+
+@sessions_cli.command('revoke')
+@click.argument('username')
+def revoke_command(username):
+    """Log a user out everywhere."""
+    interface = _server_sessions()
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    click.echo(f'Revoked {interface.store.revoke_user({user.id})} sessions of {username}')
+
+
+def build_store(backend):
+    if backend == 'cookie':
+        return None
+    if backend in STORES:
+        return STORES[backend]()
+    return import_string(backend)()
+
+
+def _unless_unloaded(hook):
+    @wraps(hook)
+    def wrapper(response):
+        if isinstance(current_session._get_current_object(), ServerSession) and not current_session.loaded:
+            return response
+        return hook(response)
+    return wrapper
+
+
+def init_sessions(app):
+    store = build_store(app.config['SESSION_BACKEND'])
+    if store is not None:
+        app.session_interface = ServerSessionInterface(
+            store,
+            touch_interval=app.config['SESSION_TOUCH_INTERVAL'],
+            prune_every=app.config['SESSION_PRUNE_EVERY'],
+            prune_batch_size=app.config['SESSION_PRUNE_BATCH_SIZE'],
+        )
+        # Flask-Login looks for a remember-me flag in the session after every
+        # request, which would load it for static files too. The flag can only
+        # have been set by a request that loaded the session, so skip the rest.
+        hooks = app.after_request_funcs.setdefault(None, [])
+        hooks[:] = [_unless_unloaded(hook) if getattr(hook, '__name__', '') == '_update_remember_cookie' else hook
+                    for hook in hooks]
+    app.cli.add_command(sessions_cli)
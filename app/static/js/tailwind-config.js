@@ -0,0 +1,32 @@
+// Theme for the Tailwind CDN build; loaded right after the CDN script
+tailwind.config = {
+    theme: {
+        extend: {
+            colors: {
+                primary: {
+                    50: '#f0f4f8',
+                    100: '#d9e6f2',
+                    200: '#b3cce5',
+                    300: '#8db3d8',
+                    400: '#6799cb',
+                    500: '#4080be',
+                    600: '#3366a0',
+                    700: '#264d82',
+                    800: '#1a365d',
+                    900: '#0d1b2e',
+                },
+                secondary: {
+                    800: '#c53030',
+                },
+                accent: {
+                    1: '#ffd700',
+                    2: '#2d3748',
+                }
+            },
+            fontFamily: {
+                'heading': ['"Playfair Display"', 'serif'],
+                'body': ['Inter', 'sans-serif'],
+            }
+        }
+    }
+}
@@ -0,0 +1,41 @@
+// Typeahead for long select lists rendered by the choice_field macro
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-typeahead]').forEach(function(input) {
+        const hidden = document.getElementById(input.dataset.target);
+        const options = document.getElementById(input.getAttribute('list'));
+        let ids = {};
+        let timer = null;
+
+        if (input.value) {
+            ids[input.value] = hidden.value;
+        }
+
+        input.addEventListener('input', function() {
+            // Only a label picked from the suggestions selects a row
+            hidden.value = Object.prototype.hasOwnProperty.call(ids, input.value) ? ids[input.value] : input.dataset.empty;
+
+            const query = input.value.trim();
+            clearTimeout(timer);
+            if (query.length < 2) {
+                return;
+            }
+            timer = setTimeout(function() {
+                fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(query), {credentials: 'same-origin'})
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        ids = {};
+                        options.innerHTML = '';
+                        data.results.forEach(function(choice) {
+                            ids[choice.label] = choice.id;
+                            const option = document.createElement('option');
+                            option.value = choice.label;
+                            options.appendChild(option);
+                        });
+                        if (Object.prototype.hasOwnProperty.call(ids, input.value)) {
+                            hidden.value = ids[input.value];
+                        }
+                    });
+            }, 250);
+        });
+    });
+});
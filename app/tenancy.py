@@ -0,0 +1,85 @@
+"""
+Organization partitioning.
+
+Every ``OrganizationScoped`` model carries an ``organization_id``. While a
+request is served for a signed-in user, the session's ``info`` holds that
+user's organization and a ``do_orm_execute`` hook adds
+``organization_id = :org`` to every ORM SELECT, UPDATE and DELETE touching a
+scoped model, including relationship and column loads. New scoped rows pick
+up the organization on flush. Together with the org-leading composite
+indexes on each table, an admin's queries only read their own partition.
+
+Code running outside a request (CLI commands, background workers, seeding)
+has no organization set and sees every partition, unless it opts in with
+``scoped_to()``.
+"""
+
+from contextlib import contextmanager
+
+from flask import request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+
+from app import db
+from app.assets import STATIC_ENDPOINTS
+from app.models.organization import OrganizationScoped
+
+ORG_KEY = 'organization_id'
+
+
+def current_organization_id(session):
+    return session.info.get(ORG_KEY)
+
+
+@contextmanager
+def scoped_to(session, organization_id):
+    """Scope ``session`` to ``organization_id`` for the duration of the block."""
+    previous = session.info.get(ORG_KEY)
+    session.info[ORG_KEY] = organization_id
+    try:
+        yield
+    finally:
+        if previous is None:
+            session.info.pop(ORG_KEY, None)
+        else:
+            session.info[ORG_KEY] = previous
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _scope_statement(execute_state):
+    organization_id = current_organization_id(execute_state.session)
+    if organization_id is None:
+        return
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            OrganizationScoped,
+            lambda cls: cls.organization_id == organization_id,
+            include_aliases=True,
+        )
+    )
+
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_new_rows(session, flush_context, instances):
+    organization_id = current_organization_id(session)
+    if organization_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, OrganizationScoped) and obj.organization_id is None:
+            obj.organization_id = organization_id
+
+
+def init_tenancy(app):
+    @app.before_request
+    def scope_session_to_organization():
+        # Loading current_user runs unscoped, since no organization is set yet.
+        # Static files skip it so their responses don't vary on the session cookie.
+        if request.endpoint not in STATIC_ENDPOINTS and current_user.is_authenticated:
+            db.session.info[ORG_KEY] = current_user.organization_id
+
+    @app.teardown_request
+    def clear_organization_scope(exc=None):
+        db.session.info.pop(ORG_KEY, None)
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from functools import wraps
 from app import db
@@ -8,7 +8,24 @@ from app.models.lease import Lease
 from app.models.document import Document
 from app.models.message import Message
 from app.models.maintenance_request import MaintenanceRequest
-from app.forms import TenantRegistrationForm, PropertyForm, LeaseForm, MessageForm, DocumentUploadForm
+from app.forms import TenantRegistrationForm, PropertyForm, LeaseForm, MessageForm, DocumentUploadForm, DocumentVersionForm
+from app.services.notifications import notify
+from app.services import maintenance_workflow as workflow
+from app.models.maintenance_queue_entry import MaintenanceQueueEntry
+from app.concurrency import check_version
+from app.services import audit
+from app.services.archival import search_archive
+from app.services import analytics
+from app.services.leases import find_overlapping, is_overlap_violation, overlap_message
+from app.services.choices import SOURCES as CHOICE_SOURCES, get_choices, search_choices
+from app.services import attachments
+from app.services import maintenance_photos
+from app.services import signatures
+from app.services import documents as documents_service
+from app.models.signature import Signature, SignatureBatch, SignatureRequest
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import secrets
 import string
 
@@ -31,7 +48,7 @@ def dashboard():
     total_properties = Property.query.filter_by(owner_id=current_user.id).count()
     total_tenants = User.query.filter_by(role='tenant', is_active=True).count()
     active_leases = Lease.query.filter_by(status='active').count()
-    pending_maintenance = MaintenanceRequest.query.filter_by(status='pending').count()
+    pending_maintenance = MaintenanceQueueEntry.query.filter_by(status='pending').count()
     unread_messages = Message.query.filter_by(recipient_id=current_user.id, is_read=False).count()
     
     # Recent activity
@@ -127,10 +144,15 @@ def add_lease():
     form = LeaseForm()
     
     # Populate choices
-    form.tenant_id.choices = [(u.id, u.full_name) for u in User.query.filter_by(role='tenant', is_active=True).all()]
-    form.property_id.choices = [(p.id, p.address) for p in Property.query.filter_by(owner_id=current_user.id).all()]
+    form.tenant_id.choices = get_choices('tenants')
+    form.property_id.choices = get_choices('properties')
     
     if form.validate_on_submit():
+        conflict = find_overlapping(form.property_id.data, form.start_date.data, form.end_date.data)
+        if conflict:
+            flash(overlap_message(conflict), 'error')
+            return render_template('admin/add_lease.html', form=form)
+        
         lease = Lease(
             tenant_id=form.tenant_id.data,
             property_id=form.property_id.data,
@@ -140,7 +162,15 @@ def add_lease():
             security_deposit=form.security_deposit.data
         )
         db.session.add(lease)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_overlap_violation(e):
+                raise
+            # An overlapping lease was saved after the check above
+            flash(overlap_message(find_overlapping(form.property_id.data, form.start_date.data, form.end_date.data)), 'error')
+            return render_template('admin/add_lease.html', form=form)
         flash('Lease created successfully!', 'success')
         return redirect(url_for('admin.leases'))
     return render_template('admin/add_lease.html', form=form)
@@ -161,23 +191,34 @@ def send_message():
     form = MessageForm()
     
     # Populate tenant choices
-    form.recipient_id.choices = [(u.id, u.full_name) for u in User.query.filter_by(role='tenant', is_active=True).all()]
-    form.property_id.choices = [(0, 'None')] + [(p.id, p.address) for p in Property.query.filter_by(owner_id=current_user.id).all()]
+    form.recipient_id.choices = get_choices('tenants')
+    form.property_id.choices = [(0, 'None')] + list(get_choices('properties'))
     
     if form.validate_on_submit():
+        property_id = form.property_id.data if form.property_id.data != 0 else None
+        attachment = None
+        if form.attachment.data:
+            try:
+                attachment = attachments.store(form.attachment.data, current_user, property_id)
+            except attachments.AttachmentError as e:
+                flash(str(e), 'error')
+                return render_template('admin/send_message.html', form=form)
         message = Message(
             sender_id=current_user.id,
             recipient_id=form.recipient_id.data,
-            property_id=form.property_id.data if form.property_id.data != 0 else None,
+            property_id=property_id,
             message_text=form.message_text.data
         )
         db.session.add(message)
+        if attachment is not None:
+            attachments.attach(attachment, message)
+        notify(message.recipient_id, 'message', f'New message from {current_user.full_name}', message.message_text)
         db.session.commit()
         flash('Message sent successfully!', 'success')
         return redirect(url_for('admin.messages'))
     return render_template('admin/send_message.html', form=form)
 
-@admin_bp.route('/messages/<int:message_id>/read')
+@admin_bp.route('/messages/<int:message_id>/read', methods=['POST'])
 @login_required
 @admin_required
 def mark_message_read(message_id):
@@ -193,7 +234,7 @@ def mark_message_read(message_id):
     
     return redirect(url_for('admin.messages'))
 
-@admin_bp.route('/messages/<int:message_id>/delete')
+@admin_bp.route('/messages/<int:message_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def delete_message(message_id):
@@ -201,33 +242,49 @@ def delete_message(message_id):
     
     # Only allow sender or recipient to delete
     if message.sender_id == current_user.id or message.recipient_id == current_user.id:
-        db.session.delete(message)
+        message.soft_delete()
         db.session.commit()
-        flash('Message deleted successfully.', 'success')
+        flash('Message deleted. It can be restored from the archive page for a while.', 'success')
     else:
         flash('You can only delete your own messages.', 'error')
     
     return redirect(url_for('admin.messages'))
 
-@admin_bp.route('/messages/mark-all-read')
+@admin_bp.route('/messages/mark-all-read', methods=['POST'])
 @login_required
 @admin_required
 def mark_all_messages_read():
-    messages = Message.query.filter_by(recipient_id=current_user.id, is_read=False).all()
-    
-    for message in messages:
-        message.is_read = True
+    # Single conditional UPDATE; rows another request already marked read are not touched.
+    # The soft-delete filter only applies to SELECTs, so deleted messages are excluded here.
+    updated = (
+        Message.query
+        .filter_by(recipient_id=current_user.id, is_read=False)
+        .filter(Message.deleted_at.is_(None))
+        .update({'is_read': True}, synchronize_session=False)
+    )
     
     db.session.commit()
-    flash(f'{len(messages)} messages marked as read.', 'success')
+    flash(f'{updated} messages marked as read.', 'success')
     return redirect(url_for('admin.messages'))
 
 @admin_bp.route('/maintenance')
 @login_required
 @admin_required
 def maintenance():
-    requests = MaintenanceRequest.query.order_by(MaintenanceRequest.created_at.desc()).all()
-    return render_template('admin/maintenance.html', requests=requests)
+    # Open work comes from the indexed queue; closed requests are only the most recent ones
+    open_requests = workflow.open_queue()
+    closed_requests = MaintenanceRequest.query.filter(
+        MaintenanceRequest.status.in_(workflow.CLOSED_STATUSES)
+    ).order_by(MaintenanceRequest.updated_at.desc()).limit(current_app.config['MAINTENANCE_BOARD_CLOSED_LIMIT']).all()
+    
+    counts = workflow.queue_counts()
+    counts['completed'] = MaintenanceRequest.query.filter_by(status='completed').count()
+    
+    return render_template('admin/maintenance.html',
+                         requests=open_requests + closed_requests,
+                         counts=counts,
+                         transitions=workflow.TRANSITIONS,
+                         status_labels=workflow.STATUS_LABELS)
 
 @admin_bp.route('/maintenance/update', methods=['POST'])
 @login_required
@@ -241,22 +298,96 @@ def update_maintenance_status():
         return redirect(url_for('admin.maintenance'))
     
     maintenance_request = MaintenanceRequest.query.get_or_404(request_id)
-    maintenance_request.status = new_status
+    check_version(maintenance_request, request.form.get('version', type=int))
+    try:
+        workflow.transition(maintenance_request, new_status, current_user.id, note=request.form.get('note') or None)
+    except workflow.InvalidTransition as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.maintenance'))
+    
+    status_label = workflow.STATUS_LABELS[new_status]
+    notify(maintenance_request.tenant_id, 'maintenance_status',
+           f'Maintenance request "{maintenance_request.title}" is now {status_label}',
+           f'The status of your maintenance request "{maintenance_request.title}" was updated to {status_label}.')
+    db.session.commit()
+    
+    flash(f'Maintenance request status updated to {status_label}!', 'success')
+    return redirect(url_for('admin.maintenance'))
+
+@admin_bp.route('/maintenance/bulk-update', methods=['POST'])
+@login_required
+@admin_required
+def bulk_update_maintenance_status():
+    new_status = request.form.get('status')
+    expected_versions = {}
+    for value in request.form.getlist('selected'):
+        request_id, _, version = value.partition(':')
+        if request_id.isdigit() and version.isdigit():
+            expected_versions[int(request_id)] = int(version)
+    
+    if not new_status or not expected_versions:
+        flash('Select at least one request and a status.', 'error')
+        return redirect(url_for('admin.maintenance'))
+    
+    try:
+        updated, skipped = workflow.bulk_transition(expected_versions, new_status, current_user.id)
+    except workflow.InvalidTransition as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.maintenance'))
+    
+    status_label = workflow.STATUS_LABELS[new_status]
+    for row in updated:
+        notify(row.tenant_id, 'maintenance_status',
+               f'Maintenance request "{row.title}" is now {status_label}',
+               f'The status of your maintenance request "{row.title}" was updated to {status_label}.')
     db.session.commit()
     
-    flash(f'Maintenance request status updated to {new_status.replace("_", " ").title()}!', 'success')
+    flash(f'{len(updated)} maintenance requests updated to {status_label}.', 'success')
+    if skipped:
+        flash(f'{len(skipped)} requests were skipped because they changed since you loaded the page or cannot move to {status_label}.', 'error')
     return redirect(url_for('admin.maintenance'))
 
-@admin_bp.route('/maintenance/<int:request_id>/delete')
+@admin_bp.route('/maintenance/<int:request_id>/assign', methods=['POST'])
+@login_required
+@admin_required
+def assign_maintenance_request(request_id):
+    maintenance_request = MaintenanceRequest.query.get_or_404(request_id)
+    check_version(maintenance_request, request.form.get('version', type=int))
+    
+    assignee = None
+    assignee_id = request.form.get('assigned_to_id', type=int)
+    if assignee_id:
+        assignee = User.query.filter_by(id=assignee_id, role='admin').first()
+        if assignee is None:
+            flash('Selected staff member not found.', 'error')
+            return redirect(url_for('admin.view_maintenance_request', request_id=request_id))
+    
+    cost = (request.form.get('cost') or '').strip()
+    try:
+        cost = Decimal(cost) if cost else None
+    except InvalidOperation:
+        cost = Decimal('NaN')
+    if cost is not None and not (cost.is_finite() and cost >= 0):
+        flash('Cost must be a positive amount.', 'error')
+        return redirect(url_for('admin.view_maintenance_request', request_id=request_id))
+    maintenance_request.cost = cost
+    
+    workflow.assign(maintenance_request, assignee, (request.form.get('vendor_name') or '').strip(), current_user.id)
+    db.session.commit()
+    
+    flash('Assignment updated.', 'success')
+    return redirect(url_for('admin.view_maintenance_request', request_id=request_id))
+
+@admin_bp.route('/maintenance/<int:request_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def delete_maintenance_request(request_id):
     maintenance_request = MaintenanceRequest.query.get_or_404(request_id)
     
     try:
-        db.session.delete(maintenance_request)
+        workflow.soft_delete(maintenance_request, current_user.id)
         db.session.commit()
-        flash('Maintenance request deleted successfully.', 'success')
+        flash('Maintenance request deleted. It can be restored from the archive page for a while.', 'success')
     except Exception as e:
         flash('Error deleting maintenance request.', 'error')
     
@@ -267,14 +398,22 @@ def delete_maintenance_request(request_id):
 @admin_required
 def view_maintenance_request(request_id):
     maintenance_request = MaintenanceRequest.query.get_or_404(request_id)
-    return render_template('admin/maintenance_detail.html', request=maintenance_request)
+    staff = User.query.with_entities(User.id, User.first_name, User.last_name).filter_by(role='admin', is_active=True).all()
+    return render_template('admin/maintenance_detail.html',
+                         request=maintenance_request,
+                         photos=maintenance_photos.photos_for(request_id),
+                         staff=staff,
+                         transitions=workflow.TRANSITIONS,
+                         status_labels=workflow.STATUS_LABELS)
 
 @admin_bp.route('/documents')
 @login_required
 @admin_required
 def documents():
     documents = Document.query.all()
-    return render_template('admin/documents.html', documents=documents)
+    signature_statuses = signatures.latest_statuses([document.id for document in documents])
+    return render_template('admin/documents.html', documents=documents, signature_statuses=signature_statuses,
+                           signable_types=signatures.SIGNABLE_TYPES)
 
 @admin_bp.route('/documents/upload', methods=['GET', 'POST'])
 @login_required
@@ -283,41 +422,15 @@ def upload_document():
     form = DocumentUploadForm()
     
     # Populate lease choices
-    form.lease_id.choices = [(l.id, f"{l.tenant.full_name} - {l.property.address}") for l in Lease.query.all()]
+    form.lease_id.choices = get_choices('leases')
     
     if form.validate_on_submit():
-        import os
-        from werkzeug.utils import secure_filename
-        
-        # Get uploaded file
-        file = form.file.data
-        original_filename = secure_filename(file.filename)
-        
-        # Generate unique filename
-        import uuid
-        file_extension = os.path.splitext(original_filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'documents')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file with unique name
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
-        
-        # Create document record
-        document = Document(
-            lease_id=form.lease_id.data,
-            document_type=form.document_type.data,
-            file_name=original_filename,
-            file_path=file_path,
-            file_size=os.path.getsize(file_path),
-            mime_type=file.mimetype,
-            uploaded_by=current_user.id
-        )
-        
-        db.session.add(document)
+        try:
+            documents_service.create_document(form.lease_id.data, form.document_type.data, form.file.data, current_user)
+        except documents_service.DocumentError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return render_template('admin/upload_document.html', form=form)
         db.session.commit()
         
         flash('Document uploaded successfully!', 'success')
@@ -351,24 +464,220 @@ def view_document(document_id):
         flash('File not found on server.', 'error')
         return redirect(url_for('admin.documents'))
 
-@admin_bp.route('/documents/<int:document_id>/delete', methods=['GET', 'POST'])
+@admin_bp.route('/documents/<int:document_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def delete_document(document_id):
-    import os
     document = Document.query.get_or_404(document_id)
     
+    if Signature.query.filter_by(document_id=document.id).first() is not None:
+        flash('Signed documents are kept as the record of their signatures and cannot be deleted.', 'error')
+        return redirect(url_for('admin.documents'))
+    
     try:
-        # Delete physical file
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        
-        # Delete database record
-        db.session.delete(document)
+        # Stored files are removed once the delete commits, unless another version shares them
+        documents_service.delete_document(document)
         db.session.commit()
         
         flash('Document deleted successfully!', 'success')
     except Exception as e:
         flash('Error deleting document.', 'error')
     
-    return redirect(url_for('admin.documents'))
\ No newline at end of file
+    return redirect(url_for('admin.documents'))
+
+@admin_bp.route('/documents/<int:document_id>/versions', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def document_versions(document_id):
+    document = Document.query.get_or_404(document_id)
+    form = DocumentVersionForm()
+    
+    if form.validate_on_submit():
+        try:
+            version = documents_service.add_version(document, form.file.data, current_user)
+        except documents_service.DocumentError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+        else:
+            db.session.commit()
+            flash(f'Uploaded version {version.version} of {document.file_name}.', 'success')
+        return redirect(url_for('admin.document_versions', document_id=document.id))
+    
+    return render_template('admin/document_versions.html', document=document, form=form,
+                           versions=documents_service.versions(document))
+
+@admin_bp.route('/documents/<int:document_id>/versions/<int:number>/download')
+@login_required
+@admin_required
+def download_document_version(document_id, number):
+    from flask import send_file
+    document = Document.query.get_or_404(document_id)
+    version = documents_service.get_version(document, number)
+    if version is None:
+        abort(404)
+    
+    try:
+        return send_file(version.file_path, as_attachment=True, download_name=version.file_name)
+    except FileNotFoundError:
+        flash('File not found on server.', 'error')
+        return redirect(url_for('admin.document_versions', document_id=document.id))
+
+@admin_bp.route('/documents/<int:document_id>/request-signature', methods=['POST'])
+@login_required
+@admin_required
+def request_signature(document_id):
+    document = Document.query.get_or_404(document_id)
+    try:
+        signatures.request_signature(document, current_user)
+    except signatures.SignatureError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.documents'))
+    db.session.commit()
+    flash(f'Signature request sent to {document.lease.tenant.full_name}.', 'success')
+    return redirect(url_for('admin.documents'))
+
+@admin_bp.route('/signatures')
+@login_required
+@admin_required
+def signatures_overview():
+    batches = SignatureBatch.query.order_by(SignatureBatch.created_at.desc()).limit(10).all()
+    recent_requests = SignatureRequest.query.order_by(SignatureRequest.created_at.desc()).limit(
+        current_app.config['SIGNATURE_RECENT_LIMIT']).all()
+    return render_template('admin/signatures.html',
+                         batches=batches,
+                         recent_requests=recent_requests,
+                         counts=signatures.status_counts(),
+                         renewal_window=current_app.config['SIGNATURE_RENEWAL_WINDOW_DAYS'])
+
+@admin_bp.route('/signatures/renewals', methods=['POST'])
+@login_required
+@admin_required
+def send_renewals_for_signature():
+    batch = signatures.queue_renewals(current_user)
+    if batch is None:
+        flash('Renewals are already being sent for signature.', 'error')
+        return redirect(url_for('admin.signatures_overview'))
+    db.session.commit()
+    flash('Renewals are being sent for signature in the background. Progress is shown below.', 'success')
+    return redirect(url_for('admin.signatures_overview'))
+
+@admin_bp.route('/audit')
+@login_required
+@admin_required
+def audit_log():
+    entity_type = request.args.get('entity_type') or None
+    entity_id = request.args.get('entity_id', type=int)
+    days = request.args.get('days', 30, type=int)
+    
+    if entity_type and entity_id is not None:
+        events = audit.entity_history(current_user.organization_id, entity_type, entity_id)
+    else:
+        since = datetime.utcnow() - timedelta(days=days)
+        events = audit.recent_events(current_user.organization_id, since, entity_type)
+    
+    actor_ids = {e.actor_id for e in events if e.actor_id}
+    actors = dict(
+        db.session.query(User.id, User.first_name + ' ' + User.last_name).filter(User.id.in_(actor_ids)).all()
+    ) if actor_ids else {}
+    
+    return render_template('admin/audit_log.html',
+                         events=events,
+                         actors=actors,
+                         entity_type=entity_type,
+                         entity_id=entity_id,
+                         days=days,
+                         entity_types=[model.__tablename__ for model in audit.AUDITED_MODELS])
+
+@admin_bp.route('/archive')
+@login_required
+@admin_required
+def archive():
+    query = request.args.get('q', '').strip()
+    include_deleted = {'include_deleted': True}
+    
+    deleted_requests = MaintenanceRequest.query.execution_options(**include_deleted).filter(
+        MaintenanceRequest.deleted_at.isnot(None)
+    ).order_by(MaintenanceRequest.deleted_at.desc()).all()
+    deleted_messages = Message.query.execution_options(**include_deleted).filter(
+        Message.deleted_at.isnot(None),
+        (Message.sender_id == current_user.id) | (Message.recipient_id == current_user.id)
+    ).order_by(Message.deleted_at.desc()).all()
+    
+    archived_requests, archived_messages = search_archive(query, current_user) if query else ([], [])
+    
+    return render_template('admin/archive.html',
+                         query=query,
+                         deleted_requests=deleted_requests,
+                         deleted_messages=deleted_messages,
+                         archived_requests=archived_requests,
+                         archived_messages=archived_messages,
+                         retention_days=current_app.config['SOFT_DELETE_RETENTION_DAYS'])
+
+@admin_bp.route('/archive/maintenance/<int:request_id>/restore', methods=['POST'])
+@login_required
+@admin_required
+def restore_maintenance_request(request_id):
+    maintenance_request = MaintenanceRequest.query.execution_options(include_deleted=True).filter_by(
+        id=request_id
+    ).first_or_404()
+    
+    if maintenance_request.is_deleted:
+        workflow.restore(maintenance_request, current_user.id)
+        db.session.commit()
+        flash('Maintenance request restored.', 'success')
+    
+    return redirect(url_for('admin.archive'))
+
+@admin_bp.route('/archive/messages/<int:message_id>/restore', methods=['POST'])
+@login_required
+@admin_required
+def restore_message(message_id):
+    message = Message.query.execution_options(include_deleted=True).filter_by(id=message_id).first_or_404()
+    
+    if message.sender_id == current_user.id or message.recipient_id == current_user.id:
+        message.restore()
+        db.session.commit()
+        flash('Message restored.', 'success')
+    else:
+        flash('You can only restore your own messages.', 'error')
+    
+    return redirect(url_for('admin.archive'))
+
+@admin_bp.route('/analytics')
+@login_required
+@admin_required
+def analytics_dashboard():
+    days = min(max(request.args.get('days', 90, type=int), 7), 730)
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    
+    series = analytics.portfolio_series(start, end)
+    latest = series[-1] if series else None
+    summary = analytics.property_summary(start, end)
+    addresses = dict(
+        db.session.query(Property.id, Property.address).filter(Property.id.in_([row.property_id for row in summary])).all()
+    ) if summary else {}
+    
+    # Occupancy trend as SVG polyline points on a 600x120 canvas
+    step = 600 / max(len(series) - 1, 1)
+    trend = ' '.join(f'{i * step:.1f},{120 - stat.occupancy_rate * 120:.1f}' for i, stat in enumerate(series))
+    
+    return render_template('admin/analytics.html',
+                         days=days,
+                         latest=latest,
+                         vacancy_days=sum(row.vacancy_days for row in summary),
+                         maintenance_cost=sum(row.maintenance_cost or 0 for row in summary),
+                         summary=summary,
+                         addresses=addresses,
+                         by_type=analytics.rent_per_sqft_by_type(latest.day) if latest else [],
+                         trend=trend)
+
+@admin_bp.route('/choices/<kind>')
+@login_required
+@admin_required
+def choice_search(kind):
+    if kind not in CHOICE_SOURCES:
+        abort(404)
+    query = request.args.get('q', '').strip()
+    results = search_choices(kind, query) if query else []
+    return jsonify(results=[{'id': choice_id, 'label': label} for choice_id, label in results])
\ No newline at end of file
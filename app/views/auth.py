@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from math import ceil
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models.user import User
 from app.forms import LoginForm
+from app.services.login_protection import HashingBusy, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,8 +18,28 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data) and user.is_active:
+        guard = current_app.extensions['login_guard']
+        ip = request.remote_addr
+        username = form.username.data
+        
+        # Throttle before hashing so rejected attempts cost no CPU
+        retry_after = guard.retry_after(ip, username)
+        if retry_after:
+            flash(f'Too many failed login attempts. Please try again in {ceil(retry_after / 60)} minute(s).', 'error')
+            return render_template('auth/login.html', form=form), 429, {'Retry-After': str(retry_after)}
+        
+        user = User.query.filter_by(username=username).first()
+        try:
+            valid = current_app.extensions['password_hasher'].verify(user, form.password.data)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/login.html', form=form), 503, {'Retry-After': '1'}
+        
+        if valid and user.is_active:
+            guard.record_success(ip, username)
+            if needs_rehash(user.password_hash):
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             if not next_page:
@@ -26,6 +48,7 @@ def login():
                 else:
                     next_page = url_for('tenant.dashboard')
             return redirect(next_page)
+        guard.record_failure(ip, username)
         flash('Invalid username or password', 'error')
     
     return render_template('auth/login.html', form=form)
@@ -42,4 +65,4 @@ def check_user_active():
     if current_user.is_authenticated and not current_user.is_active:
         logout_user()
         flash('Your account has been deactivated', 'error')
-        return redirect(url_for('auth.login'))
\ No newline at end of file
+        return redirect(url_for('auth.login'))
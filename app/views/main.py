@@ -1,5 +1,13 @@
-from flask import Blueprint, redirect, url_for
-from flask_login import current_user
+from flask import Blueprint, redirect, url_for, render_template, flash, abort, request, send_file
+from flask_login import current_user, login_required
+from app import db
+from app.models.notification import NotificationPreference
+from app.models.message_attachment import MessageAttachment
+from app.models.maintenance_photo import MaintenancePhoto
+from app.forms import NotificationPreferenceForm, SignDocumentForm
+from app.services import attachments
+from app.services import maintenance_photos
+from app.services import signatures
 
 main_bp = Blueprint('main', __name__)
 
@@ -10,4 +18,100 @@ def index():
             return redirect(url_for('admin.dashboard'))
         else:
             return redirect(url_for('tenant.dashboard'))
-    return redirect(url_for('auth.login'))
\ No newline at end of file
+    return redirect(url_for('auth.login'))
+
+@main_bp.route('/notifications/preferences', methods=['GET', 'POST'])
+@login_required
+def notification_preferences():
+    preference = current_user.notification_preference or NotificationPreference(
+        user_id=current_user.id, email_enabled=True, sms_enabled=False, digest_minutes=0
+    )
+    form = NotificationPreferenceForm(obj=preference)
+    
+    if form.validate_on_submit():
+        if form.sms_enabled.data and not current_user.phone:
+            flash('Add a phone number to your account before enabling SMS notifications.', 'error')
+        else:
+            form.populate_obj(preference)
+            db.session.add(preference)
+            db.session.commit()
+            flash('Notification preferences saved.', 'success')
+            return redirect(url_for('main.notification_preferences'))
+    
+    return render_template('notifications/preferences.html', form=form)
+
+@main_bp.route('/attachments/<int:attachment_id>/<path:filename>')
+@login_required
+def message_attachment(attachment_id, filename):
+    attachment = MessageAttachment.query.get_or_404(attachment_id)
+    if not attachments.can_view(attachment, current_user):
+        abort(404)
+    return attachments.send_attachment(attachment)
+
+@main_bp.route('/maintenance/photos/<int:photo_id>/<variant>')
+@login_required
+def maintenance_photo(photo_id, variant):
+    photo = MaintenancePhoto.query.get_or_404(photo_id)
+    if variant not in maintenance_photos.VARIANTS or photo.status != 'ready':
+        abort(404)
+    if not maintenance_photos.can_view(photo, current_user):
+        abort(404)
+    return maintenance_photos.send_photo(photo, variant)
+
+
+def _signature_request_or_404(token):
+    # Only the tenant the request was sent to can open it; anyone else gets the same 404 as a bad token
+    signature_request = signatures.find_request(token)
+    if signature_request is None or signature_request.signer_id != current_user.id:
+        abort(404)
+    return signature_request
+
+@main_bp.route('/sign/<token>', methods=['GET', 'POST'])
+@login_required
+def sign_document(token):
+    signature_request = _signature_request_or_404(token)
+    form = SignDocumentForm()
+    
+    if signature_request.is_open and form.validate_on_submit():
+        signed_name = ' '.join(form.signed_name.data.split())
+        if signed_name.casefold() != current_user.full_name.casefold():
+            flash(f'Type your full name exactly as it appears on your account: {current_user.full_name}', 'error')
+        else:
+            try:
+                signatures.sign(signature_request, current_user, signed_name,
+                                ip_address=request.remote_addr, user_agent=request.user_agent.string)
+            except signatures.SignatureError as e:
+                db.session.commit()  # keeps the cancellation when the document changed
+                flash(str(e), 'error')
+            else:
+                db.session.commit()
+                flash('Document signed. Thank you!', 'success')
+            return redirect(url_for('main.sign_document', token=token))
+    
+    return render_template('signatures/sign.html', form=form, token=token,
+                           signature_request=signature_request, document=signature_request.document)
+
+@main_bp.route('/sign/<token>/decline', methods=['POST'])
+@login_required
+def decline_signature(token):
+    signature_request = _signature_request_or_404(token)
+    try:
+        signatures.decline(signature_request, current_user)
+    except signatures.SignatureError as e:
+        flash(str(e), 'error')
+    else:
+        db.session.commit()
+        flash('You declined to sign this document. Your property manager has been told.', 'success')
+    return redirect(url_for('main.sign_document', token=token))
+
+@main_bp.route('/sign/<token>/document')
+@login_required
+def signature_document(token):
+    document = _signature_request_or_404(token).document
+    try:
+        response = send_file(document.file_path, mimetype=document.mime_type, download_name=document.file_name)
+    except FileNotFoundError:
+        abort(404)
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
\ No newline at end of file
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from functools import wraps
+from werkzeug.exceptions import RequestEntityTooLarge
 from app import db
 from app.models.user import User
 from app.models.property import Property
@@ -9,6 +10,10 @@ from app.models.document import Document
 from app.models.message import Message
 from app.models.maintenance_request import MaintenanceRequest
 from app.forms import MessageForm, MaintenanceRequestForm
+from app.services.notifications import notify
+from app.services import maintenance_workflow as workflow
+from app.services import attachments
+from app.services import maintenance_photos
 
 tenant_bp = Blueprint('tenant', __name__)
 
@@ -91,12 +96,12 @@ def messages():
 def send_message():
     form = MessageForm()
     
-    # Get tenant's lease to determine property and admin
+    # Get tenant's lease to determine property and its manager
     active_lease = Lease.query.filter_by(tenant_id=current_user.id, status='active').first()
     
     if active_lease:
-        # Set admin as recipient and property
-        admin = User.query.filter_by(role='admin').first()
+        # Messages go to the admin who owns the leased property
+        admin = active_lease.property.owner
         if admin:
             form.recipient_id.choices = [(admin.id, 'Property Manager')]
             form.property_id.choices = [(0, 'General')] + [(active_lease.property.id, active_lease.property.address)]
@@ -108,13 +113,24 @@ def send_message():
         return redirect(url_for('tenant.messages'))
     
     if form.validate_on_submit():
+        property_id = form.property_id.data if form.property_id.data != 0 else None
+        attachment = None
+        if form.attachment.data:
+            try:
+                attachment = attachments.store(form.attachment.data, current_user, property_id)
+            except attachments.AttachmentError as e:
+                flash(str(e), 'error')
+                return render_template('tenant/send_message.html', form=form, active_lease=active_lease)
         message = Message(
             sender_id=current_user.id,
             recipient_id=form.recipient_id.data,
-            property_id=form.property_id.data if form.property_id.data != 0 else None,
+            property_id=property_id,
             message_text=form.message_text.data
         )
         db.session.add(message)
+        if attachment is not None:
+            attachments.attach(attachment, message)
+        notify(message.recipient_id, 'message', f'New message from {current_user.full_name}', message.message_text)
         db.session.commit()
         flash('Message sent successfully!', 'success')
         return redirect(url_for('tenant.messages'))
@@ -151,13 +167,33 @@ def request_maintenance():
             description=form.description.data,
             priority=form.priority.data
         )
-        db.session.add(maintenance_request)
+        workflow.open_request(maintenance_request, current_user.id)
+        try:
+            maintenance_photos.add_photos(maintenance_request, form.photos.data or [], current_user)
+        except maintenance_photos.PhotoError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return render_template('tenant/request_maintenance.html', form=form, active_lease=active_lease)
+        notify(active_lease.property.owner_id, 'maintenance_created',
+               f'New {maintenance_request.priority} maintenance request: {maintenance_request.title}',
+               f'{current_user.full_name} reported an issue at {active_lease.property.address}:\n\n{maintenance_request.description}')
         db.session.commit()
         flash('Maintenance request submitted successfully!', 'success')
         return redirect(url_for('tenant.maintenance'))
     
     return render_template('tenant/request_maintenance.html', form=form, active_lease=active_lease)
 
+@tenant_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    if request.endpoint != 'tenant.request_maintenance':
+        return error
+    # The body is refused unread, so the form can only come back empty
+    form = MaintenanceRequestForm(formdata=None)
+    active_lease = Lease.query.filter_by(tenant_id=current_user.id, status='active').first()
+    form.property_id.choices = [(active_lease.property.id, active_lease.property.address)] if active_lease else []
+    flash(maintenance_photos.size_limit_message(current_app.config), 'error')
+    return render_template('tenant/request_maintenance.html', form=form, active_lease=active_lease), 413
+
 @tenant_bp.route('/documents/<int:document_id>/download')
 @login_required
 @tenant_required
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+App start-up time: a fresh interpreter running ``create_app`` eagerly, with
+``lazy=True`` (views and forms deferred to the first request), and lazily
+plus that first request. Each scenario runs in its own process under
+``python -X importtime``. "startup" is timed inside the process, from the
+first app import to the end of the scenario; "imports" is the sum of the
+per-module self times importtime reports (modules loaded through
+``importlib.import_module``, like the lazily registered views, are not
+listed by importtime but are included in "startup").
+
+Usage: python benchmarks/app_startup.py [--runs 7] [--top 12]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = [
+    ('interpreter only', 'pass'),
+    ('create_app()', "from app import create_app; create_app('production')"),
+    ('create_app(lazy=True)', "from app import create_app; create_app('production', lazy=True)"),
+    ('lazy + first request', "from app import create_app; "
+                             "create_app('production', lazy=True).test_client().get('/auth/login')"),
+]
+
+
+def parse_importtime(stderr):
+    """Map module name to ``(self_us, cumulative_us)`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run(code, env):
+    timed = f'import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)'
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', timed],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(result.stderr[-2000:])
+    return elapsed, float(result.stdout.split()[-1]), parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=12, help='Deferred modules to list.')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{os.path.join(tmp.name, "bench.db")}',
+               NOTIFICATION_INLINE_WORKER='0',
+               PYTHONPATH=ROOT)
+
+    print(f'median of {args.runs} fresh processes')
+    print(f'{"scenario":<24} {"wall ms":>8} {"startup ms":>11} {"imports ms":>11} {"modules":>8}')
+    imported = {}
+    for name, code in SCENARIOS:
+        run(code, env)  # warm the bytecode cache
+        walls, startups, totals = [], [], []
+        for _ in range(args.runs):
+            wall, startup, modules = run(code, env)
+            walls.append(wall)
+            startups.append(startup)
+            totals.append(sum(self_us for self_us, _ in modules.values()))
+        imported[name] = modules
+        print(f'{name:<24} {statistics.median(walls) * 1000:>8.1f} {statistics.median(startups) * 1000:>11.1f} '
+              f'{statistics.median(totals) / 1000:>11.1f} {len(modules):>8}')
+
+    eager, lazy = imported['create_app()'], imported['create_app(lazy=True)']
+    # Roots of the deferred subtrees: skipped modules none of whose parent packages were skipped too
+    skipped = eager.keys() - lazy.keys()
+    deferred = sorted(
+        (eager[name][1], name) for name in skipped
+        if not any('.'.join(name.split('.')[:i]) in skipped for i in range(1, name.count('.') + 1))
+    )[::-1]
+    print('\nheaviest imports deferred by lazy=True (cumulative ms, last run):')
+    for cumulative, name in deferred[:args.top]:
+        print(f'  {name:<40} {cumulative / 1000:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Login throughput and tail latency for real users while a credential-stuffing
+run hammers /auth/login, with and without login protection.
+
+The attack rotates through a pool of client IPs (sent as X-Forwarded-For)
+and a list of real usernames with wrong passwords; legitimate users log in
+with correct passwords from their own IPs.
+
+Usage: python benchmarks/login_under_attack.py [--attackers 16] [--victims 5] [--users 2] [--seconds 20]
+"""
+
+import argparse
+import http.client
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp.name, "bench.db")}'
+os.environ['TRUSTED_PROXY_COUNT'] = '1'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.models.login_attempt import LoginAttempt
+from app.models.user import User
+from app.services.login_protection import init_login_protection
+
+UNPROTECTED = {
+    'LOGIN_MAX_ATTEMPTS_PER_IP': 10 ** 9,
+    'LOGIN_MAX_ATTEMPTS_PER_IP_USERNAME': 10 ** 9,
+    'LOGIN_MAX_ATTEMPTS_PER_USERNAME': 10 ** 9,
+    'PASSWORD_HASH_CONCURRENCY': 10 ** 4,
+}
+
+
+def seed(app, victims, users):
+    with app.app_context():
+        db.create_all()
+        for name in victims + users:
+            user = User(username=name, email=f'{name}@example.com', role='tenant',
+                        first_name=name, last_name='Bench')
+            user.set_password('correct-horse')
+            db.session.add(user)
+        db.session.commit()
+
+
+def post_login(port, ip, username, password):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    body = urlencode({'username': username, 'password': password})
+    start = time.perf_counter()
+    conn.request('POST', '/auth/login', body, {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'X-Forwarded-For': ip,
+    })
+    status = conn.getresponse().status
+    conn.close()
+    return status, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(port, victims, users, attackers, seconds):
+    stop = threading.Event()
+    attack_statuses = Counter()
+    user_latencies = []
+    user_statuses = Counter()
+    lock = threading.Lock()
+    ips = itertools.cycle(f'10.{i // 250}.{i % 250}.1' for i in range(200))
+
+    def attacker():
+        while not stop.is_set():
+            status, _ = post_login(port, next(ips), random.choice(victims), 'hunter2')
+            with lock:
+                attack_statuses[status] += 1
+
+    def user(index, name):
+        while not stop.is_set():
+            status, elapsed = post_login(port, f'192.168.0.{index + 1}', name, 'correct-horse')
+            with lock:
+                user_statuses[status] += 1
+                user_latencies.append(elapsed)
+            time.sleep(0.2)
+
+    threads = [threading.Thread(target=attacker) for _ in range(attackers)]
+    threads += [threading.Thread(target=user, args=(i, name)) for i, name in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return attack_statuses, user_statuses, user_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--attackers', type=int, default=16)
+    parser.add_argument('--victims', type=int, default=5, help='accounts targeted by the attack')
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    args = parser.parse_args()
+
+    app = create_app('production')
+    app.config['WTF_CSRF_ENABLED'] = False
+    victims = [f'victim{i}' for i in range(args.victims)]
+    users = [f'resident{i}' for i in range(args.users)]
+    seed(app, victims, users)
+
+    WSGIRequestHandler.log_request = lambda *args, **kwargs: None
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    defaults = {key: app.config[key] for key in UNPROTECTED}
+
+    print(f'{args.attackers} attacker threads, {args.users} legitimate users, {args.seconds:g}s per profile\n')
+    print(f'{"profile":<14}{"attack req/s":>14}{"429/503":>10}{"user logins/s":>15}'
+          f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"user ok":>9}')
+    for name, overrides in (('unprotected', UNPROTECTED), ('protected', defaults)):
+        app.config.update(overrides)
+        with app.app_context():
+            init_login_protection(app)
+            LoginAttempt.query.delete()
+            db.session.commit()
+        attack, user_statuses, latencies = run(port, victims, users, args.attackers, args.seconds)
+        rejected = attack[429] + attack[503]
+        ok = user_statuses[302] / max(1, sum(user_statuses.values()))
+        print(f'{name:<14}{sum(attack.values()) / args.seconds:>14.1f}{rejected:>10}'
+              f'{len(latencies) / args.seconds:>15.1f}'
+              f'{statistics.median(latencies) * 1000 if latencies else float("nan"):>9.0f}'
+              f'{percentile(latencies, 95) * 1000:>9.0f}{percentile(latencies, 99) * 1000:>9.0f}'
+              f'{ok:>9.0%}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Throughput of the maintenance photo pipeline working through a backlog:
+synthetic phone-sized JPEGs are uploaded to a maintenance request, then
+the photo processor renders every variant with a thread pool or a process
+pool of each size. Each run starts from the same queue of pending photos
+and includes the database claims and status updates, not just the imaging.
+
+Needs Pillow.
+
+Usage: python benchmarks/maintenance_photos.py [--photos 48] [--width 4032] [--height 3024] [--workers 1,2,4]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp.name, "bench.db")}'
+os.environ['MAINTENANCE_PHOTO_STORAGE_PATH'] = os.path.join(_tmp.name, 'photos')
+os.environ['MAINTENANCE_PHOTO_INLINE_WORKER'] = '0'
+os.environ['NOTIFICATION_INLINE_WORKER'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.datastructures import FileStorage
+
+from app import create_app, db
+from app.models.maintenance_photo import MaintenancePhoto
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.organization import Organization
+from app.models.property import Property
+from app.models.user import User
+from app.services import maintenance_photos
+from app.tenancy import ORG_KEY
+
+if maintenance_photos.Image is None:
+    raise SystemExit('Pillow is not installed')
+Image = maintenance_photos.Image
+
+
+def synthetic_photo(width, height, seed):
+    """A JPEG with gradients and sensor-like noise, close to a phone photo in size and decode cost."""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 24 + seed % 16)
+    image = Image.merge('RGB', (gradient, noise, gradient.rotate(180)))
+    exif = Image.Exif()
+    exif[maintenance_photos.EXIF_ORIENTATION] = 6 if seed % 4 == 0 else 1
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def seed(app, photos):
+    with app.app_context():
+        db.create_all()
+        organization = Organization(name='Bench')
+        db.session.add(organization)
+        db.session.commit()
+        db.session.info[ORG_KEY] = organization.id
+
+        admin = User(username='admin', email='admin@example.com', role='admin', first_name='Admin', last_name='Bench', password_hash='x')
+        tenant = User(username='tenant', email='tenant@example.com', role='tenant', first_name='Tenant', last_name='Bench', password_hash='x')
+        db.session.add_all([admin, tenant])
+        db.session.flush()
+        rental = Property(owner_id=admin.id, address='1 Bench Street', property_type='house', rent_amount=1000)
+        db.session.add(rental)
+        db.session.flush()
+        request = MaintenanceRequest(tenant_id=tenant.id, property_id=rental.id, title='Backlog',
+                                     description='Photos for the benchmark.', priority='medium')
+        db.session.add(request)
+        db.session.flush()
+        for i in range(0, len(photos), app.config['MAINTENANCE_PHOTO_MAX_COUNT']):
+            uploads = [FileStorage(io.BytesIO(data), f'photo{i + j}.jpg')
+                       for j, data in enumerate(photos[i:i + app.config['MAINTENANCE_PHOTO_MAX_COUNT']])]
+            maintenance_photos.add_photos(request, uploads, tenant)
+        db.session.commit()
+        db.session.info.pop(ORG_KEY, None)
+
+
+def reset(app, incoming):
+    """Put every photo back in the queue with its upload, as if nothing had been processed."""
+    root = maintenance_photos.storage_root(app)
+    for variant in maintenance_photos.VARIANTS:
+        shutil.rmtree(os.path.join(root, variant), ignore_errors=True)
+    for content_hash, data in incoming.items():
+        with open(maintenance_photos.incoming_path(root, content_hash), 'wb') as f:
+            f.write(data)
+    with app.app_context():
+        MaintenancePhoto.query.update({'status': 'pending', 'claimed_at': None}, synchronize_session=False)
+        db.session.commit()
+
+
+def run(app, pool, batch_size):
+    processor = maintenance_photos.PhotoProcessor(app)
+    processor.pool = pool
+    processor.batch_size = batch_size
+    start = time.perf_counter()
+    while processor.process_pending():
+        pass
+    elapsed = time.perf_counter() - start
+    pool.shutdown(wait=True)
+    with app.app_context():
+        failed = MaintenancePhoto.query.filter(MaintenancePhoto.status != 'ready').count()
+    assert not failed, f'{failed} photos not processed'
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--photos', type=int, default=48)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated pool sizes.')
+    args = parser.parse_args()
+    pool_sizes = [int(size) for size in args.workers.split(',')]
+
+    photos = [synthetic_photo(args.width, args.height, i) for i in range(args.photos)]
+    megabytes = sum(len(data) for data in photos) / (1024 * 1024)
+    app = create_app('production')
+    seed(app, photos)
+    root = maintenance_photos.storage_root(app)
+    incoming = {}
+    for name in os.listdir(os.path.join(root, 'incoming')):
+        with open(os.path.join(root, 'incoming', name), 'rb') as f:
+            incoming[name] = f.read()
+
+    print(f'{args.photos} photos, {args.width}x{args.height}, {megabytes:.1f} MB; '
+          f'variants {app.config["MAINTENANCE_PHOTO_SIZES"]}; {os.cpu_count()} CPUs')
+    print(f'{"pool":<10} {"workers":>7} {"seconds":>8} {"photos/s":>9} {"MB/s":>7}')
+    for kind, executor in (('threads', ThreadPoolExecutor), ('processes', ProcessPoolExecutor)):
+        for size in pool_sizes:
+            reset(app, incoming)
+            elapsed = run(app, executor(max_workers=size), batch_size=max(size * 4, 16))
+            print(f'{kind:<10} {size:>7} {elapsed:>8.2f} {args.photos / elapsed:>9.1f} {megabytes / elapsed:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and time to first byte for the heavy admin pages, for
+each response encoding the compression middleware negotiates (identity,
+gzip, and brotli when installed), with template whitespace minification
+off and on.
+
+Usage: python benchmarks/response_compression.py [--properties 300] [--tenants 300] [--requests 600] [--rounds 20]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp.name, "bench.db")}'
+os.environ['NOTIFICATION_INLINE_WORKER'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import compression, create_app, db
+from app.models.maintenance_request import MaintenanceRequest
+from app.models.organization import Organization
+from app.models.property import Property
+from app.models.user import User
+from app.services.maintenance_workflow import rebuild_queue
+from app.tenancy import ORG_KEY
+
+PAGES = ['/admin/properties', '/admin/tenants', '/admin/maintenance']
+
+
+def seed(app, properties, tenants, requests):
+    with app.app_context():
+        db.create_all()
+        organization = Organization(name='Bench')
+        db.session.add(organization)
+        db.session.commit()
+        db.session.info[ORG_KEY] = organization.id
+
+        admin = User(username='admin', email='admin@example.com', role='admin', first_name='Admin', last_name='Bench')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.flush()
+        tenant_rows = []
+        for i in range(tenants):
+            tenant = User(username=f'tenant{i}', email=f'tenant{i}@example.com', role='tenant',
+                          first_name=f'Tenant{i}', last_name='Bench', phone='(555) 000-0000', password_hash='x')
+            tenant_rows.append(tenant)
+        db.session.add_all(tenant_rows)
+        property_rows = [
+            Property(owner_id=admin.id, address=f'{100 + i} Bench Street\nTestville, CA 9{i:04d}',
+                     property_type=random.choice(['apartment', 'house', 'commercial']),
+                     bedrooms=random.randint(1, 4), bathrooms=random.randint(1, 3),
+                     square_footage=random.randint(500, 2500), rent_amount=random.randint(900, 4000),
+                     description='Synthetic property for the compression benchmark.')
+            for i in range(properties)
+        ]
+        db.session.add_all(property_rows)
+        db.session.flush()
+        db.session.add_all(
+            MaintenanceRequest(tenant_id=random.choice(tenant_rows).id, property_id=random.choice(property_rows).id,
+                               title=f'Request {i}', description='Leaking faucet in the kitchen sink.',
+                               priority=random.choice(['low', 'medium', 'high', 'urgent']))
+            for i in range(requests)
+        )
+        db.session.commit()
+        rebuild_queue()
+        db.session.commit()
+        db.session.info.pop(ORG_KEY, None)
+
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/auth/login', urlencode({'username': 'admin', 'password': 'password'}),
+                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    cookie = SimpleCookie(response.getheader('Set-Cookie'))
+    return '; '.join(f'{key}={morsel.value}' for key, morsel in cookie.items())
+
+
+def fetch(port, path, cookie, encoding):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    start = time.perf_counter()
+    conn.request('GET', path, headers={'Cookie': cookie, 'Accept-Encoding': encoding})
+    response = conn.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - start
+    body = first + response.read()
+    total = time.perf_counter() - start
+    conn.close()
+    assert response.status == 200, (path, response.status)
+    return len(body), ttfb, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--properties', type=int, default=300)
+    parser.add_argument('--tenants', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=600)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('production')
+    app.config['WTF_CSRF_ENABLED'] = False
+    seed(app, args.properties, args.tenants, args.requests)
+
+    WSGIRequestHandler.log_request = lambda *args, **kwargs: None
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    cookie = login(port)
+
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli is not None else [])
+    print(f'{args.properties} properties, {args.tenants} tenants, {args.requests} maintenance requests; '
+          f'median of {args.rounds} requests')
+    print(f'{"page":<20} {"minify":<7} {"encoding":<9} {"bytes":>9} {"ttfb ms":>8} {"total ms":>9}')
+    for page in PAGES:
+        for minify in (False, True):
+            app.jinja_env.minify_whitespace = minify
+            app.jinja_env.cache.clear()
+            for encoding in encodings:
+                fetch(port, page, cookie, encoding)  # warm-up; compiles the template
+                samples = [fetch(port, page, cookie, encoding) for _ in range(args.rounds)]
+                size = samples[-1][0]
+                ttfb = statistics.median(sample[1] for sample in samples) * 1000
+                total = statistics.median(sample[2] for sample in samples) * 1000
+                print(f'{page:<20} {"on" if minify else "off":<7} {encoding:<9} {size:>9} {ttfb:>8.1f} {total:>9.1f}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
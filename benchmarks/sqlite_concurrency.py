@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write throughput against SQLite, comparing the default
+rollback journal with the WAL pragmas applied by the production profile.
+
+Usage: python benchmarks/sqlite_concurrency.py [--writers 4] [--readers 8] [--seconds 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.engine import sqlite_pragma_listener
+from config.settings import Config, engine_options
+
+PROFILES = {
+    'rollback journal': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': Config.SQLITE_PRAGMAS['busy_timeout']},
+    'WAL (production)': Config.SQLITE_PRAGMAS,
+}
+
+
+def make_engine(path, pragmas):
+    uri = f'sqlite:///{path}'
+    engine = create_engine(uri, **engine_options(uri))
+    event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE messages (id INTEGER PRIMARY KEY, recipient_id INTEGER, '
+            'message_text TEXT, is_read BOOLEAN, sent_at REAL)'
+        ))
+        conn.execute(text('CREATE INDEX ix_messages_recipient ON messages (recipient_id)'))
+    return engine
+
+
+def run(engine, writers, readers, seconds):
+    stop = threading.Event()
+    counts = {'writes': 0, 'reads': 0, 'busy': 0}
+    lock = threading.Lock()
+
+    def writer(worker_id):
+        done = busy = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text('INSERT INTO messages (recipient_id, message_text, is_read, sent_at) '
+                             'VALUES (:r, :t, 0, :s)'),
+                        {'r': done % 50, 't': 'x' * 200, 's': time.time()},
+                    )
+                done += 1
+            except OperationalError:
+                busy += 1
+        with lock:
+            counts['writes'] += done
+            counts['busy'] += busy
+
+    def reader(worker_id):
+        done = busy = 0
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        text('SELECT id, message_text FROM messages WHERE recipient_id = :r '
+                             'ORDER BY sent_at DESC LIMIT 20'),
+                        {'r': done % 50},
+                    ).fetchall()
+                done += 1
+            except OperationalError:
+                busy += 1
+        with lock:
+            counts['reads'] += done
+            counts['busy'] += busy
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile\n')
+    print(f'{"profile":<20}{"writes/s":>12}{"reads/s":>12}{"busy errors":>14}')
+    for name, pragmas in PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = make_engine(os.path.join(tmp, 'bench.db'), pragmas)
+            counts = run(engine, args.writers, args.readers, args.seconds)
+            engine.dispose()
+        print(f'{name:<20}{counts["writes"] / args.seconds:>12.0f}'
+              f'{counts["reads"] / args.seconds:>12.0f}{counts["busy"]:>14}')
+
+
+if __name__ == '__main__':
+    main()
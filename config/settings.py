@@ -1,6 +1,31 @@
 import os
 from datetime import timedelta
 
+
+def engine_options(database_uri):
+    """SQLAlchemy engine options tuned for the backend behind ``database_uri``."""
+    pool_size = int(os.environ.get('DB_POOL_SIZE') or os.environ.get('GUNICORN_THREADS') or 4)
+    max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', pool_size))
+
+    if database_uri.startswith('sqlite'):
+        if ':memory:' in database_uri or database_uri.rstrip('/') == 'sqlite:':
+            return {}
+        # SQLite has no server side to drop idle connections, so pre-ping and
+        # recycling would only add round trips.
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+        }
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///retreat_housing.db'
@@ -8,6 +33,132 @@ class Config:
     UPLOAD_FOLDER = 'app/static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file upload
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    # Applied to every new SQLite connection; ignored for other backends
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    }
+    # Comma-separated read replicas; GET requests read from these round-robin
+    SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri.strip()]
+    REPLICA_HEALTH_CHECK_INTERVAL = 30  # seconds
+    REPLICA_READ_AFTER_WRITE_SECONDS = 5
+    
+    # Outgoing mail; defaults point at `flask notifications debug-smtp`
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 1025))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'Retreat Housing <no-reply@retreathousing.com>')
+    
+    NOTIFICATION_TRANSPORTS = {'email': 'smtp', 'sms': 'log'}
+    # Deliver from a thread inside each web process; turn off when running
+    # a dedicated `flask notifications run` worker
+    NOTIFICATION_INLINE_WORKER = os.environ.get('NOTIFICATION_INLINE_WORKER', '1').lower() in ('1', 'true', 'yes')
+    NOTIFICATION_WORKERS = 4
+    NOTIFICATION_POLL_INTERVAL = 30  # seconds; how often digests are checked
+    NOTIFICATION_BATCH_SIZE = 200  # users per dispatch pass
+    
+    # Hours from submission until a maintenance request is overdue
+    MAINTENANCE_SLA_HOURS = {'urgent': 4, 'high': 24, 'medium': 72, 'low': 168}
+    MAINTENANCE_BOARD_CLOSED_LIMIT = 50  # recently closed requests shown under the open queue
+    
+    # werkzeug hash method for new passwords; older hashes are upgraded on next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_CONCURRENCY = 2  # concurrent hash checks per process
+    PASSWORD_HASH_WAIT_TIMEOUT = 2  # seconds to wait for a free slot before answering 503
+    # Sliding-window login throttling; 'database' shares counts across workers
+    LOGIN_RATE_LIMIT_BACKEND = os.environ.get('LOGIN_RATE_LIMIT_BACKEND', 'memory')
+    LOGIN_MAX_ATTEMPTS_PER_IP = 20
+    LOGIN_MAX_ATTEMPTS_PER_IP_USERNAME = 5
+    LOGIN_MAX_ATTEMPTS_PER_USERNAME = 100  # from all addresses together
+    LOGIN_ATTEMPT_WINDOW = 15 * 60  # seconds
+    # Reverse proxies in front of the app; their X-Forwarded-For is trusted so
+    # per-IP limits see the real client address
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    
+    # Audit events are buffered per process and inserted in batches
+    AUDIT_FLUSH_INTERVAL = 2  # seconds
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_BUFFER_SIZE = 10000  # events held before writes fall back to the request thread
+    AUDIT_RETENTION_MONTHS = 24
+    
+    # Rows older than these move to the archive tables (`flask archive run`)
+    MESSAGE_ARCHIVE_AFTER_DAYS = 180  # read messages
+    MAINTENANCE_ARCHIVE_AFTER_DAYS = 365  # closed requests
+    SOFT_DELETE_RETENTION_DAYS = 30  # deleted items can be restored until then
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_BATCH_PAUSE = 0.1  # seconds between batches
+    
+    # Daily occupancy rollups (`flask analytics refresh`)
+    ANALYTICS_REFRESH_LOOKBACK_DAYS = 7  # recent days recomputed on every run to pick up late edits
+    ANALYTICS_BACKFILL_DAYS = 365  # history built on the first run
+    ANALYTICS_CHUNK_DAYS = 92  # days computed and written per transaction
+
+    # Select-field choices are cached per admin and rebuilt when their tables change
+    CHOICES_TYPEAHEAD_THRESHOLD = 200  # longer lists render as a search box instead of <option>s
+    CHOICES_TYPEAHEAD_LIMIT = 20  # suggestions per search
+
+    # Fingerprinted, precompressed static files (`flask assets build`)
+    ASSETS_BUILD_FOLDER = os.environ.get('ASSETS_BUILD_FOLDER')  # defaults to app/static_dist
+    ASSETS_EXCLUDE = ('uploads',)  # static subfolders that are not part of the build
+    ASSETS_MAX_AGE = 365 * 24 * 3600  # seconds; hashed names change whenever the content does
+
+    # Compress responses in the app; turn off when a proxy in front already does
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent as they are
+    COMPRESSION_LEVEL = 6  # gzip level
+    COMPRESSION_BROTLI_QUALITY = 4  # per-request brotli; built assets use the maximum
+    # Collapse template indentation when templates compile
+    HTML_MINIFY = False
+
+    # Message attachments are stored on disk, outside the database
+    ATTACHMENT_STORAGE_PATH = os.environ.get('ATTACHMENT_STORAGE_PATH')  # defaults to instance/attachments
+    ATTACHMENT_MAX_SIZE = 10 * 1024 * 1024  # bytes per file
+    ATTACHMENT_USER_QUOTA = 200 * 1024 * 1024  # bytes per uploader
+    ATTACHMENT_PROPERTY_QUOTA = 1024 * 1024 * 1024  # bytes per property
+    ATTACHMENT_IMAGE_MAX_DIMENSION = 2048  # pixels; larger images are downscaled in the background
+    ATTACHMENT_CACHE_MAX_AGE = 24 * 3600  # seconds; browsers revalidate with the content-hash ETag after this
+    # Downscale from a thread inside each web process; turn off when running
+    # a dedicated `flask attachments run` worker
+    ATTACHMENT_INLINE_WORKER = os.environ.get('ATTACHMENT_INLINE_WORKER', '1').lower() in ('1', 'true', 'yes')
+    ATTACHMENT_POLL_INTERVAL = 60  # seconds
+    ATTACHMENT_BATCH_SIZE = 20
+
+    # Maintenance photos are stored by content hash and resized by a worker pool
+    MAINTENANCE_PHOTO_STORAGE_PATH = os.environ.get('MAINTENANCE_PHOTO_STORAGE_PATH')  # defaults to instance/maintenance_photos
+    MAINTENANCE_PHOTO_MAX_SIZE = 15 * 1024 * 1024  # bytes per photo
+    MAINTENANCE_PHOTO_MAX_COUNT = 6  # photos per request
+    MAINTENANCE_PHOTO_SIZES = {'thumbnail': 320, 'web': 1600}  # pixels on the long side
+    MAINTENANCE_PHOTO_QUALITY = 82  # JPEG quality of the resized variants
+    MAINTENANCE_PHOTO_CACHE_MAX_AGE = 365 * 24 * 3600  # seconds; a photo's files never change
+    MAINTENANCE_PHOTO_INLINE_WORKER = os.environ.get('MAINTENANCE_PHOTO_INLINE_WORKER', '1').lower() in ('1', 'true', 'yes')
+    MAINTENANCE_PHOTO_WORKERS = 2  # resize threads per web process
+    MAINTENANCE_PHOTO_POLL_INTERVAL = 60  # seconds
+    MAINTENANCE_PHOTO_BATCH_SIZE = 16
+
+    # Session data is kept server-side and the cookie only carries a signed token:
+    # 'database', 'memory' (per process), 'cookie' (Flask's signed cookie) or 'module:StoreClass'
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'database')
+    SESSION_TOUCH_INTERVAL = 15 * 60  # seconds; how often an unchanged session's expiry is pushed back
+    SESSION_PRUNE_EVERY = 500  # new sessions per process between sweeps of expired ones
+    SESSION_PRUNE_BATCH_SIZE = 1000
+
+    # Lease documents are versioned and stored by content hash, outside the database
+    DOCUMENT_STORAGE_PATH = os.environ.get('DOCUMENT_STORAGE_PATH')  # defaults to instance/documents
+
+    # Lease document signatures
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', 'http://localhost:5000')  # for links sent by background jobs
+    SIGNATURE_REQUEST_TTL_DAYS = 14  # days a signing link stays valid
+    SIGNATURE_RENEWAL_WINDOW_DAYS = 60  # "send all renewals" covers active leases ending within this many days
+    SIGNATURE_BATCH_CHUNK = 200  # requests inserted and committed together
+    # Send queued batches from a thread inside each web process; turn off when
+    # running a dedicated `flask signatures run` worker
+    SIGNATURE_INLINE_WORKER = os.environ.get('SIGNATURE_INLINE_WORKER', '1').lower() in ('1', 'true', 'yes')
+    SIGNATURE_POLL_INTERVAL = 300  # seconds; also how often overdue requests are expired
+    SIGNATURE_BATCH_SIZE = 5  # batches claimed at a time
+    SIGNATURE_RECENT_LIMIT = 100  # requests listed on the signatures page
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -15,9 +166,13 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    HTML_MINIFY = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(Config.SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS = engine_options(Config.SQLALCHEMY_REPLICA_URIS[0]) if Config.SQLALCHEMY_REPLICA_URIS else {}
+    LOGIN_RATE_LIMIT_BACKEND = os.environ.get('LOGIN_RATE_LIMIT_BACKEND', 'database')
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for the production profile.
+
+Start with:  gunicorn -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Threaded workers: requests spend most of their time waiting on the database,
+# so a few threads per process keep the CPU busy without extra memory per worker.
+# Keep DB_POOL_SIZE >= threads (it defaults to GUNICORN_THREADS).
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading must not be shared across processes
+    from app import db
+    from wsgi import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Inline background workers run per process; start them now instead of on
+    # the first wake, so overdue work is picked up even by an idle worker
+    for name in ('attachment_processor', 'notification_dispatcher', 'photo_processor', 'signature_batch_runner'):
+        runner = app.extensions[name]
+        if runner.inline:
+            runner.start()
@@ -7,16 +7,42 @@ Creates database tables and seeds with sample data
 import os
 from datetime import datetime, date
 from app import create_app, db
+from app.models.organization import Organization
 from app.models.user import User
 from app.models.property import Property
 from app.models.lease import Lease
 from app.models.document import Document
 from app.models.message import Message
 from app.models.maintenance_request import MaintenanceRequest
+from app.models.notification import Notification, NotificationPreference
+from app.models.maintenance_status_change import MaintenanceStatusChange
+from app.models.maintenance_queue_entry import MaintenanceQueueEntry
+from app.models.login_attempt import LoginAttempt
+from app.models.audit_event import AuditEvent
+from app.models.archived_message import ArchivedMessage
+from app.models.archived_maintenance_request import ArchivedMaintenanceRequest
+from app.models.property_daily_stat import PropertyDailyStat
+from app.models.portfolio_daily_stat import PortfolioDailyStat
+from app.models.message_attachment import MessageAttachment
+from app.models.storage_usage import StorageUsage
+from app.models.maintenance_photo import MaintenancePhoto
+from app.models.user_session import UserSession
+from app.models.signature import SignatureRequest, Signature, SignatureBatch
+from app.models.document_version import DocumentVersion
+from app.models.choice_version import ChoiceVersion
+from app.services.maintenance_workflow import rebuild_queue
+from app.services.analytics import refresh_recent
+from app.tenancy import ORG_KEY
 
 def create_sample_data():
     """Create sample data for development and testing"""
     
+    # All sample data belongs to one organization; new rows pick it up on flush
+    organization = Organization(name='Retreat Housing')
+    db.session.add(organization)
+    db.session.commit()
+    db.session.info[ORG_KEY] = organization.id
+    
     # Create admin user
     admin = User(
         username='admin',
@@ -183,6 +209,9 @@ def create_sample_data():
     
     # Commit all sample data
     db.session.commit()
+    rebuild_queue()
+    refresh_recent()
+    db.session.info.pop(ORG_KEY, None)
     
     print("✓ Sample data created successfully!")
     print(f"✓ Admin user: username='admin', password='password'")
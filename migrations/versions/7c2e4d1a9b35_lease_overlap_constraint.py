@@ -0,0 +1,43 @@
+"""Reject overlapping leases on PostgreSQL
+
+Databases created with db.create_all() already have the constraint (see
+app.models.lease); this adds it to ones created before it existed. Run
+``flask leases check-overlaps`` first: the constraint can't be added while
+overlapping leases are stored.
+
+Revision ID: 7c2e4d1a9b35
+Revises: 
+Create Date: 2026-10-19 05:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4d1a9b35'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_constraint(bind):
+    return bind.execute(sa.text("SELECT 1 FROM pg_constraint WHERE conname = 'leases_no_overlap'")).first() is not None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or _has_constraint(bind):
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        "ALTER TABLE leases ADD CONSTRAINT leases_no_overlap EXCLUDE USING gist "
+        "(property_id WITH =, daterange(start_date, end_date, '[]') WITH &&) "
+        "WHERE (status <> 'terminated')"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE leases DROP CONSTRAINT IF EXISTS leases_no_overlap')
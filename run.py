@@ -1,25 +1,15 @@
 import os
 from app import create_app, db
-from app.models.user import User
-from app.models.property import Property
-from app.models.lease import Lease
-from app.models.document import Document
-from app.models.message import Message
-from app.models.maintenance_request import MaintenanceRequest
 
-app = create_app(os.getenv('FLASK_ENV', 'development'))
+# Lazy: `flask` CLI commands run through this module and rarely need the views
+app = create_app(os.getenv('FLASK_ENV', 'development'), lazy=True)
 
 @app.shell_context_processor
 def make_shell_context():
-    return {
-        'db': db,
-        'User': User,
-        'Property': Property,
-        'Lease': Lease,
-        'Document': Document,
-        'Message': Message,
-        'MaintenanceRequest': MaintenanceRequest
-    }
+    # Every mapped model, as imported by the app's services
+    context = {mapper.class_.__name__: mapper.class_ for mapper in db.Model.registry.mappers}
+    context['db'] = db
+    return context
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=app.config['DEBUG'])
\ No newline at end of file
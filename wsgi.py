@@ -0,0 +1,5 @@
+import os
+from app import create_app
+
+# Eager: gunicorn preloads this once in the master, so forked workers start with the views imported
+app = create_app(os.getenv('FLASK_ENV', 'production'))